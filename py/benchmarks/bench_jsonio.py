@@ -0,0 +1,38 @@
+"""Benchmarks for the JSON backends on the iJO1366 model and map."""
+
+from escher import jsonio
+
+from .common import model_path, map_path, read_text
+
+
+class JsonBackend:
+    params = jsonio.available_backends()
+    param_names = ['backend']
+
+    def setup(self, backend):
+        jsonio.set_backend(backend)
+        self.model_bytes = read_text(model_path).encode('utf-8')
+        self.map_bytes = read_text(map_path).encode('utf-8')
+        self.model_data = jsonio.loads(self.model_bytes)
+        self.map_data = jsonio.loads(self.map_bytes)
+
+    def teardown(self, backend):
+        jsonio.set_backend()
+
+    def time_loads_model(self, backend):
+        jsonio.loads(self.model_bytes)
+
+    def time_loads_map(self, backend):
+        jsonio.loads(self.map_bytes)
+
+    def time_dumps_model(self, backend):
+        jsonio.dumps(self.model_data)
+
+    def time_dumps_map(self, backend):
+        jsonio.dumps(self.map_data)
+
+    def time_dumpb_model(self, backend):
+        jsonio.dumpb(self.model_data)
+
+    def peakmem_loads_model(self, backend):
+        jsonio.loads(self.model_bytes)
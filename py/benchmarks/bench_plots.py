@@ -0,0 +1,75 @@
+"""Benchmarks for the data conversion, resource loading and HTML export."""
+
+from escher import Builder
+from escher.plots import convert_data, _load_resource
+from escher.util import b64dump
+
+import numpy as np
+import pandas as pd
+import shutil
+import tempfile
+from os.path import join
+
+from .common import model_path, map_path, read_text
+
+
+class ConvertData:
+    params = [1000, 100000]
+    param_names = ['n_ids']
+
+    def setup(self, n_ids):
+        index = ['id_%d' % i for i in range(n_ids)]
+        rng = np.random.default_rng(0)
+        self.series = pd.Series(rng.normal(size=n_ids), index=index)
+        # wide frame: one column per id, two datasets to compare
+        self.wide_frame = pd.DataFrame(rng.normal(size=(2, n_ids)),
+                                       columns=index)
+
+    def time_series(self, n_ids):
+        convert_data(self.series)
+
+    def time_wide_dataframe(self, n_ids):
+        convert_data(self.wide_frame.T)
+
+    def peakmem_wide_dataframe(self, n_ids):
+        convert_data(self.wide_frame.T)
+
+
+class LoadResource:
+    def setup(self):
+        self.model_json = read_text(model_path)
+
+    def time_file(self):
+        _load_resource(model_path, 'model_json')
+
+    def time_large_string(self):
+        _load_resource(self.model_json, 'model_json')
+
+    def peakmem_large_string(self):
+        _load_resource(self.model_json, 'model_json')
+
+
+class B64Dump:
+    def setup(self):
+        self.model_json = read_text(model_path)
+
+    def time_b64dump(self):
+        b64dump(self.model_json)
+
+    def peakmem_b64dump(self):
+        b64dump(self.model_json)
+
+
+class SaveHtml:
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.builder = Builder(map_json=map_path, model_json=model_path)
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def time_save_html(self):
+        self.builder.save_html(join(self.directory, 'builder.html'))
+
+    def peakmem_save_html(self):
+        self.builder.save_html(join(self.directory, 'builder.html'))
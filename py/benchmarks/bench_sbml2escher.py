@@ -0,0 +1,32 @@
+"""End to end benchmarks for the SBML and CellDesigner converter."""
+
+import shutil
+import tempfile
+from os.path import join
+
+from .common import sbml_path, celldesigner_path, import_sbml2escher
+
+
+class Sbml2Escher:
+    params = [False, True]
+    param_names = ['compact']
+
+    def setup(self, compact):
+        self.sbml2escher = import_sbml2escher()
+        self.directory = tempfile.mkdtemp()
+
+    def teardown(self, compact):
+        shutil.rmtree(self.directory)
+
+    def time_sbml(self, compact):
+        self.sbml2escher.sbml2escher(sbml_path, join(self.directory, 'out.json'),
+                                     compact=compact)
+
+    def time_celldesigner(self, compact):
+        self.sbml2escher.celldesigner2escher(celldesigner_path,
+                                             join(self.directory, 'out.json'),
+                                             compact=compact)
+
+    def peakmem_sbml(self, compact):
+        self.sbml2escher.sbml2escher(sbml_path, join(self.directory, 'out.json'),
+                                     compact=compact)
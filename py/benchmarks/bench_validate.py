@@ -0,0 +1,49 @@
+"""Benchmarks for map validation."""
+
+from escher.validate import (
+    validate_map,
+    check_map,
+    genes_for_gene_reaction_rule,
+    IncrementalValidator,
+)
+
+from .common import map_path, model_path, read_json
+
+
+class ValidateMap:
+    def setup(self):
+        self.map_data = read_json(map_path)
+
+    def time_validate_map(self):
+        validate_map(self.map_data)
+
+    def time_check_map(self):
+        check_map(self.map_data)
+
+    def peakmem_validate_map(self):
+        validate_map(self.map_data)
+
+
+class IncrementalValidate:
+    def setup(self):
+        self.map_data = read_json(map_path)
+        self.validator = IncrementalValidator()
+        self.validator.validate(self.map_data)
+        self.node = next(iter(self.map_data[1]['nodes'].values()))
+
+    def time_unchanged(self):
+        self.validator.validate(self.map_data)
+
+    def time_moved_node(self):
+        self.node['x'] += 1
+        self.validator.validate(self.map_data)
+
+
+class GenesForGeneReactionRule:
+    def setup(self):
+        model = read_json(model_path)
+        self.rules = [r['gene_reaction_rule'] for r in model['reactions']]
+
+    def time_model_rules(self):
+        for rule in self.rules:
+            genes_for_gene_reaction_rule(rule)
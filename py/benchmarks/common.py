@@ -0,0 +1,36 @@
+"""Data files shared by the benchmarks."""
+
+import escher
+
+import json
+import sys
+from os.path import join, dirname, abspath
+
+package_directory = dirname(abspath(escher.__file__))
+repo_directory = abspath(join(dirname(__file__), '..', '..'))
+
+model_path = join(package_directory, 'testing_data', 'iJO1366.json')
+map_path = join(repo_directory, 'docs', '_static', 'example_data',
+                'S5_iJO1366.Glycolysis_PPP_AA_Nucleotides.json')
+gene_data_path = join(repo_directory, 'docs', '_static', 'example_data',
+                      'gene_data_iJO1366.json')
+sbml_path = join(repo_directory, 'py', 'io', 'sbml.xml')
+celldesigner_path = join(repo_directory, 'py', 'io', 'celldesigner.xml')
+
+
+def read_text(path):
+    with open(path, 'rb') as f:
+        return f.read().decode('utf-8')
+
+
+def read_json(path):
+    return json.loads(read_text(path))
+
+
+def import_sbml2escher():
+    """Import the converter script, which is not part of the escher package."""
+    io_directory = join(repo_directory, 'py', 'io')
+    if io_directory not in sys.path:
+        sys.path.insert(0, io_directory)
+    import sbml2escher
+    return sbml2escher
@@ -14,6 +14,10 @@ from escher.plots import (
     list_available_models,
 )
 
+from escher.maps import Map
+
+from escher.mapdiff import diff, patch
+
 
 def _jupyter_nbextension_paths():
     return [{
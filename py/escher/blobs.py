@@ -0,0 +1,197 @@
+"""A process-wide store for the map and model JSON shared by Builders.
+
+Each distinct map or model is held once, as a blob widget keyed by the hash of
+its content. Builders reference the blob instead of syncing their own copy, so
+the JSON is sent to the frontend once, and the frontend parses it once for
+every view that shows it.
+
+Blobs are reference counted, and closed when the last Builder that uses them
+releases them. A blob can also be compressed, so the content is sent as a
+gzipped binary buffer. Compressed and uncompressed blobs of the same content
+are held separately.
+
+A blob with a source is not synced with its content, so the content is not
+saved with the notebook widget state. The frontend asks the kernel for the
+content when it needs it, or loads it from the source url when the notebook
+is opened without a kernel. write_sidecar saves the content next to the
+notebook to serve as the source.
+
+"""
+
+from escher.version import __version__
+from escher.util import compress_payload
+from escher import metrics
+
+from hashlib import sha256
+from threading import Lock
+import os
+import posixpath
+
+import ipywidgets as widgets
+from traitlets import Unicode
+
+
+def content_hash(content):
+    """Return the SHA-256 hex digest of a string."""
+    return sha256(content.encode('utf-8')).hexdigest()
+
+
+def compress(content, trait='blob'):
+    """Return escher.util.compress_payload for content. With metrics enabled,
+    records the size before compression as 'compress_payload', and the size
+    after as 'compressed_payload'.
+
+    """
+    with metrics.timer('compress_payload', trait=trait) as timer:
+        payload = compress_payload(content)
+        timer.add_bytes(payload['size'])
+    metrics.record('compressed_payload', nbytes=payload['compressed_size'],
+                   trait=trait)
+    return payload
+
+
+def write_sidecar(content, directory, digest=None):
+    """Write content to a file named by its hash in directory, unless it is
+    already there, and return the path of the file as a url.
+
+    :param str content: A JSON string.
+
+    :param str directory: The directory for the file. For the widget to find
+                          the file without a kernel, it should be relative to
+                          the notebook.
+
+    :param str digest: The content_hash of content, if it is known.
+
+    """
+    filename = (digest or content_hash(content)) + '.json'
+    filepath = os.path.join(directory, filename)
+    if not os.path.exists(filepath):
+        os.makedirs(directory, exist_ok=True)
+        with open(filepath + '.part', 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(filepath + '.part', filepath)
+    return posixpath.join(directory.replace(os.sep, '/'), filename)
+
+
+def _serialize_content(value, blob):
+    if blob.source:
+        return ''
+    if not blob.compress:
+        return value
+    return blob.compressed()
+
+
+class Blob(widgets.Widget):
+    """A JSON string that is synced to the frontend once, optionally gzipped.
+    """
+
+    _model_name = Unicode('EscherBlobModel').tag(sync=True)
+    _model_module = Unicode('escher').tag(sync=True)
+    _model_module_version = Unicode(__version__).tag(sync=True)
+
+    digest = Unicode(read_only=True).tag(sync=True)
+    content = Unicode(read_only=True)\
+        .tag(sync=True, to_json=_serialize_content)
+    # a url for the content, instead of syncing it
+    source = Unicode(read_only=True).tag(sync=True)
+
+    def __init__(self, content, digest=None, compress=False, source=None):
+        self.compress = compress
+        self._compressed = None
+        super().__init__()
+        self.set_trait('source', source or '')
+        self.set_trait('digest', digest or content_hash(content))
+        self.set_trait('content', content)
+        self.on_msg(self._handle_custom_msg)
+
+    def _handle_custom_msg(self, widget, content, buffers):
+        if content.get('event') != 'get_content':
+            return
+        if not self.compress:
+            self.send({'event': 'content', 'content': self.content})
+            return
+        payload = dict(self.compressed())
+        data = payload.pop('data')
+        self.send({'event': 'content', 'content': payload}, buffers=[data])
+
+    def compressed(self):
+        """Return the content from escher.util.compress_payload. It is
+        compressed once, the first time it is needed.
+
+        """
+        # the content is empty while the widget opens
+        if self._compressed is None or self._compressed[0] is not self.content:
+            self._compressed = (self.content, compress(self.content))
+        return self._compressed[1]
+
+
+class BlobStore(object):
+    """Reference counted blobs, keyed by the hash of their content."""
+
+    def __init__(self):
+        self._blobs = {}
+        self._counts = {}
+        self._lock = Lock()
+
+    @staticmethod
+    def _key(blob):
+        return (blob.digest, blob.compress, blob.source)
+
+    def acquire(self, content, compress=False, source=None):
+        """Return the blob for content, creating it if needed, and add a
+        reference to it.
+
+        :param bool compress: Return a blob that is sent gzipped.
+
+        :param str source: Return a blob that the frontend loads from this
+                           url instead of syncing the content.
+
+        """
+        digest = content_hash(content)
+        key = (digest, compress, source or '')
+        with self._lock:
+            blob = self._blobs.get(key)
+            if blob is None:
+                blob = self._blobs[key] = Blob(content, digest, compress,
+                                               source)
+                self._counts[key] = 0
+            self._counts[key] += 1
+        return blob
+
+    def release(self, blob):
+        """Remove a reference to a blob, and close it if it was the last."""
+        if blob is None:
+            return
+        with self._lock:
+            key = self._key(blob)
+            if key not in self._counts:
+                return
+            self._counts[key] -= 1
+            if self._counts[key] > 0:
+                return
+            del self._counts[key]
+            del self._blobs[key]
+        blob.close()
+
+    def references(self, blob):
+        """Return the number of references to a blob."""
+        return self._counts.get(self._key(blob), 0)
+
+    def stats(self):
+        """Return the number of blobs, the number of references, and the
+        number of characters held.
+
+        """
+        with self._lock:
+            return {
+                'blobs': len(self._blobs),
+                'references': sum(self._counts.values()),
+                'size': sum(len(b.content) for b in self._blobs.values()),
+            }
+
+    def __len__(self):
+        return len(self._blobs)
+
+
+#: The store shared by every Builder in the process
+store = BlobStore()
@@ -0,0 +1,307 @@
+"""Compare datasets in Python, the way the Escher frontend does.
+
+When reaction_data or metabolite_data has two datasets, the frontend computes
+a value for each element with the compare style ('diff', 'fold' or
+'log2_fold'). This module does the same with NumPy, following floatForData,
+reverse_flux_for_data and text_for_data in dataStyles.js, so the comparison
+can be computed once and sent to the frontend as a single series:
+
+.. code:: python
+
+    from escher.compare import compare_data
+
+    compared = compare_data([flux_before, flux_after],
+                            compare_style='log2_fold')
+    compared['PGI']
+    # {'value': 0.415, 'text': '1.50, 2.00: 0.415', 'reverse_flux': False}
+
+"""
+
+from decimal import Decimal, localcontext, ROUND_HALF_UP
+import math
+
+import numpy as np
+import pandas as pd
+
+#: The compare styles for two datasets
+COMPARE_STYLES = ('diff', 'fold', 'log2_fold')
+
+#: The defaults in the frontend
+DEFAULT_STYLES = ['color', 'size', 'text']
+DEFAULT_COMPARE_STYLE = 'log2_fold'
+
+#: Reaction values smaller than this are set to zero, as in the frontend
+REACTION_DATA_THRESHOLD = 1e-6
+
+_js_infinities = {'infinity', '+infinity', '-infinity'}
+
+
+def _parse_float(value):
+    """parseFloatOrNull in dataStyles.js, with NaN for null."""
+    if value is None or isinstance(value, bool):
+        return np.nan
+    if isinstance(value, (int, float, np.number)):
+        return float(value)
+    if not isinstance(value, str):
+        return np.nan
+    stripped = value.strip()
+    # JavaScript only knows 'Infinity', and has no underscores in numbers
+    if '_' in stripped or (stripped.lower().lstrip('+-') in ('inf', 'nan')) \
+       or (stripped.lower() in _js_infinities and
+           stripped.lstrip('+-') != 'Infinity'):
+        return np.nan
+    try:
+        return float(stripped)
+    except ValueError:
+        return np.nan
+
+
+def to_floats(values):
+    """Convert values to a float array, with NaN for values that the frontend
+    does not treat as numbers.
+
+    """
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'fiu':
+        return values.astype(float)
+    return np.array([_parse_float(v) for v in values], dtype=float)
+
+
+def float_for_data(first, second=None, styles=DEFAULT_STYLES,
+                   compare_style=DEFAULT_COMPARE_STYLE):
+    """Return the value shown for each element, with NaN for no data. As in
+    the frontend, only the fold styles have no data for values that are not
+    finite, so one dataset and 'diff' keep infinite values.
+
+    :param first: Values of the first dataset, as an array-like.
+
+    :param second: Values of the second dataset, or None for one dataset.
+
+    :param styles: The reaction_styles or metabolite_styles. Only 'abs' is
+                   used.
+
+    :param str compare_style: 'diff', 'fold' or 'log2_fold'.
+
+    """
+    first = to_floats(first)
+    take_abs = 'abs' in (styles or [])
+    if second is None:
+        values = first.copy()
+    else:
+        second = to_floats(second)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if compare_style == 'diff':
+                values = second - first
+            elif compare_style == 'fold':
+                values = np.where(second >= first, second / first,
+                                  -first / second)
+                values[(first == 0) | (second == 0)] = np.nan
+            elif compare_style == 'log2_fold':
+                ratio = second / first
+                values = np.log2(np.where(ratio < 0, np.nan, ratio))
+                values[first == 0] = np.nan
+            else:
+                raise ValueError('Bad data compare_style: %s' % compare_style)
+    if take_abs:
+        values = np.abs(values)
+    if second is not None and compare_style != 'diff':
+        # checkFinite in the frontend
+        values[~np.isfinite(values)] = np.nan
+    return values
+
+
+def reverse_flux_for_data(first):
+    """Return whether the flux in the first dataset is reversed."""
+    with np.errstate(invalid='ignore'):
+        return to_floats(first) < 0
+
+
+def _digits(value, precision=None):
+    """Return the significant digits and the decimal exponent of a nonzero
+    number, like JavaScript, rounding half up if precision is given.
+
+    """
+    with localcontext() as context:
+        if precision is None:
+            # repr is the shortest string that gives the same float
+            number = Decimal(repr(float(value)))
+        else:
+            context.prec = precision
+            context.rounding = ROUND_HALF_UP
+            number = +Decimal(float(value))
+    sign, digits, exponent = number.as_tuple()
+    digits = ''.join(str(d) for d in digits)
+    if precision is None:
+        stripped = digits.rstrip('0')
+        exponent += len(digits) - len(stripped)
+        digits = stripped
+    else:
+        digits = digits.ljust(precision, '0')
+        exponent -= precision - len(number.as_tuple().digits)
+    # the exponent of the first digit
+    return digits, exponent + len(digits) - 1
+
+
+def _exponential(digits, exponent):
+    mantissa = digits[0] + ('.' + digits[1:] if len(digits) > 1 else '')
+    return '%se%s%d' % (mantissa, '+' if exponent >= 0 else '-',
+                        abs(exponent))
+
+
+def js_number_string(value):
+    """Return a number as JavaScript converts it to a string."""
+    value = float(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return 'Infinity' if value > 0 else '-Infinity'
+    if value == 0:
+        return '0'
+    sign = '-' if value < 0 else ''
+    digits, exponent = _digits(abs(value))
+    n = exponent + 1
+    if len(digits) <= n <= 21:
+        return sign + digits + '0' * (n - len(digits))
+    if 0 < n <= 21:
+        return sign + digits[:n] + '.' + digits[n:]
+    if -6 < n <= 0:
+        return sign + '0.' + '0' * -n + digits
+    return sign + _exponential(digits, exponent)
+
+
+def format_number(value, precision=3):
+    """Return a number formatted like d3Format('.3g') in the frontend, with a
+    hyphen for the minus sign.
+
+    """
+    value = float(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '-Infinity' if value < 0 else 'Infinity'
+    if value == 0:
+        return '0.' + '0' * (precision - 1) if precision > 1 else '0'
+    sign = '-' if value < 0 else ''
+    # printf rounds ties to even, and JavaScript rounds them up, so only look
+    # closer when the digits after the precision could be a tie
+    exact = '%.*e' % (precision + 20, abs(value))
+    if exact[precision + 1:precision + 21] == '5' + '0' * 19:
+        digits, exponent = _digits(abs(value), precision)
+    else:
+        rounded = '%.*e' % (precision - 1, abs(value))
+        mantissa, exponent = rounded.split('e')
+        digits, exponent = mantissa.replace('.', ''), int(exponent)
+    if exponent < -6 or exponent >= precision:
+        return sign + _exponential(digits, exponent)
+    if exponent >= precision - 1:
+        return sign + digits
+    if exponent >= 0:
+        return sign + digits[:exponent + 1] + '.' + digits[exponent + 1:]
+    return sign + '0.' + '0' * (-exponent - 1) + digits
+
+
+def _raw_string(value):
+    if value is None:
+        return '(nd)'
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return js_number_string(value)
+
+
+def _text(raw, parsed, formatted):
+    if raw is None:
+        return '(nd)'
+    if not formatted:
+        return _raw_string(raw)
+    return format_number(parsed)
+
+
+def text_for_data(raw_values, parsed_values, values):
+    """Return the text shown for each element, like text_for_data in the
+    frontend.
+
+    :param raw_values: A list with the raw values of each dataset.
+
+    :param parsed_values: A list with the values of each dataset from
+                          to_floats.
+
+    :param values: The values from float_for_data.
+
+    """
+    texts = []
+    has_value = ~np.isnan(values)
+    for i in range(len(values)):
+        formatted = bool(has_value[i])
+        parts = [_text(raw[i], parsed[i], formatted)
+                 for raw, parsed in zip(raw_values, parsed_values)]
+        if len(parts) == 2:
+            compared = format_number(values[i]) if formatted else '(nd)'
+            texts.append('%s, %s: %s' % (parts[0], parts[1], compared))
+        else:
+            texts.append(parts[0])
+    return texts
+
+
+def _datasets(data):
+    if isinstance(data, pd.Series):
+        return [dict(data)]
+    if isinstance(data, pd.DataFrame):
+        return [dict(column.dropna()) for _, column in data.T.iterrows()]
+    if isinstance(data, dict):
+        return [data]
+    return list(data)
+
+
+def compare_data(data, styles=DEFAULT_STYLES,
+                 compare_style=DEFAULT_COMPARE_STYLE, threshold=0):
+    """Compute the value, text and reverse_flux shown for each element.
+
+    Returns a dictionary with the IDs in the data as keys, and dictionaries
+    with value (None for no data), text and reverse_flux as values. Infinite
+    values are 'Infinity' or '-Infinity', because JSON has no number for them.
+
+    :param data: One dataset or a list of two, as dictionaries, a pandas
+                 Series or a pandas DataFrame.
+
+    :param styles: The reaction_styles or metabolite_styles.
+
+    :param str compare_style: 'diff', 'fold' or 'log2_fold'.
+
+    :param float threshold: Numeric values smaller than this are set to zero,
+                            like reaction_data_threshold in the frontend.
+
+    """
+    datasets = _datasets(data)
+    if len(datasets) not in (1, 2):
+        raise ValueError('Data must have 1 or 2 datasets')
+    styles = DEFAULT_STYLES if styles is None else styles
+    compare_style = compare_style or DEFAULT_COMPARE_STYLE
+
+    ids = list(datasets[0])
+    for dataset in datasets[1:]:
+        ids.extend(i for i in dataset if i not in datasets[0])
+    raw_values = [[dataset.get(i) for i in ids] for dataset in datasets]
+    parsed_values = [to_floats(raw) for raw in raw_values]
+    if threshold:
+        for raw, parsed in zip(raw_values, parsed_values):
+            with np.errstate(invalid='ignore'):
+                small = np.flatnonzero(np.abs(parsed) < threshold)
+            parsed[small] = 0.0
+            for i in small:
+                raw[i] = 0
+    values = float_for_data(*parsed_values, styles=styles,
+                            compare_style=compare_style)
+    texts = text_for_data(raw_values, parsed_values, values)
+    reverse = reverse_flux_for_data(parsed_values[0])
+    return {
+        element_id: {
+            'value': (None if math.isnan(value) else
+                      value if math.isfinite(value) else
+                      js_number_string(value)),
+            'text': text,
+            'reverse_flux': bool(reversed_flux),
+        }
+        for element_id, value, text, reversed_flux
+        in zip(ids, values.tolist(), texts, reverse.tolist())
+    }
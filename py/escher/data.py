@@ -0,0 +1,168 @@
+"""Read large data files for a map in chunks.
+
+Expression matrices and other omics data files can be much larger than the
+part that a map shows. read_data reads CSV, TSV and Parquet files a chunk at a
+time and only keeps the columns and the IDs that the map can show, so memory
+use depends on the map and the chunk size, not on the size of the file:
+
+.. code:: python
+
+    from escher.data import read_data
+
+    gene_data = read_data('RNA-seq.csv', map_data=map_json, kind='gene',
+                          columns=['aerobic', 'anaerobic'])
+    builder = Builder(map_json=map_json, gene_data=gene_data)
+
+The result has the same form as escher.plots.convert_data returns for a
+pandas DataFrame: a list with a dictionary of ID and value for each column,
+without missing values. With a single column name, it is one dictionary, as
+for a pandas Series.
+
+Files ending in .tsv, .tab or .txt are read as tab separated, .parquet and .pq
+files as Parquet, and other files as CSV. Compressed CSV and TSV files, such as
+data.csv.gz, are read as well. Reading Parquet files requires pyarrow.
+
+"""
+
+from escher import metrics
+from escher.prune import data_identifiers, DATA_KINDS
+
+from itertools import compress
+from os.path import getsize
+import re
+
+import pandas as pd
+
+#: The number of rows read at a time
+DEFAULT_CHUNKSIZE = 100000
+
+_compression = re.compile(r'\.(gz|bz2|xz|zip|zst)$', re.IGNORECASE)
+
+
+def _file_format(filepath):
+    name = _compression.sub('', str(filepath)).lower()
+    if name.endswith(('.parquet', '.pq')):
+        return 'parquet'
+    if name.endswith(('.tsv', '.tab', '.txt')):
+        return 'tsv'
+    return 'csv'
+
+
+def _select(names, id_column, columns):
+    """Return the ID column and the value columns, by name."""
+    if id_column is None:
+        id_column = names[0]
+    elif isinstance(id_column, int):
+        id_column = names[id_column]
+    if columns is None:
+        columns = [name for name in names if name != id_column]
+    missing = [name for name in [id_column] + columns if name not in names]
+    if missing:
+        raise ValueError('Columns not found in the file: %s' %
+                         ', '.join(str(name) for name in missing))
+    return id_column, columns
+
+
+def _csv_chunks(filepath, sep, id_column, columns, chunksize):
+    names = list(pd.read_csv(filepath, sep=sep, nrows=0).columns)
+    id_column, columns = _select(names, id_column, columns)
+    # by position, so only these columns are parsed
+    positions = [names.index(name) for name in [id_column] + columns]
+    chunks = pd.read_csv(filepath, sep=sep, usecols=positions,
+                         dtype={id_column: str}, chunksize=chunksize)
+    return id_column, columns, chunks
+
+
+def _parquet_chunks(filepath, id_column, columns, chunksize):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError('Reading Parquet files requires pyarrow. Install it '
+                          'with: pip install pyarrow')
+    parquet_file = pq.ParquetFile(filepath)
+    names = parquet_file.schema_arrow.names
+    if id_column is None:
+        # the index of a DataFrame saved by pandas is stored as a column
+        metadata = parquet_file.schema_arrow.pandas_metadata or {}
+        index_columns = [name for name in metadata.get('index_columns', [])
+                         if isinstance(name, str)]
+        if index_columns:
+            id_column = index_columns[0]
+    id_column, columns = _select(names, id_column, columns)
+    batches = parquet_file.iter_batches(batch_size=chunksize,
+                                        columns=[id_column] + columns)
+    return id_column, columns, (batch.to_pandas() for batch in batches)
+
+
+def read_data(filepath, map_data=None, kind='gene', columns=None,
+              id_column=None, sep=None, chunksize=DEFAULT_CHUNKSIZE,
+              model_data=None, identifiers=None):
+    """Read reaction, metabolite or gene data from a file in chunks, keeping
+    only the IDs that the map can show.
+
+    Returns a list with a dictionary of ID and value for each column, or a
+    dictionary if columns is a single name.
+
+    :param str filepath: A CSV, TSV or Parquet file.
+
+    :param map_data: The map as a JSON string or as the parsed list of header
+                     and body. Without a map or identifiers, every ID is kept.
+
+    :param str kind: 'reaction', 'metabolite' or 'gene'.
+
+    :param columns: The name of a column, or a list of names. Defaults to
+                    every column but the IDs.
+
+    :param id_column: The name or position of the column with the IDs.
+                      Defaults to the first column, or to the index of a
+                      DataFrame saved by pandas as Parquet.
+
+    :param str sep: The separator for CSV and TSV files. Defaults to a tab for
+                    .tsv, .tab and .txt files, and to a comma otherwise.
+
+    :param int chunksize: The number of rows read at a time.
+
+    :param model_data: Also keep the IDs of a model in the COBRA JSON format,
+                       as for data_identifiers.
+
+    :param identifiers: A set of IDs and names to keep, instead of the IDs
+                        from map_data and model_data.
+
+    """
+    if kind not in DATA_KINDS:
+        raise ValueError('Bad data kind %s. Must be one of %s' %
+                         (kind, ', '.join(DATA_KINDS)))
+    if identifiers is None and (map_data or model_data):
+        identifiers = data_identifiers(map_data, model_data)[kind]
+    single = isinstance(columns, str)
+    if single:
+        columns = [columns]
+    file_format = _file_format(filepath)
+
+    with metrics.timer('read_data', kind=kind, format=file_format) as timer:
+        timer.add_bytes(getsize(filepath))
+        if file_format == 'parquet':
+            id_column, columns, chunks = _parquet_chunks(
+                filepath, id_column, columns, chunksize
+            )
+        else:
+            if sep is None:
+                sep = '\t' if file_format == 'tsv' else ','
+            id_column, columns, chunks = _csv_chunks(
+                filepath, sep, id_column, columns, chunksize
+            )
+        datasets = [{} for _ in columns]
+        for chunk in chunks:
+            ids = chunk[id_column]
+            if identifiers is not None:
+                chunk = chunk[ids.isin(identifiers)]
+            else:
+                chunk = chunk[ids.notna()]
+            ids = chunk[id_column].astype(str).tolist()
+            for dataset, column in zip(datasets, columns):
+                values = chunk[column]
+                keep = values.notna()
+                dataset.update(zip(compress(ids, keep.tolist()),
+                                   values[keep].tolist()))
+
+    return datasets[0] if single else datasets
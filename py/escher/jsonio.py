@@ -0,0 +1,137 @@
+"""Fast JSON parsing and writing for maps and models.
+
+Escher reads and writes JSON documents of many megabytes. This module uses
+orjson or ujson when one is installed, and the standard library json module
+otherwise:
+
+.. code:: python
+
+    from escher import jsonio
+
+    jsonio.BACKEND
+    # 'orjson'
+    with open('iJO1366.json', 'rb') as f:
+        model_data = jsonio.load(f)
+    jsonio.dumps(model_data)
+
+loads accepts bytes as well as strings, so files can be parsed without
+decoding them first, and dumpb returns UTF-8 bytes, so the output can be
+written without encoding it. The output is compact, without spaces, and
+non-ASCII characters are not escaped.
+
+Every backend accepts the same documents: text that the backend cannot parse,
+such as NaN, is parsed again with the standard library. Values that the
+backend cannot write, such as dictionaries with integer keys, are also written
+with the standard library. orjson writes NaN and infinite floats as null.
+
+"""
+
+import io
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+#: The backends, from fastest to slowest
+BACKENDS = ('orjson', 'ujson', 'json')
+
+
+def _json_dumps(obj):
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+
+def _json_dumpb(obj):
+    return _json_dumps(obj).encode('utf-8')
+
+
+def _orjson_dumpb(obj):
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def _ujson_dumpb(obj):
+    return ujson.dumps(obj, ensure_ascii=False,
+                       escape_forward_slashes=False).encode('utf-8')
+
+
+_backends = {
+    'json': (json.loads, _json_dumpb),
+    'orjson': (orjson and orjson.loads, _orjson_dumpb),
+    'ujson': (ujson and ujson.loads, _ujson_dumpb),
+}
+
+
+def available_backends():
+    """Return the names of the installed backends, from fastest to slowest."""
+    return [name for name in BACKENDS
+            if name == 'json' or globals()[name] is not None]
+
+
+def set_backend(name=None):
+    """Choose the backend.
+
+    :param str name: 'orjson', 'ujson' or 'json'. Defaults to the fastest
+                     installed backend.
+
+    """
+    global BACKEND, _loads, _dumpb
+    if name is None:
+        name = available_backends()[0]
+    if name not in available_backends():
+        raise ValueError('The JSON backend %s is not available. Choose one of '
+                         '%s' % (name, ', '.join(available_backends())))
+    BACKEND = name
+    _loads, _dumpb = _backends[name]
+
+
+#: The name of the backend in use
+BACKEND = None
+_loads = _dumpb = None
+set_backend()
+
+
+def loads(data):
+    """Parse a JSON document from a str, bytes or bytearray."""
+    try:
+        return _loads(data)
+    except ValueError:
+        if BACKEND == 'json':
+            raise
+        # raises the error of the standard library if it fails too
+        return json.loads(data)
+
+
+def dumpb(obj):
+    """Return obj as a JSON document in UTF-8 bytes."""
+    try:
+        return _dumpb(obj)
+    except (TypeError, ValueError, OverflowError):
+        if BACKEND == 'json':
+            raise
+        return _json_dumpb(obj)
+
+
+def dumps(obj):
+    """Return obj as a JSON string."""
+    if BACKEND == 'json':
+        return _json_dumps(obj)
+    return dumpb(obj).decode('utf-8')
+
+
+def load(f):
+    """Parse a JSON document from a file opened in text or binary mode."""
+    return loads(f.read())
+
+
+def dump(obj, f):
+    """Write obj as JSON to a file opened in text or binary mode."""
+    if isinstance(f, io.TextIOBase):
+        f.write(dumps(obj))
+    else:
+        f.write(dumpb(obj))
@@ -0,0 +1,231 @@
+"""Simplified versions of Escher maps for zoomed-out views.
+
+A pyramid is a list of levels. Each level has a max_zoom and a simplified copy
+of the map, which the Builder shows while the zoom scale is below max_zoom:
+
+.. code:: python
+
+    from escher import lod
+
+    pyramid = lod.build_pyramid(map_data)
+    lod.save_pyramid(pyramid, 'my_map.lod.json')
+
+    builder = Builder(map_json='my_map.json',
+                      level_of_detail='my_map.lod.json')
+
+"""
+
+from escher import metrics, jsonio
+
+from copy import deepcopy
+import math
+
+#: The levels built by default, from the least to the most simplified
+DEFAULT_LEVELS = [
+    {'max_zoom': 0.4, 'drop_secondary_metabolites': True,
+     'merge_tolerance': 5.0},
+    {'max_zoom': 0.15, 'drop_secondary_metabolites': True,
+     'drop_multimarkers': True, 'label_cell_size': 1000},
+]
+
+
+def _segment_degrees(reaction):
+    degrees = {}
+    for segment in reaction['segments'].values():
+        for node_id in (segment['from_node_id'], segment['to_node_id']):
+            degrees[node_id] = degrees.get(node_id, 0) + 1
+    return degrees
+
+
+def _drop_secondary_metabolites(nodes, reactions):
+    secondary = {node_id for node_id, node in nodes.items()
+                 if node['node_type'] == 'metabolite'
+                 and not node.get('node_is_primary', True)}
+    for reaction in reactions.values():
+        segments = reaction['segments']
+        for segment_id in list(segments):
+            segment = segments[segment_id]
+            if (segment['from_node_id'] in secondary or
+                    segment['to_node_id'] in secondary):
+                del segments[segment_id]
+        # remove multimarkers that only led to secondary metabolites
+        while True:
+            degrees = _segment_degrees(reaction)
+            dangling = [s_id for s_id, s in segments.items()
+                        if any(nodes[n]['node_type'] == 'multimarker' and
+                               degrees[n] == 1
+                               for n in (s['from_node_id'], s['to_node_id'])
+                               if n in nodes)]
+            if not dangling:
+                break
+            for segment_id in dangling:
+                del segments[segment_id]
+    for node_id in secondary:
+        del nodes[node_id]
+
+
+def _distance_to_line(point, start, end):
+    dx = end['x'] - start['x']
+    dy = end['y'] - start['y']
+    length = math.hypot(dx, dy)
+    if length == 0:
+        return math.hypot(point['x'] - start['x'], point['y'] - start['y'])
+    return abs(dx * (start['y'] - point['y']) -
+               dy * (start['x'] - point['x'])) / length
+
+
+def _merge_segments(nodes, reaction, tolerance, drop_all):
+    """Replace pairs of segments that meet at a multimarker with one segment.
+
+    With drop_all, every multimarker between two segments is removed.
+    Otherwise, only those within tolerance of the line between the outer
+    nodes, where neither segment is curved.
+
+    """
+    segments = reaction['segments']
+    merged = True
+    while merged:
+        merged = False
+        by_node = {}
+        for segment_id, segment in segments.items():
+            for node_id in (segment['from_node_id'], segment['to_node_id']):
+                by_node.setdefault(node_id, []).append(segment_id)
+        for marker_id, segment_ids in by_node.items():
+            node = nodes.get(marker_id)
+            if (node is None or node['node_type'] != 'multimarker' or
+                    len(segment_ids) != 2):
+                continue
+            first, second = (segments[s] for s in segment_ids)
+            start_id = (first['to_node_id'] if first['from_node_id'] == marker_id
+                        else first['from_node_id'])
+            end_id = (second['to_node_id'] if second['from_node_id'] == marker_id
+                      else second['from_node_id'])
+            if start_id == end_id or start_id not in nodes or end_id not in nodes:
+                continue
+            if not drop_all:
+                curved = any(s['b1'] is not None or s['b2'] is not None
+                             for s in (first, second))
+                if curved or _distance_to_line(node, nodes[start_id],
+                                               nodes[end_id]) > tolerance:
+                    continue
+            # keep the control points next to the outer nodes
+            b1 = (first['b1'] if first['from_node_id'] == start_id
+                  else first['b2'])
+            b2 = (second['b2'] if second['to_node_id'] == end_id
+                  else second['b1'])
+            del segments[segment_ids[1]]
+            segments[segment_ids[0]] = {
+                'from_node_id': start_id,
+                'to_node_id': end_id,
+                'b1': b1,
+                'b2': b2,
+            }
+            merged = True
+            break
+
+
+def _aggregate_text_labels(text_labels, cell_size):
+    """Keep one label for each cell of a grid, with the longest text, at the
+    center of the labels in the cell.
+
+    """
+    cells = {}
+    for label_id, label in text_labels.items():
+        key = (math.floor(label['x'] / cell_size),
+               math.floor(label['y'] / cell_size))
+        cells.setdefault(key, []).append((label_id, label))
+    aggregated = {}
+    for members in cells.values():
+        label_id, label = max(members, key=lambda m: len(m[1]['text']))
+        aggregated[label_id] = {
+            'text': label['text'],
+            'x': sum(m[1]['x'] for m in members) / len(members),
+            'y': sum(m[1]['y'] for m in members) / len(members),
+        }
+    return aggregated
+
+
+def simplify_map(map_data, drop_secondary_metabolites=True,
+                 merge_tolerance=5.0, drop_multimarkers=False,
+                 label_cell_size=None):
+    """Return a simplified copy of a map. Reaction and node IDs are kept, so
+    data can be shown on the simplified map.
+
+    :param map_data: The map as a JSON string or as the parsed list of header
+                     and body.
+
+    :param bool drop_secondary_metabolites: Remove secondary metabolites and
+                                            the segments that lead to them.
+
+    :param float merge_tolerance: Merge straight segments that meet at a
+                                  multimarker within this distance of a line.
+
+    :param bool drop_multimarkers: Remove every multimarker between two
+                                   segments, merging the segments.
+
+    :param float label_cell_size: If given, aggregate the text labels to one
+                                  label per grid cell of this size.
+
+    """
+    if isinstance(map_data, str):
+        map_data = jsonio.loads(map_data)
+    header, body = deepcopy(map_data[0]), deepcopy(map_data[1])
+    nodes = body.get('nodes', {})
+    reactions = body.get('reactions', {})
+
+    if drop_secondary_metabolites:
+        _drop_secondary_metabolites(nodes, reactions)
+    if drop_multimarkers or merge_tolerance:
+        for reaction in reactions.values():
+            _merge_segments(nodes, reaction, merge_tolerance or 0,
+                            drop_multimarkers)
+
+    # remove the nodes that are no longer connected
+    connected = set()
+    for reaction in reactions.values():
+        connected.update(_segment_degrees(reaction))
+    for node_id in list(nodes):
+        if nodes[node_id]['node_type'] != 'metabolite' and \
+           node_id not in connected:
+            del nodes[node_id]
+
+    if label_cell_size:
+        body['text_labels'] = _aggregate_text_labels(
+            body.get('text_labels', {}), label_cell_size
+        )
+    return [header, body]
+
+
+def build_pyramid(map_data, levels=DEFAULT_LEVELS):
+    """Build simplified versions of a map.
+
+    Returns a list of levels, each a dictionary with max_zoom and map.
+
+    :param map_data: The map as a JSON string or as the parsed list of header
+                     and body.
+
+    :param levels: A list of dictionaries with a max_zoom and the arguments
+                   for simplify_map.
+
+    """
+    if isinstance(map_data, str):
+        map_data = jsonio.loads(map_data)
+    pyramid = []
+    for level in levels:
+        options = {k: v for k, v in level.items() if k != 'max_zoom'}
+        with metrics.timer('lod.simplify_map', max_zoom=level['max_zoom']):
+            simplified = simplify_map(map_data, **options)
+        pyramid.append({'max_zoom': level['max_zoom'], 'map': simplified})
+    return pyramid
+
+
+def save_pyramid(pyramid, filepath):
+    """Save a pyramid from build_pyramid as a JSON file."""
+    with open(filepath, 'wb') as f:
+        jsonio.dump(pyramid, f)
+
+
+def load_pyramid(filepath):
+    """Load a pyramid saved with save_pyramid."""
+    with open(filepath, 'rb') as f:
+        return jsonio.load(f)
@@ -0,0 +1,200 @@
+"""Structural diffs and patches for maps.
+
+.. code:: python
+
+    import escher
+
+    changes = escher.diff(old_map, new_map)
+    escher.patch(old_map, changes) == new_map
+    # True
+
+A diff only describes what changed, so it is much smaller than a map and can
+be stored, or sent instead of the new map. It is a dictionary that can be
+saved as JSON, with the version of the format and these keys when something
+changed:
+
+- header and canvas: the fields that changed.
+- nodes, reactions and text_labels: the changes to each collection.
+
+Fields that changed are listed as ``{'set': {key: value}, 'unset': [key]}``.
+The changes to a collection are:
+
+- added: the new elements by ID.
+- removed: the IDs of the removed elements.
+- relabeled: the old and new IDs of elements that only changed their ID.
+- moved: for nodes and text labels that only changed their position, the new
+  coordinates.
+- changed: the fields that changed for each element. The segments of a
+  reaction are a collection, so only the segments that changed are listed.
+
+Both functions take time linear in the size of the maps.
+
+"""
+
+from escher import jsonio
+from escher.validate import element_hash
+
+#: The version of the diff format
+DIFF_VERSION = 1
+
+_POSITION_KEYS = frozenset(['x', 'y', 'label_x', 'label_y'])
+
+_missing = object()
+
+# the collections in the map body, with their nested collections, and whether
+# their elements can move
+_COLLECTIONS = (
+    ('nodes', (), True),
+    ('reactions', ('segments',), False),
+    ('text_labels', (), True),
+)
+
+
+def _parse(map_data):
+    if isinstance(map_data, (str, bytes)):
+        return jsonio.loads(map_data)
+    return map_data
+
+
+def _diff_fields(old, new, nested=()):
+    changes = {}
+    set_fields = {key: value for key, value in new.items()
+                  if key not in nested and old.get(key, _missing) != value}
+    if set_fields:
+        changes['set'] = set_fields
+    unset = [key for key in old if key not in new]
+    if unset:
+        changes['unset'] = unset
+    for key in nested:
+        if key in new:
+            collection = _diff_collection(old.get(key, {}), new[key])
+            if collection:
+                changes[key] = collection
+    return changes
+
+
+def _diff_collection(old, new, nested=(), moves=False):
+    removed = [key for key in old if key not in new]
+    added = {key: value for key, value in new.items() if key not in old}
+    changed, moved = {}, {}
+    for key, value in new.items():
+        if key not in old or old[key] == value:
+            continue
+        fields = _diff_fields(old[key], value, nested)
+        if moves and list(fields) == ['set'] and \
+           _POSITION_KEYS.issuperset(fields['set']):
+            moved[key] = fields['set']
+        else:
+            changed[key] = fields
+
+    # elements that were removed and added again with another ID
+    relabeled = {}
+    if removed and added:
+        by_hash = {}
+        for key in removed:
+            by_hash.setdefault(element_hash(old[key]), []).append(key)
+        for key in list(added):
+            candidates = by_hash.get(element_hash(added[key]))
+            if candidates and old[candidates[-1]] == added[key]:
+                relabeled[candidates.pop()] = key
+                del added[key]
+        removed = [key for key in removed if key not in relabeled]
+
+    result = {}
+    for name, value in (('added', added), ('removed', removed),
+                        ('relabeled', relabeled), ('moved', moved),
+                        ('changed', changed)):
+        if value:
+            result[name] = value
+    return result
+
+
+def diff(map_a, map_b):
+    """Return the changes from map_a to map_b.
+
+    :param map_a: A map as a JSON string or as the parsed list of header and
+                  body.
+
+    :param map_b: Another version of the map, in the same form.
+
+    """
+    map_a, map_b = _parse(map_a), _parse(map_b)
+    changes = {'version': DIFF_VERSION}
+    header = _diff_fields(map_a[0], map_b[0])
+    if header:
+        changes['header'] = header
+    body_a, body_b = map_a[1], map_b[1]
+    canvas = _diff_fields(body_a.get('canvas', {}), body_b.get('canvas', {}))
+    if canvas:
+        changes['canvas'] = canvas
+    for collection, nested, moves in _COLLECTIONS:
+        collection_diff = _diff_collection(body_a.get(collection, {}),
+                                           body_b.get(collection, {}),
+                                           nested, moves)
+        if collection_diff:
+            changes[collection] = collection_diff
+    return changes
+
+
+def _get(elements, key):
+    try:
+        return elements[key]
+    except KeyError:
+        raise ValueError('The diff does not apply to the map. Could not find '
+                         'the element %s' % key)
+
+
+def _apply_fields(element, changes):
+    for key in changes.get('unset', ()):
+        element.pop(key, None)
+    element.update(changes.get('set', {}))
+    for key, collection_diff in changes.items():
+        if key not in ('set', 'unset'):
+            _apply_collection(element.setdefault(key, {}), collection_diff)
+
+
+def _apply_collection(elements, changes):
+    relabeled = {new: _get(elements, old)
+                 for old, new in changes.get('relabeled', {}).items()}
+    for old in changes.get('relabeled', {}):
+        del elements[old]
+    elements.update(relabeled)
+    for key in changes.get('removed', ()):
+        _get(elements, key)
+        del elements[key]
+    elements.update(changes.get('added', {}))
+    for key, position in changes.get('moved', {}).items():
+        _get(elements, key).update(position)
+    for key, fields in changes.get('changed', {}).items():
+        _apply_fields(_get(elements, key), fields)
+
+
+def patch(map_data, changes):
+    """Apply the changes from diff to a map, and return the new map. The
+    given map is not modified.
+
+    :param map_data: A map as a JSON string or as the parsed list of header
+                     and body.
+
+    :param dict changes: The output of diff.
+
+    """
+    if changes.get('version') != DIFF_VERSION:
+        raise ValueError('Unsupported diff version %s' %
+                         changes.get('version'))
+    # copies, so neither the map nor the diff is shared with the result
+    if isinstance(map_data, (str, bytes)):
+        new_map = jsonio.loads(map_data)
+    else:
+        new_map = jsonio.loads(jsonio.dumpb(map_data))
+    changes = jsonio.loads(jsonio.dumpb(changes))
+
+    header, body = new_map[0], new_map[1]
+    _apply_fields(header, changes.get('header', {}))
+    if 'canvas' in changes:
+        _apply_fields(body.setdefault('canvas', {}), changes['canvas'])
+    for collection, _, _ in _COLLECTIONS:
+        if collection in changes:
+            _apply_collection(body.setdefault(collection, {}),
+                              changes[collection])
+    return new_map
@@ -0,0 +1,360 @@
+"""Array-backed Escher maps with spatial queries.
+
+.. code:: python
+
+    from escher import Map
+
+    escher_map = Map.load('e_coli_core.Core metabolism.json')
+    escher_map.nodes_in_bbox(0, 0, 1000, 1000)
+    escher_map.nearest_node(500, 500, node_type='metabolite')
+
+"""
+
+from escher import jsonio
+
+import math
+
+import numpy as np
+
+#: The average number of nodes in each cell of the spatial index
+NODES_PER_CELL = 4
+
+
+class GridIndex(object):
+    """A uniform grid over a set of points, for bbox, radius and nearest point
+    queries.
+
+    Points are sorted by the key of their grid cell, so the points in a row of
+    cells are a contiguous slice.
+
+    :param xy: An array of points with shape (n, 2).
+
+    :param float cell_size: The size of each square cell. By default, chosen
+                            so that each cell holds about NODES_PER_CELL
+                            points.
+
+    """
+
+    def __init__(self, xy, cell_size=None):
+        self.xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        n = len(self.xy)
+        if n > 0:
+            self.x_min, self.y_min = self.xy.min(axis=0)
+            x_max, y_max = self.xy.max(axis=0)
+        else:
+            self.x_min = self.y_min = x_max = y_max = 0.0
+        if cell_size is None:
+            area = max(x_max - self.x_min, 1.0) * max(y_max - self.y_min, 1.0)
+            cell_size = math.sqrt(area * NODES_PER_CELL / max(n, 1))
+        self.cell_size = max(float(cell_size), 1e-9)
+        self.columns = int((x_max - self.x_min) // self.cell_size) + 1
+        self.rows = int((y_max - self.y_min) // self.cell_size) + 1
+
+        keys = self._keys(self.xy)
+        self.order = np.argsort(keys, kind='stable')
+        self.sorted_keys = keys[self.order]
+
+    def _cells(self, x, y):
+        column = np.floor((np.asarray(x) - self.x_min) / self.cell_size)
+        row = np.floor((np.asarray(y) - self.y_min) / self.cell_size)
+        return (np.clip(column, 0, self.columns - 1).astype(np.int64),
+                np.clip(row, 0, self.rows - 1).astype(np.int64))
+
+    def _keys(self, xy):
+        columns, rows = self._cells(xy[:, 0], xy[:, 1])
+        return rows * self.columns + columns
+
+    def _in_cells(self, sorted_keys, values, x_min, y_min, x_max, y_max):
+        """The values for the cells that overlap a bbox, from values sorted by
+        the keys of their cells.
+
+        """
+        # also empty for NaN bounds
+        if len(sorted_keys) == 0 or not (x_min <= x_max and y_min <= y_max):
+            return np.empty(0, dtype=np.int64)
+        (column_min, column_max), (row_min, row_max) = self._cells(
+            [x_min, x_max], [y_min, y_max]
+        )
+        rows = np.arange(row_min, row_max + 1) * self.columns
+        starts = np.searchsorted(sorted_keys, rows + column_min, 'left')
+        ends = np.searchsorted(sorted_keys, rows + column_max, 'right')
+        if len(starts) == 1:
+            return values[starts[0]:ends[0]]
+        return np.concatenate([values[s:e] for s, e in zip(starts, ends)])
+
+    def candidates(self, x_min, y_min, x_max, y_max):
+        """Indices of the points in the cells that overlap a bbox."""
+        return self._in_cells(self.sorted_keys, self.order,
+                              x_min, y_min, x_max, y_max)
+
+    def in_bbox(self, x_min, y_min, x_max, y_max):
+        """Indices of the points in a bbox, including its edges."""
+        found = self.candidates(x_min, y_min, x_max, y_max)
+        xy = self.xy[found]
+        inside = ((xy[:, 0] >= x_min) & (xy[:, 0] <= x_max) &
+                  (xy[:, 1] >= y_min) & (xy[:, 1] <= y_max))
+        return np.sort(found[inside])
+
+    def within_radius(self, x, y, radius):
+        """Indices of the points within a distance of (x, y)."""
+        found = self.candidates(x - radius, y - radius, x + radius, y + radius)
+        distances = np.hypot(self.xy[found, 0] - x, self.xy[found, 1] - y)
+        return np.sort(found[distances <= radius])
+
+    def nearest(self, x, y, mask=None):
+        """Index of and distance to the point nearest to (x, y), or (None,
+        None) if there are no points.
+
+        :param mask: An optional boolean array. Only points where mask is True
+                     are considered.
+
+        """
+        if not (math.isfinite(x) and math.isfinite(y)):
+            raise ValueError('Bad point (%s, %s). Coordinates must be finite'
+                             % (x, y))
+        if len(self.xy) == 0 or (mask is not None and not mask.any()):
+            return None, None
+        # grow a square around the point until it holds a candidate that is
+        # closer than the edge of the square
+        half = self.cell_size
+        while True:
+            found = self.candidates(x - half, y - half, x + half, y + half)
+            if mask is not None:
+                found = found[mask[found]]
+            if len(found) > 0:
+                distances = np.hypot(self.xy[found, 0] - x,
+                                     self.xy[found, 1] - y)
+                best = np.argmin(distances)
+                if distances[best] <= half:
+                    return int(found[best]), float(distances[best])
+                half = distances[best]
+            else:
+                half *= 2
+
+
+class BboxIndex(object):
+    """A uniform grid over a set of bboxes, for overlap queries.
+
+    Each bbox is listed in every cell that it overlaps, sorted by the key of
+    the cell, so a query only looks at the bboxes in the cells that it
+    overlaps.
+
+    :param bboxes: An array of (x_min, y_min, x_max, y_max) with shape (n, 4).
+                   Rows with NaN are never found.
+
+    :param float cell_size: The size of each square cell. By default, chosen
+                            so that each cell holds about NODES_PER_CELL
+                            bboxes, and is not smaller than most bboxes.
+
+    """
+
+    def __init__(self, bboxes, cell_size=None):
+        self.bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 4)
+        valid = np.flatnonzero(~np.isnan(self.bboxes).any(axis=1))
+        lows, highs = self.bboxes[valid, :2], self.bboxes[valid, 2:]
+        if cell_size is None and len(valid) > 0:
+            extent = np.maximum(highs.max(axis=0) - lows.min(axis=0), 1.0)
+            cell_size = max(
+                math.sqrt(extent.prod() * NODES_PER_CELL / len(valid)),
+                float(np.median((highs - lows).max(axis=1))),
+            )
+        # the cells of the grid over the corners
+        self.grid = grid = GridIndex(np.vstack([lows, highs]), cell_size)
+        column_min, row_min = grid._cells(lows[:, 0], lows[:, 1])
+        column_max, row_max = grid._cells(highs[:, 0], highs[:, 1])
+        widths = column_max - column_min + 1
+        counts = widths * (row_max - row_min + 1)
+        # a cell key for each cell of each bbox
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+                                                      counts)
+        widths = np.repeat(widths, counts)
+        columns = np.repeat(column_min, counts) + offsets % widths
+        rows = np.repeat(row_min, counts) + offsets // widths
+        keys = rows * grid.columns + columns
+        order = np.argsort(keys, kind='stable')
+        self.sorted_keys = keys[order]
+        self.order = np.repeat(valid, counts)[order]
+
+    def overlapping(self, x_min, y_min, x_max, y_max):
+        """Indices of the bboxes that overlap a bbox, including its edges."""
+        found = np.unique(self.grid._in_cells(self.sorted_keys, self.order,
+                                              x_min, y_min, x_max, y_max))
+        b = self.bboxes[found]
+        overlap = ((b[:, 0] <= x_max) & (b[:, 2] >= x_min) &
+                   (b[:, 1] <= y_max) & (b[:, 3] >= y_min))
+        return found[overlap]
+
+
+class Map(object):
+    """An Escher map parsed into arrays, with a spatial index of its nodes.
+
+    The arrays are computed once from the map data, which is available as the
+    data attribute, and are not updated if the data changes.
+
+    :param map_data: The map as a JSON string, or as the parsed list of header
+                     and body.
+
+    """
+
+    def __init__(self, map_data):
+        if isinstance(map_data, str):
+            map_data = jsonio.loads(map_data)
+        self.data = map_data
+        self.header, body = map_data[0], map_data[1]
+
+        nodes = body.get('nodes', {})
+        #: IDs of the nodes
+        self.node_ids = list(nodes.keys())
+        self._node_index = {n: i for i, n in enumerate(self.node_ids)}
+        #: Node coordinates with shape (n, 2)
+        self.node_xy = np.array([(node['x'], node['y'])
+                                 for node in nodes.values()],
+                                dtype=float).reshape(-1, 2)
+        #: Node types
+        self.node_types = np.array([node['node_type']
+                                    for node in nodes.values()], dtype=object)
+
+        reactions = body.get('reactions', {})
+        #: IDs of the reactions
+        self.reaction_ids = list(reactions.keys())
+        self._reaction_index = {r: i for i, r in enumerate(self.reaction_ids)}
+        segment_ids = []
+        segment_reactions = []
+        segment_nodes = []
+        beziers = []
+        for i, reaction in enumerate(reactions.values()):
+            for segment_id, segment in reaction['segments'].items():
+                segment_ids.append(segment_id)
+                segment_reactions.append(i)
+                segment_nodes.append((
+                    self._node_index.get(segment['from_node_id'], -1),
+                    self._node_index.get(segment['to_node_id'], -1),
+                ))
+                b1 = segment.get('b1') or {'x': np.nan, 'y': np.nan}
+                b2 = segment.get('b2') or {'x': np.nan, 'y': np.nan}
+                beziers.append((b1['x'], b1['y'], b2['x'], b2['y']))
+        #: IDs of the segments
+        self.segment_ids = segment_ids
+        #: Row of the reaction for each segment
+        self.segment_reactions = np.array(segment_reactions, dtype=np.int64)
+        #: Rows of the from and to nodes for each segment, with shape (n, 2).
+        #: Missing nodes are -1.
+        self.segment_nodes = np.array(segment_nodes,
+                                      dtype=np.int64).reshape(-1, 2)
+        #: b1 and b2 for each segment as (b1_x, b1_y, b2_x, b2_y), NaN when
+        #: there are no bezier points
+        self.segment_beziers = np.array(beziers, dtype=float).reshape(-1, 4)
+
+        text_labels = body.get('text_labels', {})
+        #: IDs of the text labels
+        self.text_label_ids = list(text_labels.keys())
+        #: Text label coordinates with shape (n, 2)
+        self.text_label_xy = np.array([(label['x'], label['y'])
+                                       for label in text_labels.values()],
+                                      dtype=float).reshape(-1, 2)
+
+        self.reaction_bboxes = self._reaction_bboxes()
+        self.reaction_index = BboxIndex(self.reaction_bboxes)
+        self.node_index = GridIndex(self.node_xy)
+        self.text_label_index = GridIndex(self.text_label_xy)
+
+    @classmethod
+    def load(cls, filepath):
+        """Load a map from a JSON file."""
+        with open(filepath, 'rb') as f:
+            return cls(jsonio.load(f))
+
+    def _reaction_bboxes(self):
+        """(x_min, y_min, x_max, y_max) of the segments of each reaction,
+        including bezier points. NaN for reactions without segments.
+
+        """
+        bboxes = np.full((len(self.reaction_ids), 4), np.nan)
+        if len(self.segment_ids) == 0:
+            return bboxes
+        missing = self.segment_nodes < 0
+        ends = self.node_xy[np.where(missing, 0, self.segment_nodes)]
+        ends[missing] = np.nan
+        # x and y of from, to, b1 and b2 for each segment
+        xs = np.column_stack([ends[:, 0, 0], ends[:, 1, 0],
+                              self.segment_beziers[:, 0],
+                              self.segment_beziers[:, 2]])
+        ys = np.column_stack([ends[:, 0, 1], ends[:, 1, 1],
+                              self.segment_beziers[:, 1],
+                              self.segment_beziers[:, 3]])
+        mins = np.column_stack([np.where(np.isnan(xs), np.inf, xs).min(axis=1),
+                                np.where(np.isnan(ys), np.inf, ys).min(axis=1)])
+        maxs = np.column_stack([np.where(np.isnan(xs), -np.inf, xs).max(axis=1),
+                                np.where(np.isnan(ys), -np.inf, ys).max(axis=1)])
+        lows = np.full((len(self.reaction_ids), 2), np.inf)
+        highs = np.full((len(self.reaction_ids), 2), -np.inf)
+        np.minimum.at(lows, self.segment_reactions, mins)
+        np.maximum.at(highs, self.segment_reactions, maxs)
+        bboxes = np.hstack([lows, highs])
+        bboxes[~np.isfinite(bboxes).all(axis=1)] = np.nan
+        return bboxes
+
+    def bbox(self):
+        """(x_min, y_min, x_max, y_max) of all nodes, bezier points and text
+        labels, or None for an empty map.
+
+        """
+        points = [self.node_xy, self.text_label_xy,
+                  self.segment_beziers[:, :2], self.segment_beziers[:, 2:]]
+        points = np.vstack(points)
+        points = points[~np.isnan(points).any(axis=1)]
+        if len(points) == 0:
+            return None
+        x_min, y_min = points.min(axis=0)
+        x_max, y_max = points.max(axis=0)
+        return float(x_min), float(y_min), float(x_max), float(y_max)
+
+    def nodes_in_bbox(self, x_min, y_min, x_max, y_max):
+        """IDs of the nodes in a bbox."""
+        found = self.node_index.in_bbox(x_min, y_min, x_max, y_max)
+        return [self.node_ids[i] for i in found]
+
+    def nodes_within_radius(self, x, y, radius):
+        """IDs of the nodes within a distance of (x, y)."""
+        found = self.node_index.within_radius(x, y, radius)
+        return [self.node_ids[i] for i in found]
+
+    def nearest_node(self, x, y, node_type=None):
+        """ID of and distance to the node nearest to (x, y), or (None, None)
+        for a map without nodes.
+
+        :param str node_type: Only consider nodes of this type, e.g.
+                              'metabolite'.
+
+        """
+        mask = None if node_type is None else self.node_types == node_type
+        found, distance = self.node_index.nearest(x, y, mask)
+        if found is None:
+            return None, None
+        return self.node_ids[found], distance
+
+    def reactions_in_bbox(self, x_min, y_min, x_max, y_max):
+        """IDs of the reactions with a bbox that overlaps a bbox."""
+        found = self.reaction_index.overlapping(x_min, y_min, x_max, y_max)
+        return [self.reaction_ids[i] for i in found]
+
+    def reaction_bbox(self, reaction_id):
+        """(x_min, y_min, x_max, y_max) of a reaction, or None for a reaction
+        without segments.
+
+        """
+        bbox = self.reaction_bboxes[self._reaction_index[reaction_id]]
+        if np.isnan(bbox).any():
+            return None
+        return tuple(float(v) for v in bbox)
+
+    def text_labels_in_bbox(self, x_min, y_min, x_max, y_max):
+        """IDs of the text labels in a bbox."""
+        found = self.text_label_index.in_bbox(x_min, y_min, x_max, y_max)
+        return [self.text_label_ids[i] for i in found]
+
+    def __repr__(self):
+        return '<Map %s: %d reactions, %d nodes, %d text labels>' % (
+            self.header.get('map_name', ''), len(self.reaction_ids),
+            len(self.node_ids), len(self.text_label_ids),
+        )
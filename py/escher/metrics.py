@@ -0,0 +1,216 @@
+"""Performance metrics for the Escher Python package.
+
+Metrics are disabled by default, and recording is a cheap no-op until they are
+enabled:
+
+.. code:: python
+
+    from escher import metrics
+
+    with metrics.profile() as prof:
+        builder = Builder(map_name='e_coli_core.Core metabolism')
+        builder.save_html('core.html')
+    print(prof.to_dict())
+
+Sizes are in bytes. Text is counted by its size in UTF-8, because JSON with
+non-ASCII characters is longer in bytes than in characters.
+
+"""
+
+import json
+import time
+from contextlib import contextmanager
+
+_enabled = False
+_events = []
+# the event lists of the open profiles
+_collectors = []
+
+
+def is_enabled():
+    """Return True if metrics are being recorded."""
+    return _enabled
+
+
+def enable():
+    """Start recording metrics."""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """Stop recording metrics. Recorded events are kept."""
+    global _enabled
+    _enabled = False
+
+
+def clear():
+    """Remove all recorded events."""
+    del _events[:]
+
+
+def text_size(value):
+    """Return the size in bytes of text encoded as UTF-8, or of bytes."""
+    if isinstance(value, str) and not value.isascii():
+        return len(value.encode('utf-8'))
+    return len(value)
+
+
+def record(name, seconds=None, nbytes=None, **tags):
+    """Record an event.
+
+    :param str name: The name of the measured operation.
+
+    :param float seconds: The duration of the operation.
+
+    :param int nbytes: The size of the payload handled by the operation.
+
+    :param tags: Additional values to describe the event, e.g. the map name.
+
+    """
+    if not _enabled:
+        return
+    event = {'name': name, 'seconds': seconds, 'bytes': nbytes, 'tags': tags}
+    _events.append(event)
+    for collector in _collectors:
+        collector.append(event)
+
+
+class _Timer(object):
+    """Times a block and records it as an event on exit."""
+
+    def __init__(self, name, tags):
+        self.name = name
+        self.tags = tags
+        self.nbytes = None
+
+    def add_bytes(self, nbytes):
+        if not isinstance(nbytes, int):
+            nbytes = text_size(nbytes)
+        self.nbytes = (self.nbytes or 0) + nbytes
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self._start, self.nbytes,
+               **self.tags)
+        return False
+
+
+class _NullTimer(object):
+    """Stands in for _Timer while metrics are disabled."""
+
+    def add_bytes(self, nbytes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_timer = _NullTimer()
+
+
+def timer(name, **tags):
+    """Return a context manager that records the duration of the block.
+
+    Inside the block, call ``add_bytes`` on the returned object with a number
+    of bytes, or with the handled text or bytes, to record the size of the
+    payload. The size of text is only computed while metrics are enabled.
+
+    :param str name: The name of the measured operation.
+
+    :param tags: Additional values to describe the event.
+
+    """
+    if not _enabled:
+        return _null_timer
+    return _Timer(name, tags)
+
+
+def summarize(events):
+    """Summarize events by name.
+
+    Returns a dictionary with the count, total/min/max seconds and total bytes
+    for each event name.
+
+    """
+    summary = {}
+    for event in events:
+        entry = summary.setdefault(event['name'], {
+            'count': 0,
+            'total_seconds': 0.0,
+            'min_seconds': None,
+            'max_seconds': None,
+            'total_bytes': 0,
+        })
+        entry['count'] += 1
+        seconds = event['seconds']
+        if seconds is not None:
+            entry['total_seconds'] += seconds
+            entry['min_seconds'] = (seconds if entry['min_seconds'] is None
+                                    else min(entry['min_seconds'], seconds))
+            entry['max_seconds'] = (seconds if entry['max_seconds'] is None
+                                    else max(entry['max_seconds'], seconds))
+        if event['bytes'] is not None:
+            entry['total_bytes'] += event['bytes']
+    return summary
+
+
+def to_json_lines(events):
+    """Return the events as JSON lines, one event per line."""
+    return ''.join(json.dumps(event, default=str) + '\n' for event in events)
+
+
+def events():
+    """Return a list of all recorded events."""
+    return list(_events)
+
+
+def to_dict():
+    """Return a summary of all recorded events. See summarize."""
+    return summarize(_events)
+
+
+def write_json_lines(filepath):
+    """Write all recorded events to a file as JSON lines."""
+    with open(filepath, 'w') as f:
+        f.write(to_json_lines(_events))
+
+
+class Profile(object):
+    """The events recorded within a profile() block."""
+
+    def __init__(self):
+        self.events = []
+
+    def to_dict(self):
+        return summarize(self.events)
+
+    def to_json_lines(self):
+        return to_json_lines(self.events)
+
+
+@contextmanager
+def profile():
+    """Record metrics within the block.
+
+    Metrics are enabled for the duration of the block and then returned to
+    their previous state. Yields a Profile with the events of the block, which
+    are kept when clear is called.
+
+    """
+    was_enabled = _enabled
+    prof = Profile()
+    _collectors.append(prof.events)
+    enable()
+    try:
+        yield prof
+    finally:
+        _collectors.remove(prof.events)
+        if not was_enabled:
+            disable()
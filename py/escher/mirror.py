@@ -0,0 +1,164 @@
+"""Copy maps and models from an Escher server to a local directory.
+
+The mirror has the same layout as the server, so it can be used in place of
+the Escher website:
+
+.. code:: python
+
+    import escher
+    from escher.mirror import mirror
+
+    mirror('/data/escher', maps=['e_coli_core.Core metabolism'],
+           models=['e_coli_core'])
+    escher.rc['server_root'] = '/data/escher'
+
+The directory can also be served over HTTP, e.g. with ``python -m
+http.server``, and escher.rc['server_root'] set to its url.
+
+From the command line::
+
+    python -m escher.mirror /data/escher --models e_coli_core iJO1366
+
+Mirroring is resumable. Files that were already downloaded are skipped, and
+files are only moved into place once they are complete, so an interrupted
+mirror can be restarted with the same arguments.
+
+"""
+
+from escher.urls import get_url, _escher_web
+from escher import metrics, jsonio
+
+from concurrent.futures import ThreadPoolExecutor
+from os.path import join, exists, dirname
+from urllib.request import urlopen
+from urllib.parse import quote as url_escape
+import argparse
+import os
+
+#: The default number of concurrent downloads
+DEFAULT_WORKERS = 8
+
+
+def _local_path(destination, name, *parts):
+    return join(destination, *(_escher_web[name].split('/') + list(parts)))
+
+
+def _download(url, filepath, kind, resource):
+    """Download url to filepath through a temporary file."""
+    partial = filepath + '.part'
+    os.makedirs(dirname(filepath), exist_ok=True)
+    with metrics.timer('mirror.download', kind=kind,
+                       resource=resource) as timer:
+        data = urlopen(url).read()
+        timer.add_bytes(len(data))
+    with open(partial, 'wb') as f:
+        f.write(data)
+    os.replace(partial, filepath)
+
+
+def _select(entries, kind, names):
+    if names is None:
+        return list(entries)
+    names = {n.replace('.json', '') for n in names}
+    selected = [e for e in entries if e[kind + '_name'] in names]
+    missing = names - {e[kind + '_name'] for e in selected}
+    if missing:
+        raise ValueError('Could not find the %ss %s on the server' %
+                         (kind, ', '.join(sorted(missing))))
+    return selected
+
+
+def mirror(destination, maps=None, models=None, source=None,
+           workers=DEFAULT_WORKERS, overwrite=False):
+    """Copy the index and maps and models from an Escher server.
+
+    Returns a dictionary with the paths of the downloaded and skipped files,
+    and the errors for the files that could not be downloaded.
+
+    :param str destination: The directory for the mirror.
+
+    :param maps: Names of the maps to copy.
+
+    :param models: Names of the models to copy. If neither maps nor models
+                   are given, every map and model is copied.
+
+    :param str source: The root url or directory of the server to copy from.
+                       Defaults to escher.rc['server_root'] or the Escher
+                       website.
+
+    :param int workers: The number of concurrent downloads.
+
+    :param bool overwrite: Download files that are already in the mirror.
+
+    """
+    index = jsonio.loads(urlopen(get_url('server_index', source)).read())
+
+    if maps is not None or models is not None:
+        maps, models = maps or [], models or []
+    jobs = []
+    for kind, names in (('map', maps), ('model', models)):
+        for entry in _select(index[kind + 's'], kind, names):
+            parts = [entry['organism'], entry[kind + '_name'] + '.json']
+            url = (get_url(kind + '_download', source) +
+                   '/'.join(url_escape(x) for x in parts))
+            filepath = _local_path(destination, kind + '_download', *parts)
+            jobs.append((url, filepath, kind, entry[kind + '_name']))
+
+    result = {'downloaded': [], 'skipped': [], 'failed': {}}
+
+    def run(job):
+        url, filepath, kind, resource = job
+        if not overwrite and exists(filepath):
+            result['skipped'].append(filepath)
+            return
+        try:
+            _download(url, filepath, kind, resource)
+        except Exception as err:
+            result['failed'][filepath] = err
+        else:
+            result['downloaded'].append(filepath)
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        list(executor.map(run, jobs))
+
+    # list every file in the mirror, including those from earlier runs
+    local_index = {}
+    for kind in ('map', 'model'):
+        local_index[kind + 's'] = [
+            entry for entry in index[kind + 's']
+            if exists(_local_path(destination, kind + '_download',
+                                  entry['organism'],
+                                  entry[kind + '_name'] + '.json'))
+        ]
+    index_path = _local_path(destination, 'server_index')
+    os.makedirs(dirname(index_path), exist_ok=True)
+    with open(index_path + '.part', 'wb') as f:
+        jsonio.dump(dict(index, **local_index), f)
+    os.replace(index_path + '.part', index_path)
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Copy maps and models from an Escher server.'
+    )
+    parser.add_argument('destination', help='The directory for the mirror.')
+    parser.add_argument('--maps', nargs='*', default=None,
+                        help='Maps to copy.')
+    parser.add_argument('--models', nargs='*', default=None,
+                        help=('Models to copy. If neither maps nor models '
+                              'are given, everything is copied.'))
+    parser.add_argument('--source', default=None,
+                        help='The root url of the server to copy from.')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='The number of concurrent downloads.')
+    parser.add_argument('--overwrite', action='store_true',
+                        help='Download files that are already mirrored.')
+    args = parser.parse_args()
+    result = mirror(args.destination, maps=args.maps, models=args.models,
+                    source=args.source, workers=args.workers,
+                    overwrite=args.overwrite)
+    print('Downloaded %d files, skipped %d' % (len(result['downloaded']),
+                                                len(result['skipped'])))
+    for filepath, err in sorted(result['failed'].items()):
+        print('Failed to download %s: %s' % (filepath, err))
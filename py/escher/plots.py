@@ -1,13 +1,24 @@
 from escher.urls import get_url, root_directory
-from escher.util import b64dump
+from escher.util import b64dump_chunks
+from escher.tiles import MapTiles, DEFAULT_TILE_SIZE
+from escher import lod
+from escher.search import frontend_search_index
+from escher.blobs import Blob, compress, write_sidecar, store as blob_store
+from escher.compare import compare_data, REACTION_DATA_THRESHOLD
+from escher.prune import data_identifiers, prune_data, DATA_KINDS
+from escher.mapdiff import patch
+from escher.data import read_data
 from escher.version import __version__
-from escher import rc
+from escher import rc, metrics, jsonio
 
 import cobra
 from cobra import Model
 import pandas as pd
 import ipywidgets as widgets
-from traitlets import Unicode, Int, Instance, Any, observe, validate, default
+from traitlets import (Unicode, Int, Bool, Instance, Any, observe, validate,
+                       default)
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
 import os
 from os.path import join, isfile, expanduser
 from warnings import warn
@@ -32,12 +43,14 @@ env = Environment(loader=PackageLoader('escher', 'templates'))
 
 def server_index():
     url = get_url('server_index')
-    try:
-        download = urlopen(url)
-    except URLError:
-        raise URLError('Could not contact Escher server')
-    data = _decode_response(download)
-    index = json.loads(data)
+    with metrics.timer('server_index', url=url) as timer:
+        try:
+            download = urlopen(url)
+        except URLError:
+            raise URLError('Could not contact Escher server')
+        data = _decode_response(download)
+        timer.add_bytes(data)
+        index = jsonio.loads(data)
     return index
 
 
@@ -53,7 +66,8 @@ def list_available_models():
 
 # download maps and models
 
-def _json_for_name(name: str, kind: str):
+def _url_for_name(name: str, kind: str):
+    """Return the url of a map or model on the server."""
     # check the name
     name = name.replace('.json', '')
 
@@ -66,22 +80,34 @@ def _json_for_name(name: str, kind: str):
         index = server_index()
     except URLError:
         raise Exception('Could not connect to the Escher server')
-    match = match_in_index(name, server_index(), kind)
+    match = match_in_index(name, index, kind)
     if len(match) == 0:
         raise Exception('Could not find the {kind} {name} on the server'
                         .format(kind=kind, name=name))
     org, name = match[0]
-    url = (
+    return (
         get_url(kind + '_download') +
         '/'.join([url_escape(x) for x in [org, name + '.json']])
     )
+
+
+def _download_for_name(name: str, kind: str):
+    """Return the url of a map or model on the server, and its JSON."""
+    url = _url_for_name(name, kind)
+    name = name.replace('.json', '')
     print('Downloading %s from %s' % (kind.title(), url))
-    try:
-        download = urlopen(url)
-    except URLError:
-        raise ValueError('No %s found in at %s' % (kind, url))
-    data = _decode_response(download)
-    return data
+    with metrics.timer('download', kind=kind, resource=name) as timer:
+        try:
+            download = urlopen(url)
+        except URLError:
+            raise ValueError('No %s found in at %s' % (kind, url))
+        data = _decode_response(download)
+        timer.add_bytes(data)
+    return url, data
+
+
+def _json_for_name(name: str, kind: str):
+    return _download_for_name(name, kind)[1]
 
 
 def model_json_for_name(model_name):
@@ -112,13 +138,16 @@ def _decode_response(download):
 def _load_resource(resource, name):
     """Load a resource that could be a file, URL, or json string."""
     # if it's a url, download it
-    if resource.startswith('http://') or resource.startswith('https://'):
-        try:
-            download = urlopen(resource)
-        except URLError as err:
-            raise err
-        else:
-            return _decode_response(download)
+    if resource.startswith(('http://', 'https://', 'file://')):
+        with metrics.timer('download', kind='url', resource=name) as timer:
+            try:
+                download = urlopen(resource)
+            except URLError as err:
+                raise err
+            else:
+                data = _decode_response(download)
+                timer.add_bytes(data)
+                return data
     # If it's a filepath, load it
     try:
         is_file = isfile(resource)
@@ -128,15 +157,22 @@ def _load_resource(resource, name):
     if is_file:
         try:
             with open(resource, 'rb') as f:
-                loaded_resource = f.read().decode('utf-8')
-            _ = json.loads(loaded_resource)
+                data = f.read()
+            # parse the bytes, so only valid files are decoded
+            with metrics.timer('load_resource.parse', resource=name,
+                               source='file') as timer:
+                timer.add_bytes(data)
+                _ = jsonio.loads(data)
         except ValueError as err:
             raise ValueError('%s not a valid json file' % name)
         else:
-            return loaded_resource
+            return data.decode('utf-8')
     # try to validate the json
     try:
-        _ = json.loads(resource)
+        with metrics.timer('load_resource.parse', resource=name,
+                           source='string') as timer:
+            timer.add_bytes(resource)
+            _ = jsonio.loads(resource)
     except ValueError as err:
         raise ValueError('Could not load %s. Not valid json, url, or filepath'
                          % name)
@@ -145,6 +181,92 @@ def _load_resource(resource, name):
     raise Exception('Could not load %s.' % name)
 
 
+def _model_to_json(model):
+    with metrics.timer('model_to_json', model=model.id) as timer:
+        model_json = cobra.io.to_json(model)
+        timer.add_bytes(model_json)
+    return model_json
+
+
+# threads that load maps and models with background_loading
+_loader_pool = None
+
+
+def _loader():
+    global _loader_pool
+    if _loader_pool is None:
+        _loader_pool = ThreadPoolExecutor(max_workers=4,
+                                          thread_name_prefix='escher-loader')
+    return _loader_pool
+
+
+def _record_payload(trait, value):
+    """Record the size of a synced trait, when metrics are enabled."""
+    if not metrics.is_enabled() or value is None:
+        return
+    size = metrics.text_size(value if isinstance(value, str)
+                             else jsonio.dumpb(value))
+    metrics.record('sync_payload', nbytes=size, trait=trait)
+
+
+def _serialize_loaded_map_json(value, widget):
+    """With progressive loading, only send the tiles in the initial view to the
+    widget. The remaining tiles are sent as custom messages.
+
+    """
+    tiles = widget._get_map_tiles()
+    if tiles is None:
+        if widget.share_payloads or widget.external_state:
+            return None
+        return widget._compressed('_loaded_map_json', value)
+    partial = jsonio.dumps(tiles.partial_map(widget._initial_tile_keys(tiles)))
+    return widget._compressed('_loaded_map_json', partial)
+
+
+def _serialize_loaded_model_json(value, widget):
+    """With share_payloads, the model is sent as a shared blob instead."""
+    if widget.share_payloads or widget.external_state:
+        return None
+    return widget._compressed('_loaded_model_json', value)
+
+
+def _serialize_map_detail_levels(value, widget):
+    """With share_payloads, the levels are sent as a shared blob instead."""
+    if widget._map_detail_levels_blob is not None:
+        return None
+    return value
+
+
+def _state_directory(value):
+    if value is True:
+        return DEFAULT_STATE_DIRECTORY
+    if value is None or value is False:
+        return False
+    if isinstance(value, str):
+        return value
+    raise Exception("""Invalid value for external_state. Must be True, False,
+                    or a directory""")
+
+
+def _serialize_reaction_data(value, widget):
+    return widget._data_for_widget('reaction', value)
+
+
+def _serialize_metabolite_data(value, widget):
+    return widget._data_for_widget('metabolite', value)
+
+
+def _serialize_gene_data(value, widget):
+    return widget._data_for_widget('gene', value)
+
+
+# number of map tiles in each message to the widget
+TILES_PER_MESSAGE = 8
+
+# directory for the maps and models saved with external_state=True
+DEFAULT_STATE_DIRECTORY = 'escher_state'
+
+
 def convert_data(data):
     if type(data) is pd.Series:
         return dict(data)
@@ -218,6 +340,86 @@ class Builder(widgets.DOMWidget):
         A dictionary with keys that correspond to gene IDs and values that will
         be mapped to corresponding reactions.
 
+    :param progressive_loading:
+
+        Load large maps in the Jupyter widget one tile at a time. The widget
+        first receives the tiles that cover canvas_size_and_loc (or the top
+        left tile of the map). With 'on_demand' (or True), the other tiles are
+        loaded as they come into view. With 'stream', the other tiles are all
+        loaded in the background, nearest first. save_html always saves the
+        whole map.
+
+    :param int tile_size:
+
+        The width and height of the tiles used for progressive_loading, in map
+        coordinates.
+
+    :param bool prebuild_search_index:
+
+        Build the search index for the map in Python and send it with the map,
+        so the widget does not build it when it loads a new map. Not used with
+        progressive_loading.
+
+    :param level_of_detail:
+
+        Show simplified versions of the map when zoomed out. Use True for the
+        levels in escher.lod.DEFAULT_LEVELS, a list of levels with max_zoom
+        and the arguments for escher.lod.simplify_map, or a pyramid from
+        escher.lod.build_pyramid, or the path to a pyramid saved with
+        escher.lod.save_pyramid. With share_payloads or external_state, the
+        levels are sent as a shared blob like the map, so with external_state
+        they are not saved with the notebook either.
+
+    :param bool background_loading:
+
+        Load the map and model in background threads, at the same time,
+        instead of blocking until they are downloaded. The widget shows that
+        they are loading, and draws them when they arrive. Use await
+        builder.ready(), or builder.wait() without an event loop, to wait for
+        them. Defaults to escher.rc['background_loading'], or False.
+
+    :param bool prune_data:
+
+        Only send the widget the reaction, metabolite and gene data for the
+        IDs and names on the loaded map, or in the loaded model with
+        enable_editing. See data_coverage for what was matched. True by
+        default.
+
+    :param bool precompute_comparisons:
+
+        When reaction_data or metabolite_data has two datasets, compare them
+        in Python with escher.compare, and send the widget one dataset with
+        the value and text for each element. The widget needs a version of
+        Escher that reads compared data. False by default.
+
+    :param bool share_payloads:
+
+        Send the map and model to the widget as blobs that are shared with
+        every other Builder in the process showing the same map or model, so
+        each is sent and parsed once. Defaults to
+        escher.rc['share_payloads'], or False.
+
+    :param bool compress_payloads:
+
+        Gzip the map and model, and send them to the widget as binary buffers
+        instead of text. This makes the messages 5 to 10 times smaller, which
+        helps when the kernel is far from the browser, e.g. on JupyterHub. The
+        browser must support DecompressionStream. See payload_sizes for the
+        sizes before and after. Defaults to escher.rc['compress_payloads'],
+        or False.
+
+    :param external_state:
+
+        Keep the map and model out of the widget state that is saved with the
+        notebook, so the notebook stays small. The saved state references maps
+        and models downloaded by name or url by their url, and others by a
+        sidecar file named by the hash of its content, in this directory
+        (True for 'escher_state'). The directory should be relative to the
+        notebook. The widget loads the map and model when it is shown: from
+        the kernel, or from the url or sidecar file when the notebook is
+        opened without a kernel. Implies share_payloads. Defaults to
+        escher.rc['external_state'], or False.
+
     **Keyword Arguments**
 
     You can also pass in any of the following options as keyword arguments. The
@@ -310,25 +512,149 @@ class Builder(widgets.DOMWidget):
 
     # synced data
 
-    _loaded_map_json = Unicode(None, allow_none=True).tag(sync=True)
+    _loaded_map_json = Unicode(None, allow_none=True)\
+        .tag(sync=True, to_json=_serialize_loaded_map_json)
 
     @observe('_loaded_map_json')
     def _observe_loaded_map_json(self, change):
+        _record_payload('_loaded_map_json', change.new)
+        self._update_map_tiles_info()
+        self._update_map_blob()
+        self._update_map_detail_levels()
+        self._update_search_index()
+        self._send_data(DATA_KINDS)
         # if map is cleared, then clear these
         if not change.new:
             self.map_name = None
             self.map_json = None
 
-    _loaded_model_json = Unicode(None, allow_none=True).tag(sync=True)
+    _loaded_model_json = Unicode(None, allow_none=True)\
+        .tag(sync=True, to_json=_serialize_loaded_model_json)
 
     @observe('_loaded_model_json')
     def _observe_loaded_model_json(self, change):
+        _record_payload('_loaded_model_json', change.new)
+        self._update_model_blob()
+        if self.enable_editing:
+            self._send_data(DATA_KINDS)
         # if model is cleared, then clear these
         if not change.new:
             self.model = None
             self.model_name = None
             self.model_json = None
 
+    # progressive loading
+
+    progressive_loading = Any(False, allow_none=True)
+
+    @validate('progressive_loading')
+    def _validate_progressive_loading(self, proposal):
+        value = proposal['value']
+        if value is True:
+            return 'on_demand'
+        if value is None or value is False:
+            return False
+        if value not in ('on_demand', 'stream'):
+            raise Exception("""Invalid value for progressive_loading. Must be
+                            'on_demand', 'stream', True, or False""")
+        return value
+
+    tile_size = Int(DEFAULT_TILE_SIZE)
+
+    @observe('progressive_loading', 'tile_size')
+    def _observe_progressive_loading(self, change):
+        self._map_tiles = None
+        self._update_map_tiles_info()
+        self._update_map_blob()
+        self._update_search_index()
+        # send the map again, whole or as tiles
+        if self.comm is not None:
+            self.send_state('_loaded_map_json')
+
+    _map_tiles_info = Any(None, allow_none=True).tag(sync=True)
+
+    _map_tiles = None
+    _map_tiles_source = None
+    _map_tiles_version = 0
+
+    # shared payloads
+
+    # This option can be set globally with escher.rc['share_payloads']
+    share_payloads = Bool()
+
+    @default('share_payloads')
+    def _share_payloads(self):
+        return bool(rc.get('share_payloads', False))
+
+    # This option can be set globally with escher.rc['compress_payloads']
+    compress_payloads = Bool()
+
+    @default('compress_payloads')
+    def _compress_payloads(self):
+        return bool(rc.get('compress_payloads', False))
+
+    # This option can be set globally with escher.rc['external_state']
+    external_state = Any()
+
+    @default('external_state')
+    def _external_state(self):
+        return _state_directory(rc.get('external_state', False))
+
+    @validate('external_state')
+    def _validate_external_state(self, proposal):
+        return _state_directory(proposal['value'])
+
+    @observe('share_payloads', 'compress_payloads', 'external_state')
+    def _observe_share_payloads(self, change):
+        self._update_map_blob()
+        self._update_model_blob()
+        self._update_map_detail_levels_blob()
+        if self.comm is not None:
+            self.send_state(['_loaded_map_json', '_loaded_model_json',
+                             '_map_detail_levels'])
+
+    _map_blob = Instance(Blob, allow_none=True)\
+        .tag(sync=True, **widgets.widget_serialization)
+    _model_blob = Instance(Blob, allow_none=True)\
+        .tag(sync=True, **widgets.widget_serialization)
+
+    @observe('_map_blob', '_model_blob', '_map_detail_levels_blob')
+    def _observe_blob(self, change):
+        blob_store.release(change.old)
+
+    # level of detail
+
+    level_of_detail = Any(False, allow_none=True)
+
+    @validate('level_of_detail')
+    def _validate_level_of_detail(self, proposal):
+        value = proposal['value']
+        if isinstance(value, str):
+            return lod.load_pyramid(value)
+        if value is None or isinstance(value, (bool, list)):
+            return value
+        raise Exception("""Invalid value for level_of_detail. Must be True,
+                        False, a list of levels, or a file path""")
+
+    @observe('level_of_detail')
+    def _observe_level_of_detail(self, change):
+        self._update_map_detail_levels()
+
+    _map_detail_levels = Any(None, allow_none=True)\
+        .tag(sync=True, to_json=_serialize_map_detail_levels)
+    _map_detail_levels_blob = Instance(Blob, allow_none=True)\
+        .tag(sync=True, **widgets.widget_serialization)
+
+    # search
+
+    prebuild_search_index = Bool(False)
+
+    @observe('prebuild_search_index')
+    def _observe_prebuild_search_index(self, change):
+        self._update_search_index()
+
+    _search_index = Any(None, allow_none=True).tag(sync=True)
+
     # Python options that are indirectly synced to the widget
 
     map_name = Unicode(None, allow_none=True)
@@ -336,45 +662,55 @@ class Builder(widgets.DOMWidget):
     @observe('map_name')
     def _observe_map_name(self, change):
         if change.new:
-            self._loaded_map_json = map_json_for_name(change.new)
+            self._load('map', self._json_for_name, 'map', change.new)
         else:
-            self._loaded_map_json = None
+            self._load('map', None)
 
     map_json = Unicode(None, allow_none=True)
 
     @observe('map_json')
     def _observe_map_json(self, change):
         if change.new:
-            self._loaded_map_json = _load_resource(change.new, 'map_json')
+            self._load('map', _load_resource, change.new, 'map_json')
         else:
-            self._loaded_map_json = None
+            self._load('map', None)
 
     model = Instance(Model, allow_none=True)
 
     @observe('model')
     def _observe_model(self, change):
         if change.new:
-            self._loaded_model_json = cobra.io.to_json(change.new)
+            self._load('model', _model_to_json, change.new)
         else:
-            self._loaded_model_json = None
+            self._load('model', None)
 
     model_name = Unicode(None, allow_none=True)
 
     @observe('model_name')
     def _observe_model_name(self, change):
         if change.new:
-            self._loaded_model_json = model_json_for_name(change.new)
+            self._load('model', self._json_for_name, 'model', change.new)
         else:
-            self._loaded_model_json = None
+            self._load('model', None)
 
     model_json = Unicode(None, allow_none=True)
 
     @observe('model_json')
     def _observe_model_json(self, change):
         if change.new:
-            self._loaded_model_json = _load_resource(change.new, 'model_json')
+            self._load('model', _load_resource, change.new, 'model_json')
         else:
-            self._loaded_model_json = None
+            self._load('model', None)
+
+    # This option can be set globally with escher.rc['background_loading']
+    background_loading = Bool()
+
+    @default('background_loading')
+    def _background_loading(self):
+        return bool(rc.get('background_loading', False))
+
+    # 'map' and 'model' while they load in the background
+    _loading = Any([]).tag(sync=True)
 
     # Synced options passed as an object to JavaScript Builder
 
@@ -435,15 +771,17 @@ class Builder(widgets.DOMWidget):
         .tag(sync=True, option=True)
 
     reaction_data = Any(None, allow_none=True)\
-        .tag(sync=True, option=True)
+        .tag(sync=True, option=True, to_json=_serialize_reaction_data)
 
     @validate('reaction_data')
     def _validate_reaction_data(self, proposal):
         try:
-            return convert_data(proposal['value'])
+            data = convert_data(proposal['value'])
         except Exception:
             raise Exception("""Invalid data for reaction_data. Must be pandas
                             Series, pandas DataFrame, dict, list, or None""")
+        _record_payload('reaction_data', data)
+        return data
 
     reaction_styles = Any(None, allow_none=True)\
         .tag(sync=True, option=True)
@@ -457,29 +795,33 @@ class Builder(widgets.DOMWidget):
         .tag(sync=True, option=True)
 
     gene_data = Any(None, allow_none=True)\
-        .tag(sync=True, option=True)
+        .tag(sync=True, option=True, to_json=_serialize_gene_data)
 
     @validate('gene_data')
     def _validate_gene_data(self, proposal):
         try:
-            return convert_data(proposal['value'])
+            data = convert_data(proposal['value'])
         except Exception:
             raise Exception("""Invalid data for gene_data. Must be pandas
                             Series, pandas DataFrame, dict, list, or None""")
+        _record_payload('gene_data', data)
+        return data
 
     and_method_in_gene_reaction_rule = Any(None, allow_none=True)\
         .tag(sync=True, option=True)
 
     metabolite_data = Any(None, allow_none=True)\
-        .tag(sync=True, option=True)
+        .tag(sync=True, option=True, to_json=_serialize_metabolite_data)
 
     @validate('metabolite_data')
     def _validate_metabolite_data(self, proposal):
         try:
-            return convert_data(proposal['value'])
+            data = convert_data(proposal['value'])
         except Exception:
             raise Exception("""Invalid data for metabolite_data. Must be pandas
                             Series, pandas DataFrame, dict, list, or None""")
+        _record_payload('metabolite_data', data)
+        return data
 
     metabolite_styles = Any(None, allow_none=True)\
         .tag(sync=True, option=True)
@@ -491,6 +833,30 @@ class Builder(widgets.DOMWidget):
         .tag(sync=True, option=True)
     metabolite_no_data_size = Any(None, allow_none=True)\
         .tag(sync=True, option=True)
+
+    precompute_comparisons = Bool(False)
+
+    @observe('precompute_comparisons', 'reaction_styles',
+             'reaction_compare_style', 'metabolite_styles',
+             'metabolite_compare_style')
+    def _observe_comparisons(self, change):
+        # send the data again, compared with the new styles
+        kinds = [kind for kind in ('reaction', 'metabolite')
+                 if change.name == 'precompute_comparisons' or
+                 change.name.startswith(kind)]
+        self._send_data(kinds, only_compared=True)
+
+    _compared = None
+
+    prune_data = Bool(True)
+
+    @observe('prune_data', 'enable_editing')
+    def _observe_prune_data(self, change):
+        self._send_data(DATA_KINDS)
+
+    _identifiers = None
+    _pruned = None
+
     identifiers_on_map = Any(None, allow_none=True)\
         .tag(sync=True, option=True)
     highlight_missing = Any(None, allow_none=True)\
@@ -529,6 +895,16 @@ class Builder(widgets.DOMWidget):
             model_json: str = None,
             **kwargs
     ) -> None:
+        # loads in the background, by 'map' and 'model'
+        self._pending = {}
+        self._load_errors = {}
+        # the last compressed value of each trait
+        self._compressed_payloads = {}
+        # the function and arguments that loaded the map and the model
+        self._sources = {}
+        # the urls of the map and model downloaded by name
+        self._source_urls = {}
+
         # kwargs will instantiate the traitlets
         super().__init__(**kwargs)
 
@@ -567,6 +943,457 @@ class Builder(widgets.DOMWidget):
             if key in unavailable_options:
                 warn(val)
 
+        self.on_msg(self._handle_custom_msg)
+
+    def notify_change(self, change):
+        # the observers of a new map or model update the blobs, tiles, detail
+        # levels and search index, so send them to the widget together with
+        # the map or model, in one message
+        if change['name'] in ('_loaded_map_json', '_loaded_model_json'):
+            with self.hold_sync():
+                super().notify_change(change)
+        else:
+            super().notify_change(change)
+
+    def _load(self, kind, function, *args):
+        """Set _loaded_map_json or _loaded_model_json to the result of
+        function, in a thread with background_loading. A function of None
+        clears it.
+
+        """
+        trait = '_loaded_%s_json' % kind
+        # a new value replaces one that is still loading
+        self._pending.pop(kind, None)
+        self._load_errors.pop(kind, None)
+        self._sources[kind] = (function, args)
+        self._source_urls.pop(kind, None)
+        if function is None or not self.background_loading:
+            self._loading = sorted(self._pending)
+            setattr(self, trait, None if function is None else function(*args))
+            return
+        future = _loader().submit(function, *args)
+        self._pending[kind] = future
+        self._loading = sorted(self._pending)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # without an event loop, the result is set by ready or wait
+            return
+        future.add_done_callback(
+            lambda f: loop.call_soon_threadsafe(self._finish_load, kind, f)
+        )
+
+    def _json_for_name(self, kind, name):
+        """Download a map or model by name, and keep its url for
+        external_state.
+
+        """
+        url, data = _download_for_name(name, kind)
+        # unless another load replaced this one
+        if self._sources.get(kind) == (self._json_for_name, (kind, name)):
+            self._source_urls[kind] = url
+        return data
+
+    def _finish_load(self, kind, future):
+        if self._pending.get(kind) is not future:
+            # replaced, or already finished
+            return
+        del self._pending[kind]
+        self._loading = sorted(self._pending)
+        try:
+            result = future.result()
+        except Exception as err:
+            self._load_errors[kind] = err
+            warn('Could not load the %s: %s' % (kind, err))
+            return
+        setattr(self, '_loaded_%s_json' % kind, result)
+
+    def _raise_load_errors(self):
+        errors = list(self._load_errors.values())
+        self._load_errors.clear()
+        if errors:
+            raise errors[0]
+
+    async def ready(self):
+        """Wait for the map and model to load with background_loading.
+
+        Returns the Builder, or raises the error from a map or model that
+        could not be loaded.
+
+        .. code:: python
+
+            builder = Builder(map_name='e_coli_core.Core metabolism',
+                              model_name='e_coli_core',
+                              background_loading=True)
+            await builder.ready()
+
+        """
+        while self._pending:
+            kind, future = next(iter(self._pending.items()))
+            try:
+                await asyncio.wrap_future(future)
+            except Exception:
+                pass
+            self._finish_load(kind, future)
+        self._raise_load_errors()
+        return self
+
+    def wait(self, timeout=None):
+        """Block until the map and model load with background_loading, for
+        scripts without an event loop.
+
+        Returns the Builder, or raises the error from a map or model that
+        could not be loaded.
+
+        :param float timeout: The maximum number of seconds to wait. Raises
+                              TimeoutError if loading takes longer.
+
+        """
+        pending = dict(self._pending)
+        _, not_done = wait_futures(pending.values(), timeout)
+        if not_done:
+            raise TimeoutError('The map or model did not load in %s seconds'
+                               % timeout)
+        for kind, future in pending.items():
+            self._finish_load(kind, future)
+        self._raise_load_errors()
+        return self
+
+    def _get_map_tiles(self):
+        """Return the MapTiles for the loaded map, or None if progressive
+        loading is off.
+
+        """
+        if not self.progressive_loading or not self._loaded_map_json:
+            return None
+        if (self._map_tiles is None or
+                self._map_tiles_source is not self._loaded_map_json):
+            with metrics.timer('tile_map') as timer:
+                timer.add_bytes(self._loaded_map_json)
+                self._map_tiles = MapTiles(jsonio.loads(self._loaded_map_json),
+                                           self.tile_size)
+            self._map_tiles_source = self._loaded_map_json
+        return self._map_tiles
+
+    def _initial_tile_keys(self, tiles):
+        loc = self.canvas_size_and_loc
+        if loc:
+            keys = tiles.keys_for_bbox(loc['x'], loc['y'],
+                                       loc['x'] + loc['width'],
+                                       loc['y'] + loc['height'])
+        else:
+            keys = tiles.keys_for_bbox(tiles.x, tiles.y,
+                                       tiles.x + tiles.tile_size,
+                                       tiles.y + tiles.tile_size)
+        return keys or tiles.keys[:1]
+
+    def _update_map_tiles_info(self):
+        tiles = self._get_map_tiles()
+        if tiles is None:
+            self._map_tiles_info = None
+            return
+        # the version changes with every map, so the widget always hears about
+        # a new map
+        self._map_tiles_version += 1
+        info = tiles.info()
+        info.update(mode=self.progressive_loading,
+                    initial=self._initial_tile_keys(tiles),
+                    version=self._map_tiles_version)
+        self._map_tiles_info = info
+
+    def _state_source(self, kind, value):
+        """Return the url of the map or model for external_state."""
+        function, args = self._sources.get(kind, (None, ()))
+        if function is _load_resource:
+            url = args[0]
+        else:
+            # the url that a map or model by name was downloaded from
+            url = self._source_urls.get(kind)
+        # a mirror in a local directory cannot be loaded by the browser
+        if url and url.startswith(('http://', 'https://')):
+            return url
+        return write_sidecar(value, self.external_state)
+
+    def _set_shared_blob(self, kind, share=True):
+        """Point the blob trait for kind at the shared blob for the loaded map
+        or model.
+
+        """
+        blob_trait, trait = '_%s_blob' % kind, '_loaded_%s_json' % kind
+        value = getattr(self, trait)
+        if not (share and (self.share_payloads or self.external_state) and
+                value):
+            setattr(self, blob_trait, None)
+            return
+        source = (self._state_source(kind, value) if self.external_state
+                  else None)
+        blob = blob_store.acquire(value, compress=self.compress_payloads,
+                                  source=source)
+        # hold the shared string instead of this Builder's copy. The content
+        # is equal, so traitlets keeps it without notifying observers.
+        with self.hold_trait_notifications():
+            setattr(self, trait, blob.content)
+        if blob is getattr(self, blob_trait):
+            # already referenced by this Builder
+            blob_store.release(blob)
+        else:
+            setattr(self, blob_trait, blob)
+
+    def _update_map_blob(self):
+        # progressive loading sends the map in parts instead
+        self._set_shared_blob('map',
+                              share=self._get_map_tiles() is None)
+
+    def _update_model_blob(self):
+        self._set_shared_blob('model')
+
+    def _compressed(self, trait, value):
+        """Return the value gzipped for the widget with compress_payloads, or
+        as it is.
+
+        """
+        if not (self.compress_payloads and value):
+            return value
+        cached = self._compressed_payloads.get(trait)
+        if cached is None or cached[0] != value:
+            cached = (value, compress(value, trait))
+            self._compressed_payloads[trait] = cached
+        return cached[1]
+
+    def payload_sizes(self):
+        """Return the sizes in bytes of the map and model sent to the widget.
+
+        Returns a dictionary with 'map' and 'model' keys, and a dictionary
+        with the size and the compressed_size as values, or None if there is
+        no map or model. The compressed_size is None without
+        compress_payloads.
+
+        """
+        sizes = {}
+        for kind, trait, blob in (
+                ('map', '_loaded_map_json', self._map_blob),
+                ('model', '_loaded_model_json', self._model_blob),
+        ):
+            if blob is not None:
+                sent = blob.compressed() if blob.compress else blob.content
+            else:
+                to_json = self.trait_metadata(trait, 'to_json')
+                sent = to_json(getattr(self, trait), self)
+            if not sent:
+                sizes[kind] = None
+            elif isinstance(sent, dict):
+                sizes[kind] = {'size': sent['size'],
+                               'compressed_size': sent['compressed_size']}
+            else:
+                sizes[kind] = {'size': len(sent.encode('utf-8')),
+                               'compressed_size': None}
+        return sizes
+
+    def _send_data(self, kinds, only_compared=False):
+        """Send data to the widget again, e.g. after the map changes."""
+        if self.comm is None:
+            return
+        for kind in kinds:
+            data = getattr(self, kind + '_data')
+            if data is None:
+                continue
+            if only_compared and not (isinstance(data, list) and
+                                      len(data) == 2):
+                continue
+            self.send_state(kind + '_data')
+
+    def _data_for_widget(self, kind, data):
+        """Return the data that is sent to the widget for reaction_data,
+        metabolite_data or gene_data.
+
+        """
+        if self.prune_data:
+            data = self._pruned_data(kind, data)[0]
+        if kind == 'gene':
+            return data
+        data = self._compared_data(kind, data)
+        if kind == 'reaction' and isinstance(data, dict):
+            # a list, which the widget keeps as is, so it does not send the
+            # data back
+            data = [data]
+        return data
+
+    def _data_identifiers(self):
+        """The IDs and names that data can match, or None without a map."""
+        map_json = self._loaded_map_json
+        if not map_json:
+            return None
+        # the model is only used to build new reactions
+        model_json = self._loaded_model_json if self.enable_editing else None
+        cached = self._identifiers
+        if cached is None or cached[0] is not map_json or \
+           cached[1] is not model_json:
+            with metrics.timer('data_identifiers'):
+                identifiers = data_identifiers(map_json, model_json)
+            self._identifiers = cached = (map_json, model_json, identifiers)
+        return cached[2]
+
+    def _pruned_data(self, kind, data):
+        """Return data without the IDs that the map does not show, and the
+        coverage, or the data and None if no map is loaded.
+
+        """
+        identifiers = self._data_identifiers()
+        if data is None or identifiers is None:
+            return data, None
+        if self._pruned is None:
+            self._pruned = {}
+        cached = self._pruned.get(kind)
+        if cached is None or cached[0] is not data or \
+           cached[1] is not identifiers:
+            with metrics.timer('prune_data', kind=kind):
+                pruned, coverage = prune_data(data, identifiers[kind])
+            self._pruned[kind] = cached = (data, identifiers, pruned,
+                                           coverage)
+        return cached[2], cached[3]
+
+    def _compared_data(self, kind, data):
+        """With precompute_comparisons, return two datasets as one dataset that
+        was compared in Python.
+
+        """
+        if not (self.precompute_comparisons and isinstance(data, list) and
+                len(data) == 2):
+            return data
+        styles = getattr(self, kind + '_styles')
+        compare_style = getattr(self, kind + '_compare_style')
+        options = (json.dumps(styles), compare_style)
+        if self._compared is None:
+            self._compared = {}
+        cached = self._compared.get(kind)
+        if cached is None or cached[0] is not data or cached[1] != options:
+            threshold = REACTION_DATA_THRESHOLD if kind == 'reaction' else 0
+            with metrics.timer('compare_data', kind=kind):
+                compared = compare_data(data, styles, compare_style,
+                                        threshold)
+            self._compared[kind] = cached = (data, options, compared)
+        # a list, which the widget keeps as is, so it does not send the data
+        # back
+        return [cached[2]]
+
+    def load_data(self, filepath, kind='gene', **kwargs):
+        """Read reaction_data, metabolite_data or gene_data from a large CSV,
+        TSV or Parquet file, keeping only the IDs that the loaded map can
+        show. See escher.data.read_data.
+
+        :param str filepath: The data file.
+
+        :param str kind: 'reaction', 'metabolite' or 'gene'.
+
+        :param kwargs: Other arguments for read_data, e.g. columns.
+
+        """
+        if kind not in DATA_KINDS:
+            raise ValueError('Bad data kind %s. Must be one of %s' %
+                             (kind, ', '.join(DATA_KINDS)))
+        identifiers = self._data_identifiers()
+        data = read_data(filepath, kind=kind,
+                         identifiers=identifiers and identifiers[kind],
+                         **kwargs)
+        setattr(self, kind + '_data', data)
+
+    def patch_map(self, changes):
+        """Apply changes from escher.diff to the loaded map.
+
+        :param dict changes: The output of escher.diff for the loaded map.
+
+        """
+        if not self._loaded_map_json:
+            raise ValueError('No map is loaded')
+        self._loaded_map_json = jsonio.dumps(patch(self._loaded_map_json,
+                                                   changes))
+
+    def data_coverage(self):
+        """Return how much of the reaction, metabolite and gene data matches
+        the loaded map.
+
+        Returns a dictionary with an entry for each of reaction_data,
+        metabolite_data and gene_data that is set. Each entry has the number
+        of matched and unmatched IDs, and the sorted unmatched_ids. Data is
+        matched by BiGG ID and by name, as in the widget, and with
+        enable_editing, also to the loaded model. Returns an empty dictionary
+        if no map is loaded.
+
+        """
+        coverage = {}
+        for kind in DATA_KINDS:
+            data = getattr(self, kind + '_data')
+            if data is None:
+                continue
+            _, kind_coverage = self._pruned_data(kind, data)
+            if kind_coverage is not None:
+                coverage[kind + '_data'] = kind_coverage
+        return coverage
+
+    def _update_map_detail_levels(self):
+        levels = self.level_of_detail
+        if not levels or not self._loaded_map_json:
+            levels = None
+        elif levels is True:
+            levels = lod.DEFAULT_LEVELS
+        if levels and not all('map' in level for level in levels):
+            levels = lod.build_pyramid(self._loaded_map_json, levels)
+        # send the levels and their blob together
+        with self.hold_sync():
+            self._map_detail_levels = levels
+            self._update_map_detail_levels_blob()
+
+    def _update_map_detail_levels_blob(self):
+        levels = self._map_detail_levels
+        if not (levels and (self.share_payloads or self.external_state)):
+            self._map_detail_levels_blob = None
+            return
+        content = jsonio.dumps(levels)
+        source = (write_sidecar(content, self.external_state)
+                  if self.external_state else None)
+        blob = blob_store.acquire(content, compress=self.compress_payloads,
+                                  source=source)
+        if blob is self._map_detail_levels_blob:
+            # already referenced by this Builder
+            blob_store.release(blob)
+        else:
+            self._map_detail_levels_blob = blob
+
+    def _update_search_index(self):
+        # with progressive_loading, the widget adds the tiles to its index as
+        # they load
+        if self.prebuild_search_index and self._loaded_map_json and \
+           not self.progressive_loading:
+            with metrics.timer('frontend_search_index'):
+                self._search_index = frontend_search_index(
+                    self._loaded_map_json
+                )
+        else:
+            self._search_index = None
+
+    def _handle_custom_msg(self, widget, content, buffers):
+        if content.get('event') != 'request_tiles':
+            return
+        tiles = self._get_map_tiles()
+        if tiles is None:
+            return
+        keys = content.get('keys', [])
+        for start in range(0, len(keys), TILES_PER_MESSAGE):
+            batch = [tiles.tile(key)
+                     for key in keys[start:start + TILES_PER_MESSAGE]]
+            _record_payload('tiles', batch)
+            self.send({'event': 'tiles', 'tiles': batch})
+
+    def close(self):
+        """Close the widget, and release the map and model it shares with
+        other Builders.
+
+        """
+        self._map_blob = None
+        self._model_blob = None
+        self._map_detail_levels_blob = None
+        super().close()
+
     def display_in_notebook(self, *args, **kwargs):
         """Deprecated.
 
@@ -606,23 +1433,47 @@ class Builder(widgets.DOMWidget):
             The name of the HTML file.
 
         """
-        options = {}
-        for key in self.traits(option=True):
-            val = getattr(self, key)
-            if val is not None:
-                options[key] = val
-        options_json = json.dumps(options)
-
-        template = env.get_template('standalone.html')
-        embedded_css_b64 = (b64dump(self.embedded_css)
-                            if self.embedded_css is not None else None)
-        html = template.render(
-            escher_url=get_url('escher_min'),
-            embedded_css_b64=embedded_css_b64,
-            map_data_json_b64=b64dump(self._loaded_map_json),
-            model_data_json_b64=b64dump(self._loaded_model_json),
-            options_json_b64=b64dump(options_json),
+        with metrics.timer('save_html.encode'):
+            options = {}
+            for key in self.traits(option=True):
+                val = getattr(self, key)
+                if key in ('reaction_data', 'metabolite_data',
+                           'gene_data') and val is not None:
+                    val = self._data_for_widget(key.split('_')[0], val)
+                if val is not None:
+                    options[key] = val
+            options_json = jsonio.dumps(options)
+
+        # The template is rendered with placeholders, and the base64 payloads
+        # are encoded in chunks and written in their place, so the whole
+        # document is never held in memory
+        payloads = {
+            'map_data_json_b64': self._loaded_map_json,
+            'model_data_json_b64': self._loaded_model_json,
+            'options_json_b64': options_json,
+        }
+        if self.embedded_css is not None:
+            payloads['embedded_css_b64'] = self.embedded_css
+        placeholders = {'@@escher:%s@@' % key: key for key in payloads}
+        placeholder_re = re.compile(
+            '(%s)' % '|'.join(re.escape(p) for p in placeholders)
         )
 
-        with open(expanduser(filepath), 'wb') as f:
-            f.write(html.encode('utf-8'))
+        with metrics.timer('save_html.render') as timer:
+            template = env.get_template('standalone.html')
+            context = {'escher_url': get_url('escher_min'),
+                       'embedded_css_b64': None}
+            context.update((key, p) for p, key in placeholders.items())
+            pieces = template.generate(**context)
+            with open(expanduser(filepath), 'w', encoding='utf-8',
+                      newline='') as f:
+                for piece in pieces:
+                    for part in placeholder_re.split(piece):
+                        if part in placeholders:
+                            for chunk in b64dump_chunks(
+                                    payloads[placeholders[part]]):
+                                f.write(chunk)
+                                timer.add_bytes(chunk)
+                        else:
+                            f.write(part)
+                            timer.add_bytes(part)
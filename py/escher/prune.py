@@ -0,0 +1,93 @@
+"""Drop the data that a map does not show.
+
+The frontend looks up reaction and metabolite data by BiGG ID and by name,
+and gene data by the BiGG ID and name of the genes of each reaction. Data for
+anything else is never shown, so it does not need to be sent:
+
+.. code:: python
+
+    from escher.prune import data_identifiers, prune_data
+
+    identifiers = data_identifiers(map_data)
+    pruned, coverage = prune_data(gene_data, identifiers['gene'])
+    coverage
+    # {'matched': 137, 'unmatched': 4203, 'unmatched_ids': [...]}
+
+"""
+
+from escher import jsonio
+
+#: The kinds of data, and the Builder traits that hold them
+DATA_KINDS = ('reaction', 'metabolite', 'gene')
+
+
+def _add(ids, element, *keys):
+    for key in keys:
+        value = element.get(key)
+        if value is not None:
+            ids.add(value)
+
+
+def data_identifiers(map_data=None, model_data=None):
+    """Return the IDs and names that data can match, as a dictionary with a
+    set for 'reaction', 'metabolite' and 'gene'.
+
+    :param map_data: The map as a JSON string or as the parsed list of header
+                     and body.
+
+    :param model_data: Also include the reactions, metabolites and genes of a
+                       model in the COBRA JSON format, as a string or a parsed
+                       dictionary.
+
+    """
+    identifiers = {kind: set() for kind in DATA_KINDS}
+    if isinstance(map_data, str):
+        map_data = jsonio.loads(map_data)
+    if map_data:
+        body = map_data[1]
+        for reaction in body.get('reactions', {}).values():
+            _add(identifiers['reaction'], reaction, 'bigg_id', 'name')
+            for gene in reaction.get('genes', []):
+                _add(identifiers['gene'], gene, 'bigg_id', 'name')
+        for node in body.get('nodes', {}).values():
+            if node['node_type'] == 'metabolite':
+                _add(identifiers['metabolite'], node, 'bigg_id', 'name')
+    if isinstance(model_data, str):
+        model_data = jsonio.loads(model_data)
+    if model_data:
+        for key, kind in (('reactions', 'reaction'),
+                          ('metabolites', 'metabolite'),
+                          ('genes', 'gene')):
+            for element in model_data.get(key, []):
+                _add(identifiers[kind], element, 'id', 'name')
+    return identifiers
+
+
+def prune_data(data, identifiers):
+    """Remove the values for IDs that are not in identifiers.
+
+    Returns the pruned data, in the same form, and the coverage: a dictionary
+    with the number of matched and unmatched IDs, and the sorted unmatched
+    IDs.
+
+    :param data: A dictionary, or a list of dictionaries for more than one
+                 dataset, as returned by escher.plots.convert_data.
+
+    :param identifiers: A set of IDs and names, e.g. from data_identifiers.
+
+    """
+    if data is None:
+        return None, {'matched': 0, 'unmatched': 0, 'unmatched_ids': []}
+    datasets = data if isinstance(data, list) else [data]
+    all_ids = set()
+    for dataset in datasets:
+        all_ids.update(dataset)
+    matched = all_ids & identifiers
+    pruned = [{k: v for k, v in dataset.items() if k in matched}
+              for dataset in datasets]
+    coverage = {
+        'matched': len(matched),
+        'unmatched': len(all_ids) - len(matched),
+        'unmatched_ids': sorted(all_ids - matched, key=str),
+    }
+    return (pruned if isinstance(data, list) else pruned[0]), coverage
@@ -0,0 +1,308 @@
+"""Search maps and models by ID, name and gene.
+
+.. code:: python
+
+    from escher.search import SearchIndex
+
+    index = SearchIndex()
+    index.add_map(map_data, source='e_coli_core.Core metabolism')
+    index.add_model(model_data, source='e_coli_core')
+    index.search('glc')
+    index.save('index.json')
+
+Terms are matched by prefix, and by trigram similarity for misspelled and
+partial queries. Names are also indexed word by word, so 'phosphate' finds
+'D-Glucose 6-phosphate'.
+
+"""
+
+from escher.validate import genes_for_gene_reaction_rule
+from escher import jsonio
+
+from bisect import bisect_left
+from collections import Counter
+from itertools import chain
+import math
+import re
+
+#: The version of the serialized index
+INDEX_VERSION = 1
+
+_word_re = re.compile(r'[^\W_]+', re.UNICODE)
+
+
+def trigrams(term):
+    """Return the set of trigrams of a term, padded with spaces so that short
+    terms and word starts have trigrams.
+
+    """
+    padded = '  %s ' % term
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _terms(value, words=False):
+    if not value:
+        return []
+    value = value.lower()
+    terms = [value]
+    if words:
+        terms.extend(w for w in _word_re.findall(value) if w != value)
+    return terms
+
+
+class SearchIndex(object):
+    """An inverted index over the reactions, metabolites, genes and text labels
+    of maps and models.
+
+    Each record describes one element: its type ('reaction', 'metabolite',
+    'gene' or 'text_label'), the source it came from, its ID in the source
+    (e.g. the node ID in a map), its BiGG ID and its name.
+
+    """
+
+    def __init__(self):
+        self.records = []
+        #: (term, record index) pairs
+        self.terms = []
+        self._prefix = None
+        self._trigrams = None
+
+    def _add(self, kind, source, element_id, bigg_id, name, extra_terms=()):
+        record_index = len(self.records)
+        self.records.append({
+            'type': kind,
+            'source': source,
+            'id': element_id,
+            'bigg_id': bigg_id,
+            'name': name,
+        })
+        terms = set(_terms(bigg_id))
+        terms.update(_terms(name, words=True))
+        for extra in extra_terms:
+            terms.update(_terms(extra))
+        self.terms.extend((term, record_index) for term in sorted(terms))
+        self._prefix = None
+        self._trigrams = None
+
+    def add_map(self, map_data, source=None):
+        """Add the reactions, metabolite nodes and text labels of a map.
+
+        :param map_data: The map as a JSON string or as the parsed list of
+                         header and body.
+
+        :param str source: A name for the map. Defaults to the map name.
+
+        """
+        if isinstance(map_data, str):
+            map_data = jsonio.loads(map_data)
+        header, body = map_data[0], map_data[1]
+        if source is None:
+            source = header.get('map_name')
+        for reaction_id, reaction in body.get('reactions', {}).items():
+            gene_terms = genes_for_gene_reaction_rule(
+                reaction.get('gene_reaction_rule', '')
+            )
+            for gene in reaction.get('genes', []):
+                gene_terms.extend([gene.get('bigg_id'), gene.get('name')])
+            self._add('reaction', source, reaction_id, reaction.get('bigg_id'),
+                      reaction.get('name'), gene_terms)
+        for node_id, node in body.get('nodes', {}).items():
+            if node['node_type'] == 'metabolite':
+                self._add('metabolite', source, node_id, node.get('bigg_id'),
+                          node.get('name'))
+        for label_id, label in body.get('text_labels', {}).items():
+            self._add('text_label', source, label_id, None, label.get('text'))
+
+    def add_model(self, model_data, source=None):
+        """Add the reactions, metabolites and genes of a model.
+
+        :param model_data: The model in the COBRA JSON format, as a string or
+                           a parsed dictionary.
+
+        :param str source: A name for the model. Defaults to the model ID.
+
+        """
+        if isinstance(model_data, str):
+            model_data = jsonio.loads(model_data)
+        if source is None:
+            source = model_data.get('id')
+        for reaction in model_data.get('reactions', []):
+            self._add('reaction', source, reaction['id'], reaction['id'],
+                      reaction.get('name'),
+                      genes_for_gene_reaction_rule(
+                          reaction.get('gene_reaction_rule', '')
+                      ))
+        for metabolite in model_data.get('metabolites', []):
+            self._add('metabolite', source, metabolite['id'], metabolite['id'],
+                      metabolite.get('name'))
+        for gene in model_data.get('genes', []):
+            self._add('gene', source, gene['id'], gene['id'], gene.get('name'))
+
+    def _build(self):
+        if self._prefix is None:
+            self._prefix = sorted(self.terms)
+            self._prefix_terms = [term for term, _ in self._prefix]
+        if self._trigrams is None:
+            self._trigrams = {}
+            self._term_list = sorted({term for term, _ in self.terms})
+            self._term_records = {}
+            for term, record_index in self.terms:
+                self._term_records.setdefault(term, []).append(record_index)
+            self._term_sizes = []
+            for i, term in enumerate(self._term_list):
+                term_trigrams = trigrams(term)
+                self._term_sizes.append(len(term_trigrams))
+                for trigram in term_trigrams:
+                    self._trigrams.setdefault(trigram, []).append(i)
+
+    def prefix_search(self, prefix):
+        """Return the indices of the records with a term that starts with
+        prefix, and whether the term is an exact match.
+
+        """
+        self._build()
+        prefix = prefix.lower()
+        found = {}
+        start = bisect_left(self._prefix_terms, prefix)
+        for term, record_index in self._prefix[start:]:
+            if not term.startswith(prefix):
+                break
+            found[record_index] = found.get(record_index, False) or term == prefix
+        return found
+
+    def trigram_search(self, query, min_similarity=0.3):
+        """Return the indices of the records with a term that is similar to the
+        query, with the similarity (Jaccard index of trigrams) of the best
+        term.
+
+        """
+        self._build()
+        query_trigrams = trigrams(query.lower())
+        counts = Counter(chain.from_iterable(
+            self._trigrams.get(trigram, ()) for trigram in query_trigrams
+        ))
+        # a term needs at least this many trigrams in common to be similar
+        # enough
+        min_common = math.ceil(min_similarity * len(query_trigrams))
+        found = {}
+        for term_index, common in counts.items():
+            if common < min_common:
+                continue
+            similarity = common / float(len(query_trigrams) +
+                                        self._term_sizes[term_index] - common)
+            if similarity < min_similarity:
+                continue
+            for record_index in self._term_records[self._term_list[term_index]]:
+                if similarity > found.get(record_index, 0):
+                    found[record_index] = similarity
+        return found
+
+    def search(self, query, limit=20, kind=None, source=None,
+               min_similarity=0.3):
+        """Search the index.
+
+        Returns a list of records, each with a score: 1 for an exact match, 0.9
+        for a prefix match, and the trigram similarity otherwise. Results are
+        sorted by score.
+
+        :param str query: The text to search for.
+
+        :param int limit: The maximum number of results.
+
+        :param str kind: Only return records of this type, e.g. 'reaction'.
+
+        :param str source: Only return records from this source.
+
+        :param float min_similarity: The minimum trigram similarity.
+
+        """
+        query = query.strip()
+        if not query:
+            return []
+
+        def matches(i):
+            record = self.records[i]
+            return ((kind is None or record['type'] == kind) and
+                    (source is None or record['source'] == source))
+
+        scores = {i: 1.0 if exact else 0.9
+                  for i, exact in self.prefix_search(query).items()
+                  if matches(i)}
+        # only look for similar terms if there are not enough prefix matches
+        if len(scores) < limit:
+            for i, similarity in self.trigram_search(query,
+                                                     min_similarity).items():
+                if i not in scores and matches(i):
+                    scores[i] = similarity
+        ranked = sorted(scores, key=lambda i: (-scores[i], i))[:limit]
+        return [dict(self.records[i], score=scores[i]) for i in ranked]
+
+    def to_dict(self):
+        """Return the index as a dictionary that can be dumped as JSON."""
+        return {
+            'version': INDEX_VERSION,
+            'records': self.records,
+            'terms': self.terms,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Load an index from the output of to_dict."""
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError('Unsupported search index version %s' %
+                             data.get('version'))
+        index = cls()
+        index.records = data['records']
+        index.terms = [tuple(t) for t in data['terms']]
+        return index
+
+    def save(self, filepath):
+        """Save the index as a JSON file."""
+        with open(filepath, 'wb') as f:
+            jsonio.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, filepath):
+        """Load an index saved with save."""
+        with open(filepath, 'rb') as f:
+            return cls.from_dict(jsonio.load(f))
+
+    def __len__(self):
+        return len(self.records)
+
+
+def frontend_search_index(map_data):
+    """Return the search records for a map in the form used by SearchIndex.js,
+    so the widget can load them instead of building the index.
+
+    :param map_data: The map as a JSON string or as the parsed list of header
+                     and body.
+
+    """
+    if isinstance(map_data, str):
+        map_data = jsonio.loads(map_data)
+    body = map_data[1]
+    records = {}
+    for node_id, node in body.get('nodes', {}).items():
+        if node['node_type'] != 'metabolite':
+            continue
+        data = {'type': 'metabolite', 'node_id': node_id}
+        records['n' + node_id] = {'name': node.get('bigg_id'), 'data': data}
+        records['n_name' + node_id] = {'name': node.get('name'), 'data': data}
+    for reaction_id, reaction in body.get('reactions', {}).items():
+        data = {'type': 'reaction', 'reaction_id': reaction_id}
+        records['r' + reaction_id] = {'name': reaction.get('bigg_id'),
+                                      'data': data}
+        records['r_name' + reaction_id] = {'name': reaction.get('name'),
+                                           'data': data}
+        for i, gene in enumerate(reaction.get('genes', [])):
+            key = 'r%s_g%d' % (reaction_id, i)
+            records[key] = {'name': gene.get('bigg_id'), 'data': data}
+            key = 'r%s_g_name%d' % (reaction_id, i)
+            records[key] = {'name': gene.get('name'), 'data': data}
+    for label_id, label in body.get('text_labels', {}).items():
+        records['l' + label_id] = {
+            'name': label.get('text'),
+            'data': {'type': 'text_label', 'text_label_id': label_id},
+        }
+    return records
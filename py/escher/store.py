@@ -0,0 +1,335 @@
+"""A SQLite repository of maps and models.
+
+The store keeps maps and models in one database file, with indexed tables of
+their reactions, metabolites and genes, so questions about many maps are
+answered without loading them:
+
+.. code:: python
+
+    from escher.store import MapStore
+
+    with MapStore('maps.db') as store:
+        store.ingest(glob('maps/*.json') + glob('models/*.json'))
+        store.find_maps(reaction='PGK')
+        # ['e_coli_core.Core metabolism', 'iJO1366.Central metabolism']
+        store.find_maps(gene='b1779')
+        builder = store.builder(map_name='e_coli_core.Core metabolism',
+                                model_name='e_coli_core')
+
+Reactions, metabolites and genes are matched by BiGG ID or by name.
+
+"""
+
+from escher import jsonio, metrics
+from escher.blobs import content_hash
+from escher.plots import Builder
+
+from os.path import basename, splitext
+import sqlite3
+
+#: The kinds of elements, with their tables
+ELEMENT_TABLES = {'reaction': 'reactions', 'metabolite': 'metabolites',
+                  'gene': 'genes'}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS maps (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    digest TEXT NOT NULL,
+    json TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS models (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    digest TEXT NOT NULL,
+    json TEXT NOT NULL
+);
+"""
+
+# one table for each kind of element, with the maps and models that have it
+_ELEMENT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    source TEXT NOT NULL,
+    source_id INTEGER NOT NULL,
+    bigg_id TEXT,
+    name TEXT
+);
+CREATE INDEX IF NOT EXISTS {table}_bigg_id ON {table} (bigg_id, source);
+CREATE INDEX IF NOT EXISTS {table}_name ON {table} (name, source);
+CREATE INDEX IF NOT EXISTS {table}_source ON {table} (source, source_id);
+"""
+
+
+def map_elements(map_data):
+    """Return the (bigg_id, name) pairs of the reactions, metabolites and
+    genes of a map, as a dictionary with a set for each kind.
+
+    """
+    elements = {kind: set() for kind in ELEMENT_TABLES}
+    body = map_data[1]
+    for reaction in body.get('reactions', {}).values():
+        elements['reaction'].add((reaction.get('bigg_id'),
+                                  reaction.get('name')))
+        for gene in reaction.get('genes', []):
+            elements['gene'].add((gene.get('bigg_id'), gene.get('name')))
+    for node in body.get('nodes', {}).values():
+        if node['node_type'] == 'metabolite':
+            elements['metabolite'].add((node.get('bigg_id'), node.get('name')))
+    return elements
+
+
+def model_elements(model_data):
+    """Return the (id, name) pairs of the reactions, metabolites and genes of a
+    model in the COBRA JSON format, as a dictionary with a set for each kind.
+
+    """
+    return {
+        kind: {(element['id'], element.get('name'))
+               for element in model_data.get(kind + 's', [])}
+        for kind in ELEMENT_TABLES
+    }
+
+
+def _parse(data):
+    """Return the parsed data and the JSON text."""
+    if isinstance(data, (str, bytes)):
+        text = data if isinstance(data, str) else data.decode('utf-8')
+        return jsonio.loads(data), text
+    return data, jsonio.dumps(data)
+
+
+class MapStore(object):
+    """Maps and models in a SQLite database.
+
+    :param str path: The database file. It is created if it does not exist.
+                     Defaults to a database in memory.
+
+    """
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.executescript(_SCHEMA + ''.join(
+                _ELEMENT_SCHEMA.format(table=table)
+                for table in ELEMENT_TABLES.values()
+            ))
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _add(self, source, name, data, text):
+        """Insert a map or model in the open transaction."""
+        if source == 'map':
+            elements = map_elements(data)
+        else:
+            elements = model_elements(data)
+        cursor = self._connection.cursor()
+        row = cursor.execute('SELECT id FROM %ss WHERE name = ?' % source,
+                             (name,)).fetchone()
+        if row is not None:
+            self._remove(cursor, source, row[0])
+        cursor.execute('INSERT INTO %ss (name, digest, json) VALUES (?, ?, ?)'
+                       % source, (name, content_hash(text), text))
+        source_id = cursor.lastrowid
+        for kind, pairs in elements.items():
+            cursor.executemany(
+                'INSERT INTO %s (source, source_id, bigg_id, name) '
+                'VALUES (?, ?, ?, ?)' % ELEMENT_TABLES[kind],
+                [(source, source_id, bigg_id, element_name)
+                 for bigg_id, element_name in pairs]
+            )
+        return name
+
+    def _remove(self, cursor, source, source_id):
+        for table in ELEMENT_TABLES.values():
+            cursor.execute('DELETE FROM %s WHERE source = ? AND source_id = ?'
+                           % table, (source, source_id))
+        cursor.execute('DELETE FROM %ss WHERE id = ?' % source, (source_id,))
+
+    def add_map(self, map_data, name=None):
+        """Add a map, replacing the map with the same name.
+
+        Returns the name of the map.
+
+        :param map_data: The map as a JSON string or as the parsed list of
+                         header and body.
+
+        :param str name: The name of the map. Defaults to the map_name in the
+                         header.
+
+        """
+        data, text = _parse(map_data)
+        name = name or data[0].get('map_name')
+        if not name:
+            raise ValueError('The map has no map_name. Pass a name.')
+        with self._connection:
+            return self._add('map', name, data, text)
+
+    def add_model(self, model_data, name=None):
+        """Add a model, replacing the model with the same name.
+
+        Returns the name of the model.
+
+        :param model_data: The model in the COBRA JSON format, as a string or
+                           a parsed dictionary.
+
+        :param str name: The name of the model. Defaults to the model ID.
+
+        """
+        data, text = _parse(model_data)
+        name = name or data.get('id')
+        if not name:
+            raise ValueError('The model has no id. Pass a name.')
+        with self._connection:
+            return self._add('model', name, data, text)
+
+    def ingest(self, filepaths):
+        """Add map and model files in one transaction, which is much faster
+        than adding them one at a time. Files with a list are maps, and files
+        with an object are models. Maps are named by their map_name, and
+        models by their ID, or by the file name without .json.
+
+        Returns a dictionary with the names of the added maps and models.
+
+        :param filepaths: A list of paths to JSON files.
+
+        """
+        added = {'maps': [], 'models': []}
+        with metrics.timer('store.ingest') as timer, self._connection:
+            for filepath in filepaths:
+                with open(filepath, 'rb') as f:
+                    raw = f.read()
+                timer.add_bytes(len(raw))
+                data = jsonio.loads(raw)
+                text = raw.decode('utf-8')
+                fallback = splitext(basename(filepath))[0]
+                if isinstance(data, list):
+                    name = data[0].get('map_name') or fallback
+                    added['maps'].append(self._add('map', name, data, text))
+                else:
+                    name = data.get('id') or fallback
+                    added['models'].append(self._add('model', name, data,
+                                                     text))
+        return added
+
+    def remove_map(self, name):
+        """Remove a map. Raises KeyError if it is not in the store."""
+        self._remove_named('map', name)
+
+    def remove_model(self, name):
+        """Remove a model. Raises KeyError if it is not in the store."""
+        self._remove_named('model', name)
+
+    def _remove_named(self, source, name):
+        with self._connection:
+            cursor = self._connection.cursor()
+            row = cursor.execute('SELECT id FROM %ss WHERE name = ?' % source,
+                                 (name,)).fetchone()
+            if row is None:
+                raise KeyError('No %s named %s in the store' % (source, name))
+            self._remove(cursor, source, row[0])
+
+    def list_maps(self):
+        """Return the names of the maps, sorted."""
+        return [row[0] for row in self._connection.execute(
+            'SELECT name FROM maps ORDER BY name'
+        )]
+
+    def list_models(self):
+        """Return the names of the models, sorted."""
+        return [row[0] for row in self._connection.execute(
+            'SELECT name FROM models ORDER BY name'
+        )]
+
+    def _json(self, source, name):
+        row = self._connection.execute(
+            'SELECT json FROM %ss WHERE name = ?' % source, (name,)
+        ).fetchone()
+        if row is None:
+            raise KeyError('No %s named %s in the store' % (source, name))
+        return row[0]
+
+    def map_json(self, name):
+        """Return a map as a JSON string."""
+        return self._json('map', name)
+
+    def model_json(self, name):
+        """Return a model as a JSON string."""
+        return self._json('model', name)
+
+    def _find(self, source, criteria):
+        """Return the names of the maps or models with every element in
+        criteria, a dictionary of kind and ID or name.
+
+        """
+        queries, params = [], []
+        for kind, value in criteria.items():
+            if value is None:
+                continue
+            if kind not in ELEMENT_TABLES:
+                raise ValueError('Unknown element type %s' % kind)
+            # two lookups, so each uses its index
+            table = ELEMENT_TABLES[kind]
+            queries.append(
+                'SELECT source_id FROM {t} WHERE bigg_id = ? AND source = ? '
+                'UNION SELECT source_id FROM {t} WHERE name = ? AND source = ?'
+                .format(t=table)
+            )
+            params.extend([value, source, value, source])
+        if not queries:
+            raise ValueError('Pass a reaction, metabolite or gene to find')
+        sql = ('SELECT name FROM {s}s WHERE id IN ({q}) ORDER BY name'
+               .format(s=source, q=' INTERSECT '.join(queries)))
+        return [row[0] for row in self._connection.execute(sql, params)]
+
+    def find_maps(self, reaction=None, metabolite=None, gene=None):
+        """Return the names of the maps that have all of the given reaction,
+        metabolite and gene, by BiGG ID or name.
+
+        """
+        return self._find('map', {'reaction': reaction,
+                                  'metabolite': metabolite, 'gene': gene})
+
+    def find_models(self, reaction=None, metabolite=None, gene=None):
+        """Return the names of the models that have all of the given
+        reaction, metabolite and gene, by ID or name.
+
+        """
+        return self._find('model', {'reaction': reaction,
+                                    'metabolite': metabolite, 'gene': gene})
+
+    def stats(self):
+        """Return the number of maps, models, reactions, metabolites and
+        genes in the store.
+
+        """
+        counts = {}
+        for table in ('maps', 'models') + tuple(ELEMENT_TABLES.values()):
+            counts[table] = self._connection.execute(
+                'SELECT COUNT(*) FROM %s' % table
+            ).fetchone()[0]
+        return counts
+
+    def builder(self, map_name=None, model_name=None, **kwargs):
+        """Return a Builder with a map and a model from the store.
+
+        :param str map_name: The name of a map in the store.
+
+        :param str model_name: The name of a model in the store.
+
+        :param kwargs: Other arguments for the Builder.
+
+        """
+        return Builder(
+            map_json=self.map_json(map_name) if map_name else None,
+            model_json=self.model_json(model_name) if model_name else None,
+            **kwargs
+        )
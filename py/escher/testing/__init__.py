@@ -0,0 +1 @@
+"""Tools for testing Escher at scale."""
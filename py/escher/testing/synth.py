@@ -0,0 +1,299 @@
+"""Generate synthetic maps, models and data for load testing.
+
+The generated map, model and data agree with each other when they are created
+with the same arguments and seed:
+
+.. code:: python
+
+    from escher.testing import synth
+
+    escher_map = synth.generate_map(n_reactions=10000, n_text_labels=100)
+    model = synth.generate_model(n_reactions=10000)
+    reaction_data = synth.generate_data(synth.reaction_ids(10000))
+    builder = Builder(map_json=json.dumps(escher_map),
+                      model_json=json.dumps(model),
+                      reaction_data=reaction_data)
+
+Reaction ``i`` converts metabolite ``i % n_metabolites`` into metabolite
+``(i + 1) % n_metabolites``. Every metabolite is drawn once, so a map has
+``n_metabolites + n_reactions * (segments_per_reaction - 1)`` nodes and
+``n_reactions * segments_per_reaction`` segments. Output is deterministic for a
+given seed.
+
+"""
+
+from escher import __schema_version__
+
+import math
+import random
+
+SPACING = 250
+MARGIN = 100
+LANE_OFFSET = 40
+
+
+def reaction_ids(n_reactions):
+    """Return the BiGG IDs of the synthetic reactions."""
+    return ['R%d' % i for i in range(n_reactions)]
+
+
+def metabolite_ids(n_metabolites):
+    """Return the BiGG IDs of the synthetic metabolites."""
+    return ['M%d_c' % i for i in range(n_metabolites)]
+
+
+def gene_ids(n_reactions, genes_per_reaction=1):
+    """Return the IDs of the synthetic genes."""
+    return ['G%d' % i for i in range(n_reactions * genes_per_reaction)]
+
+
+def _check_counts(n_reactions, n_metabolites):
+    if n_reactions < 1:
+        raise ValueError('n_reactions must be at least 1')
+    if n_metabolites is None:
+        n_metabolites = max(n_reactions, 2)
+    if n_metabolites < 2:
+        raise ValueError('n_metabolites must be at least 2')
+    return n_metabolites
+
+
+def _reversibility(n_reactions, seed):
+    """Reversibility of each reaction, shared by the map and the model."""
+    rand = random.Random('reversibility-%s' % seed)
+    return [rand.random() < 0.5 for _ in range(n_reactions)]
+
+
+def _reaction_genes(i, genes_per_reaction):
+    return ['G%d' % (i * genes_per_reaction + k)
+            for k in range(genes_per_reaction)]
+
+
+def generate_map(n_reactions=100, n_metabolites=None, segments_per_reaction=4,
+                 bezier_fraction=0.5, n_text_labels=0, genes_per_reaction=1,
+                 seed=0, map_name='synthetic'):
+    """Generate a schema-valid Escher map.
+
+    :param int n_reactions: The number of reactions.
+
+    :param int n_metabolites: The number of metabolites, each drawn as one
+                              node. Defaults to n_reactions.
+
+    :param int segments_per_reaction: The number of segments in each reaction,
+                                      at least 2. A reaction has one fewer
+                                      marker nodes than segments.
+
+    :param float bezier_fraction: The fraction of segments with bezier points.
+
+    :param int n_text_labels: The number of text labels.
+
+    :param int genes_per_reaction: The number of genes in each gene reaction
+                                   rule.
+
+    :param seed: The seed for the random layout.
+
+    :param str map_name: The name of the map.
+
+    """
+    n_metabolites = _check_counts(n_reactions, n_metabolites)
+    if segments_per_reaction < 2:
+        raise ValueError('segments_per_reaction must be at least 2')
+
+    rand = random.Random('map-%s' % seed)
+    reversibility = _reversibility(n_reactions, seed)
+    columns = int(math.ceil(math.sqrt(n_metabolites)))
+    rows = int(math.ceil(n_metabolites / float(columns)))
+
+    nodes = {}
+    for i, bigg_id in enumerate(metabolite_ids(n_metabolites)):
+        x = MARGIN + (i % columns) * SPACING + rand.uniform(-20, 20)
+        y = MARGIN + (i // columns) * SPACING + rand.uniform(-20, 20)
+        nodes[str(i)] = {
+            'node_type': 'metabolite',
+            'x': round(x, 2),
+            'y': round(y, 2),
+            'bigg_id': bigg_id,
+            'name': 'Metabolite %d' % i,
+            'label_x': round(x + 15, 2),
+            'label_y': round(y - 15, 2),
+            'node_is_primary': True,
+        }
+
+    reactions = {}
+    next_id = n_metabolites
+    midmarker_index = segments_per_reaction // 2
+    for i in range(n_reactions):
+        from_id = i % n_metabolites
+        to_id = (i + 1) % n_metabolites
+        start = nodes[str(from_id)]
+        end = nodes[str(to_id)]
+        dx = end['x'] - start['x']
+        dy = end['y'] - start['y']
+        length = math.hypot(dx, dy) or 1.0
+        # reactions that reuse a pair of metabolites are drawn in parallel
+        # lanes
+        lane = LANE_OFFSET * (i // n_metabolites)
+        normal_x = -dy / length
+        normal_y = dx / length
+
+        chain = [str(from_id)]
+        for k in range(1, segments_per_reaction):
+            t = k / float(segments_per_reaction)
+            node_id = str(next_id)
+            next_id += 1
+            nodes[node_id] = {
+                'node_type': ('midmarker' if k == midmarker_index
+                              else 'multimarker'),
+                'x': round(start['x'] + t * dx + lane * normal_x, 2),
+                'y': round(start['y'] + t * dy + lane * normal_y, 2),
+            }
+            chain.append(node_id)
+        chain.append(str(to_id))
+
+        segments = {}
+        for from_node_id, to_node_id in zip(chain[:-1], chain[1:]):
+            b1 = b2 = None
+            if rand.random() < bezier_fraction:
+                a = nodes[from_node_id]
+                b = nodes[to_node_id]
+                bend = rand.uniform(-30, 30)
+                b1 = {'x': round(a['x'] + (b['x'] - a['x']) / 3 + bend * normal_x, 2),
+                      'y': round(a['y'] + (b['y'] - a['y']) / 3 + bend * normal_y, 2)}
+                b2 = {'x': round(a['x'] + 2 * (b['x'] - a['x']) / 3 + bend * normal_x, 2),
+                      'y': round(a['y'] + 2 * (b['y'] - a['y']) / 3 + bend * normal_y, 2)}
+            segments[str(next_id)] = {
+                'from_node_id': from_node_id,
+                'to_node_id': to_node_id,
+                'b1': b1,
+                'b2': b2,
+            }
+            next_id += 1
+
+        genes = _reaction_genes(i, genes_per_reaction)
+        midmarker = nodes[chain[midmarker_index]]
+        reactions[str(next_id)] = {
+            'name': 'Reaction %d' % i,
+            'bigg_id': 'R%d' % i,
+            'reversibility': reversibility[i],
+            'label_x': round(midmarker['x'] + 20 * normal_x, 2),
+            'label_y': round(midmarker['y'] + 20 * normal_y, 2),
+            'gene_reaction_rule': ' and '.join(genes),
+            'genes': [{'bigg_id': g, 'name': g.lower()} for g in genes],
+            'metabolites': [
+                {'bigg_id': start['bigg_id'], 'coefficient': -1},
+                {'bigg_id': end['bigg_id'], 'coefficient': 1},
+            ],
+            'segments': segments,
+        }
+        next_id += 1
+
+    width = (columns - 1) * SPACING + 2 * MARGIN
+    height = (rows - 1) * SPACING + 2 * MARGIN
+    text_labels = {}
+    for i in range(n_text_labels):
+        text_labels[str(next_id)] = {
+            'text': 'Label %d' % i,
+            'x': round(rand.uniform(0, width), 2),
+            'y': round(rand.uniform(0, height), 2),
+        }
+        next_id += 1
+
+    header = {
+        'map_name': map_name,
+        'map_id': 'synthetic_%s' % seed,
+        'map_description': ('Synthetic map with %d reactions and %d '
+                            'metabolites' % (n_reactions, n_metabolites)),
+        'homepage': 'https://escher.github.io',
+        'schema': 'https://escher.github.io/escher/jsonschema/%s#' %
+                  __schema_version__,
+    }
+    body = {
+        'reactions': reactions,
+        'nodes': nodes,
+        'text_labels': text_labels,
+        'canvas': {
+            'x': -MARGIN,
+            'y': -MARGIN,
+            'width': width + 2 * MARGIN,
+            'height': height + 2 * MARGIN,
+        },
+    }
+    return [header, body]
+
+
+def generate_model(n_reactions=100, n_metabolites=None, genes_per_reaction=1,
+                   seed=0, model_id='synthetic'):
+    """Generate a COBRA model, in the COBRA JSON format, that matches
+    generate_map called with the same arguments.
+
+    :param int n_reactions: The number of reactions.
+
+    :param int n_metabolites: The number of metabolites. Defaults to
+                              n_reactions.
+
+    :param int genes_per_reaction: The number of genes in each gene reaction
+                                   rule.
+
+    :param seed: The seed used for the map.
+
+    :param str model_id: The ID of the model.
+
+    """
+    n_metabolites = _check_counts(n_reactions, n_metabolites)
+    reversibility = _reversibility(n_reactions, seed)
+    mets = metabolite_ids(n_metabolites)
+    reactions = []
+    for i in range(n_reactions):
+        metabolites = {mets[i % n_metabolites]: -1.0,
+                       mets[(i + 1) % n_metabolites]: 1.0}
+        reactions.append({
+            'id': 'R%d' % i,
+            'name': 'Reaction %d' % i,
+            'metabolites': metabolites,
+            'lower_bound': -1000.0 if reversibility[i] else 0.0,
+            'upper_bound': 1000.0,
+            'gene_reaction_rule': ' and '.join(
+                _reaction_genes(i, genes_per_reaction)
+            ),
+        })
+    return {
+        'id': model_id,
+        'name': 'Synthetic model',
+        'version': '1',
+        'compartments': {'c': 'cytosol'},
+        'metabolites': [{'id': bigg_id, 'name': 'Metabolite %d' % i,
+                         'compartment': 'c'}
+                        for i, bigg_id in enumerate(mets)],
+        'reactions': reactions,
+        'genes': [{'id': gene_id, 'name': gene_id.lower()}
+                  for gene_id in gene_ids(n_reactions, genes_per_reaction)],
+    }
+
+
+def generate_data(ids, n_conditions=1, missing_fraction=0.0, scale=10.0,
+                  seed=0):
+    """Generate data for reactions, genes or metabolites.
+
+    Returns a dictionary of values for one condition, or a list of
+    dictionaries for more than one condition, which can be passed as
+    reaction_data, gene_data or metabolite_data to the Builder.
+
+    :param ids: The IDs to generate values for, e.g. from reaction_ids.
+
+    :param int n_conditions: The number of conditions.
+
+    :param float missing_fraction: The fraction of IDs to leave out of each
+                                   condition.
+
+    :param float scale: The standard deviation of the values.
+
+    :param seed: The seed for the random values.
+
+    """
+    rand = random.Random('data-%s' % seed)
+    conditions = []
+    for _ in range(n_conditions):
+        conditions.append({
+            i: round(rand.gauss(0, scale), 4) for i in ids
+            if missing_fraction <= 0 or rand.random() >= missing_fraction
+        })
+    return conditions[0] if n_conditions == 1 else conditions
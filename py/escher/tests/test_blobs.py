@@ -0,0 +1,74 @@
+from escher.blobs import BlobStore, content_hash, write_sidecar
+
+import gzip
+from os.path import join, basename
+
+
+def test_blob_store():
+    store = BlobStore()
+    first = store.acquire('{"a": 1}')
+    second = store.acquire('{"a": 1}')
+    other = store.acquire('{"b": 2}')
+    assert first is second
+    assert first is not other
+    assert first.digest == content_hash('{"a": 1}')
+    assert store.references(first) == 2
+    assert store.stats() == {'blobs': 2, 'references': 3, 'size': 16}
+
+    store.release(first)
+    assert store.references(first) == 1
+    store.release(second)
+    assert store.references(first) == 0
+    assert len(store) == 1
+    # releasing again is harmless
+    store.release(first)
+    store.release(None)
+    assert store.acquire('{"a": 1}') is not first
+
+
+def test_compressed_blob():
+    store = BlobStore()
+    content = '{"a": 1}' * 100
+    plain = store.acquire(content)
+    compressed = store.acquire(content, compress=True)
+    assert compressed is not plain
+    assert compressed.digest == plain.digest
+    state = compressed.get_state('content')['content']
+    assert state['encoding'] == 'gzip'
+    assert state['size'] == len(content)
+    assert gzip.decompress(state['data']).decode('utf-8') == content
+    # compressed once
+    assert compressed.compressed() is compressed.compressed()
+    store.release(compressed)
+    assert store.references(compressed) == 0
+    assert store.references(plain) == 1
+
+
+def test_write_sidecar(tmpdir):
+    directory = str(tmpdir.join('state'))
+    url = write_sidecar('{"a": 1}', directory)
+    assert url.endswith('/state/%s.json' % content_hash('{"a": 1}'))
+    with open(join(directory, basename(url))) as f:
+        assert f.read() == '{"a": 1}'
+    assert write_sidecar('{"a": 1}', directory) == url
+
+
+def test_blob_with_source():
+    store = BlobStore()
+    blob = store.acquire('{"a": 1}', source='state/a.json')
+    assert blob is not store.acquire('{"a": 1}')
+    assert blob.get_state() == {**blob.get_state(), 'content': '',
+                                'source': 'state/a.json'}
+    # the frontend asks for the content
+    sent = []
+    blob.send = lambda content, buffers=None: sent.append((content, buffers))
+    blob._handle_custom_msg(blob, {'event': 'get_content'}, [])
+    assert sent == [({'event': 'content', 'content': '{"a": 1}'}, None)]
+
+    compressed = store.acquire('{"a": 1}', compress=True, source='a.json')
+    compressed.send = \
+        lambda content, buffers=None: sent.append((content, buffers))
+    compressed._handle_custom_msg(compressed, {'event': 'get_content'}, [])
+    content, buffers = sent[-1]
+    assert content['content']['encoding'] == 'gzip'
+    assert gzip.decompress(buffers[0]) == b'{"a": 1}'
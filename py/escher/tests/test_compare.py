@@ -0,0 +1,105 @@
+from escher.compare import (
+    compare_data,
+    float_for_data,
+    format_number,
+    js_number_string,
+    to_floats,
+)
+
+import numpy as np
+import pandas as pd
+from pytest import raises
+
+
+def _float(first, second=None, styles=(), compare_style='diff'):
+    value = float_for_data([first], None if second is None else [second],
+                           styles, compare_style)[0]
+    return None if np.isnan(value) else value
+
+
+def test_float_for_data():
+    # the cases in test_dataStyles.js
+    assert _float(-10, styles=['abs']) == 10
+    assert _float('-10') == -10
+    assert _float(10, -5) == -15
+    assert _float(10, -5, ['abs']) == 15
+    assert _float(10, 5, compare_style='log2_fold') == -1
+    assert _float(10, 5, ['abs'], 'log2_fold') == 1
+    assert _float(10, 5, compare_style='fold') == -2
+    assert _float(10, 5, ['abs'], 'fold') == 2
+    assert _float(0, 5, compare_style='log2_fold') is None
+    assert _float(10, -5, ['abs'], 'log2_fold') is None
+    assert _float(-10, -5, compare_style='log2_fold') == -1
+    assert _float(10, 0, compare_style='log2_fold') is None
+    assert _float(0, 10, compare_style='log2_fold') is None
+    assert _float(None) is None
+    assert _float('') is None
+    # only the fold styles check that the value is finite
+    assert _float('Infinity') == np.inf
+    assert _float('Infinity', 5) == -np.inf
+    assert _float(1, 'Infinity', compare_style='fold') is None
+    assert _float(1, 'Infinity', compare_style='log2_fold') is None
+    with raises(ValueError):
+        _float(10, 5, compare_style='d')
+
+
+def test_to_floats():
+    values = to_floats([1, '2.5', ' 3 ', '', None, True, 'abc', '0x10',
+                        'Infinity', 'inf', '1_000'])
+    assert values[:3].tolist() == [1, 2.5, 3]
+    assert np.isnan(values[[3, 4, 5, 6, 7, 9, 10]]).all()
+    assert values[8] == np.inf
+
+
+def test_format_number():
+    # d3Format('.3g') in the frontend
+    assert format_number(10) == '10.0'
+    assert format_number(-10) == '-10.0'
+    assert format_number(1234.5) == '1.23e+3'
+    assert format_number(0.125, 2) == '0.13'
+    assert format_number(1e-5) == '0.0000100'
+    assert format_number(1e-7) == '1.00e-7'
+    assert format_number(0) == '0.00'
+    assert js_number_string(1.0) == '1'
+    assert js_number_string(1e-7) == '1e-7'
+    assert js_number_string(0.00001) == '0.00001'
+    assert js_number_string(1e21) == '1e+21'
+
+
+def test_compare_data():
+    compared = compare_data([{'a': 10, 'b': '-2', 'c': 0, 'd': 'x'},
+                             {'a': 5, 'b': -4, 'c': 1, 'e': 3}],
+                            compare_style='log2_fold')
+    assert compared['a'] == {'value': -1.0, 'text': '10.0, 5.00: -1.00',
+                             'reverse_flux': False}
+    assert compared['b'] == {'value': 1.0, 'text': '-2.00, -4.00: 1.00',
+                             'reverse_flux': True}
+    assert compared['c'] == {'value': None, 'text': '0, 1: (nd)',
+                             'reverse_flux': False}
+    assert compared['d']['text'] == 'x, (nd): (nd)'
+    assert compared['e']['text'] == '(nd), 3: (nd)'
+
+
+def test_compare_data_infinity():
+    compared = compare_data([{'a': 'Infinity'}, {'a': 5}], compare_style='diff')
+    assert compared['a'] == {'value': '-Infinity',
+                             'text': 'Infinity, 5.00: -Infinity',
+                             'reverse_flux': False}
+
+
+def test_compare_data_one_dataset():
+    compared = compare_data(pd.Series({'a': -1e-9, 'b': 2}), styles=['abs'],
+                            threshold=1e-6)
+    assert compared['a'] == {'value': 0.0, 'text': '0.00',
+                             'reverse_flux': False}
+    assert compared['b']['value'] == 2.0
+
+
+def test_compare_data_dataframe():
+    data = pd.DataFrame({'before': [1.0, 2.0], 'after': [2.0, None]},
+                        index=['a', 'b'])
+    compared = compare_data(data, compare_style='fold')
+    assert compared['a']['value'] == 2.0
+    assert compared['b']['value'] is None
+    with raises(ValueError):
+        compare_data([{}, {}, {}])
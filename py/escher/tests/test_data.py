@@ -0,0 +1,101 @@
+from escher.data import read_data
+from escher.prune import data_identifiers
+
+import gzip
+from os.path import abspath, dirname, join
+
+import pandas as pd
+import pytest
+from pytest import raises
+
+example_data = join(dirname(abspath(__file__)), '..', '..', '..', 'docs',
+                    '_static', 'example_data')
+
+the_map = [{'map_name': 'test'}, {
+    'reactions': {'1': {'bigg_id': 'GAPD', 'name': 'GAPD',
+                        'genes': [{'bigg_id': 'b1779', 'name': 'gapA'}],
+                        'segments': {}}},
+    'nodes': {'2': {'node_type': 'metabolite', 'bigg_id': 'g3p_c',
+                    'name': 'g3p'}},
+}]
+
+csv = """gene,aerobic,anaerobic,note
+b0001,1.5,2.5,x
+b1779,3.0,,y
+gapA,4,5,z
+b9999,6,7,w
+"""
+
+
+def test_read_data(tmpdir):
+    path = str(tmpdir.join('data.csv'))
+    with open(path, 'w') as f:
+        f.write(csv)
+    # every row and column by default
+    data = read_data(path)
+    assert data[0] == {'b0001': 1.5, 'b1779': 3.0, 'gapA': 4.0, 'b9999': 6.0}
+    assert len(data) == 3
+    # the IDs on the map, in chunks smaller than the file
+    data = read_data(path, map_data=the_map, columns=['aerobic', 'anaerobic'],
+                     chunksize=1)
+    assert data == [{'b1779': 3.0, 'gapA': 4.0}, {'gapA': 5.0}]
+    # one column
+    assert read_data(path, map_data=the_map, columns='anaerobic') == \
+        {'gapA': 5.0}
+    assert read_data(path, identifiers={'b0001'}, columns='note',
+                     id_column=0) == {'b0001': 'x'}
+
+    with raises(ValueError):
+        read_data(path, columns=['missing'])
+    with raises(ValueError):
+        read_data(path, kind='protein')
+
+
+def test_read_data_tsv_gz(tmpdir):
+    path = str(tmpdir.join('data.tsv.gz'))
+    with gzip.open(path, 'wt') as f:
+        f.write(csv.replace(',', '\t'))
+    data = read_data(path, map_data=the_map, columns='aerobic')
+    assert data == {'b1779': 3.0, 'gapA': 4.0}
+
+
+def test_read_data_examples():
+    map_path = join(example_data,
+                    'S5_iJO1366.Glycolysis_PPP_AA_Nucleotides.json')
+    with open(map_path) as f:
+        map_json = f.read()
+    genes = read_data(join(example_data,
+                           'S6_RNA-seq_aerobic_to_anaerobic.csv'),
+                      map_data=map_json, chunksize=1000)
+    whole = pd.read_csv(join(example_data,
+                             'S6_RNA-seq_aerobic_to_anaerobic.csv'),
+                        index_col=0)
+    identifiers = data_identifiers(map_json)['gene']
+    expected = whole[whole.index.isin(identifiers)]
+    assert genes == [dict(expected[c]) for c in expected.columns]
+    assert 0 < len(genes[0]) < len(whole)
+
+    metabolites = read_data(
+        join(example_data, 'S4_McCloskey2013_aerobic_metabolomics.csv'),
+        map_data=map_json, kind='metabolite', columns='concentration',
+    )
+    assert metabolites['akg_c'] == pytest.approx(0.0535)
+
+
+def test_read_data_parquet(tmpdir):
+    path = str(tmpdir.join('data.parquet'))
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        with open(path, 'wb') as f:
+            f.write(b'PAR1')
+        with raises(ImportError) as e:
+            read_data(path)
+        assert 'pyarrow' in str(e.value)
+        return
+    frame = pd.DataFrame({'aerobic': [1.5, 3.0, 4.0]},
+                         index=pd.Index(['b0001', 'b1779', 'gapA'],
+                                        name='gene'))
+    frame.to_parquet(path)
+    assert read_data(path, map_data=the_map, chunksize=1) == \
+        [{'b1779': 3.0, 'gapA': 4.0}]
@@ -0,0 +1,63 @@
+from escher import jsonio
+
+import io
+import numpy as np
+from pytest import fixture, raises
+
+DOCUMENT = {'map_name': 'árvíztűrő', 'reactions': {'1': {'x': 1.5, 'y': -2}},
+            'genes': [None, True, 'b1779']}
+
+
+@fixture(params=jsonio.available_backends())
+def backend(request):
+    jsonio.set_backend(request.param)
+    yield request.param
+    jsonio.set_backend()
+
+
+def test_round_trip(backend):
+    text = jsonio.dumps(DOCUMENT)
+    assert isinstance(text, str)
+    assert ' ' not in text.replace('b1779', '')
+    assert 'árvíztűrő' in text
+    assert jsonio.loads(text) == DOCUMENT
+    data = jsonio.dumpb(DOCUMENT)
+    assert data == text.encode('utf-8')
+    assert jsonio.loads(data) == DOCUMENT
+    assert jsonio.loads(bytearray(data)) == DOCUMENT
+
+
+def test_same_output_for_every_backend(backend):
+    jsonio.set_backend('json')
+    expected = jsonio.dumps(DOCUMENT)
+    jsonio.set_backend(backend)
+    assert jsonio.dumps(DOCUMENT) == expected
+
+
+def test_fallback(backend):
+    # integer keys and NaN are not supported by every backend
+    assert jsonio.dumps({1: 2}) == '{"1":2}'
+    assert np.isnan(jsonio.loads('[NaN]')[0])
+    assert jsonio.dumps(np.float64(1.5)) == '1.5'
+    with raises(ValueError):
+        jsonio.loads('not json')
+    with raises(TypeError):
+        jsonio.dumps(object())
+
+
+def test_files(backend):
+    text, binary = io.StringIO(), io.BytesIO()
+    jsonio.dump(DOCUMENT, text)
+    jsonio.dump(DOCUMENT, binary)
+    assert text.getvalue().encode('utf-8') == binary.getvalue()
+    binary.seek(0)
+    assert jsonio.load(binary) == DOCUMENT
+
+
+def test_set_backend():
+    with raises(ValueError):
+        jsonio.set_backend('simplejson')
+    jsonio.set_backend('json')
+    assert jsonio.BACKEND == 'json'
+    jsonio.set_backend()
+    assert jsonio.BACKEND == jsonio.available_backends()[0]
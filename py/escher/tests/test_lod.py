@@ -0,0 +1,109 @@
+from escher import lod
+from escher.testing import synth
+from escher.validate import validate_map
+
+from os.path import join
+
+
+def node(node_type, x, y, **kwargs):
+    n = {'node_type': node_type, 'x': x, 'y': y}
+    if node_type == 'metabolite':
+        n.update({'bigg_id': kwargs.get('bigg_id', 'm'), 'name': 'm',
+                  'label_x': x, 'label_y': y,
+                  'node_is_primary': kwargs.get('primary', True)})
+    return n
+
+
+def segment(from_node_id, to_node_id, b1=None, b2=None):
+    return {'from_node_id': from_node_id, 'to_node_id': to_node_id,
+            'b1': b1, 'b2': b2}
+
+
+def reaction_map():
+    # a -> m1 -> mid -> m2 -> b, with a secondary metabolite s on m2
+    return [
+        {'map_name': 'test', 'map_id': 'test', 'map_description': '',
+         'homepage': 'https://escher.github.io',
+         'schema': 'https://escher.github.io/escher/jsonschema/1-0-0#'},
+        {'nodes': {
+            '1': node('metabolite', 0, 0, bigg_id='a'),
+            '2': node('multimarker', 100, 1),
+            '3': node('midmarker', 200, 0),
+            '4': node('multimarker', 300, 0),
+            '5': node('metabolite', 400, 100, bigg_id='b'),
+            '6': node('metabolite', 300, 200, bigg_id='s', primary=False),
+            '7': node('multimarker', 300, 100),
+        },
+         'reactions': {'10': {
+             'name': 'r', 'bigg_id': 'r', 'reversibility': False,
+             'label_x': 0, 'label_y': 0, 'gene_reaction_rule': '',
+             'genes': [],
+             'metabolites': [{'bigg_id': 'a', 'coefficient': -1},
+                             {'bigg_id': 'b', 'coefficient': 1},
+                             {'bigg_id': 's', 'coefficient': 1}],
+             'segments': {
+                 '11': segment('1', '2'),
+                 '12': segment('2', '3'),
+                 '13': segment('3', '4'),
+                 '14': segment('4', '5', b1={'x': 350, 'y': 0},
+                               b2={'x': 400, 'y': 50}),
+                 '15': segment('3', '7'),
+                 '16': segment('7', '6'),
+             }}},
+         'text_labels': {'20': {'text': 'short', 'x': 10, 'y': 10},
+                         '21': {'text': 'longer label', 'x': 30, 'y': 30},
+                         '22': {'text': 'far', 'x': 5000, 'y': 5000}},
+         'canvas': {'x': 0, 'y': 0, 'width': 6000, 'height': 6000}},
+    ]
+
+
+def test_simplify_map_merges_collinear_segments():
+    simplified = lod.simplify_map(reaction_map(), merge_tolerance=5)
+    validate_map(simplified)
+    nodes = simplified[1]['nodes']
+    segments = simplified[1]['reactions']['10']['segments']
+    # secondary metabolite and its markers are gone
+    assert '6' not in nodes and '7' not in nodes
+    # m1 is within 1 of the line from a to mid, and merged
+    assert '2' not in nodes
+    assert segments['11'] == segment('1', '3')
+    # m2 is kept, because the next segment is curved
+    assert '4' in nodes
+    assert segments['14']['b1'] == {'x': 350, 'y': 0}
+
+
+def test_simplify_map_drop_multimarkers_and_labels():
+    original = reaction_map()
+    simplified = lod.simplify_map(original, drop_multimarkers=True,
+                                  label_cell_size=1000)
+    validate_map(simplified)
+    body = simplified[1]
+    assert sorted(body['nodes']) == ['1', '3', '5']
+    segments = body['reactions']['10']['segments']
+    assert sorted((s['from_node_id'], s['to_node_id'])
+                  for s in segments.values()) == [('1', '3'), ('3', '5')]
+    # curve toward b is kept
+    assert {'x': 400, 'y': 50} in [s['b2'] for s in segments.values()]
+    labels = body['text_labels']
+    assert len(labels) == 2
+    assert labels['21'] == {'text': 'longer label', 'x': 20, 'y': 20}
+    # the original is not changed
+    assert original == reaction_map()
+
+
+def test_build_and_save_pyramid(tmpdir):
+    escher_map = synth.generate_map(n_reactions=50, n_text_labels=20)
+    pyramid = lod.build_pyramid(escher_map)
+    assert [l['max_zoom'] for l in pyramid] == \
+        [l['max_zoom'] for l in lod.DEFAULT_LEVELS]
+    sizes = [len(escher_map[1]['nodes'])]
+    for level in pyramid:
+        validate_map(level['map'])
+        sizes.append(len(level['map'][1]['nodes']))
+    assert sizes[0] > sizes[-1]
+    assert sorted(pyramid[-1]['map'][1]['reactions']) == \
+        sorted(escher_map[1]['reactions'])
+
+    filepath = join(str(tmpdir), 'map.lod.json')
+    lod.save_pyramid(pyramid, filepath)
+    assert lod.load_pyramid(filepath) == pyramid
@@ -0,0 +1,78 @@
+from escher import jsonio
+from escher.mapdiff import diff, patch
+from escher.testing import synth
+
+from copy import deepcopy
+from pytest import raises
+
+
+def test_diff_and_patch():
+    old = synth.generate_map(n_reactions=20, seed=3)
+    new = deepcopy(old)
+    body = new[1]
+    first, second, third = list(body['reactions'])[:3]
+
+    # a moved node, a changed reaction and segment, and a relabeled reaction
+    node_id = next(iter(body['nodes']))
+    body['nodes'][node_id]['x'] += 25
+    body['reactions'][first]['name'] = 'Renamed'
+    segment = next(iter(body['reactions'][first]['segments'].values()))
+    segment['b1'] = {'x': 1, 'y': 2}
+    body['reactions']['new_id'] = body['reactions'].pop(second)
+    # an added and a removed element
+    del body['reactions'][third]
+    body['text_labels']['label'] = {'text': 'Hello', 'x': 0, 'y': 0}
+    # header and canvas
+    new[0]['map_name'] = 'New name'
+    del new[0]['map_description']
+    body['canvas']['width'] += 100
+
+    changes = diff(old, new)
+    assert changes['nodes'] == {'moved': {node_id: {
+        'x': body['nodes'][node_id]['x']
+    }}}
+    reactions = changes['reactions']
+    assert reactions['relabeled'] == {second: 'new_id'}
+    assert reactions['removed'] == [third]
+    assert reactions['changed'][first]['set'] == {'name': 'Renamed'}
+    assert list(reactions['changed'][first]['segments']['changed']) == \
+        [k for k, v in body['reactions'][first]['segments'].items()
+         if v is segment]
+    assert changes['text_labels'] == {'added': {'label': {
+        'text': 'Hello', 'x': 0, 'y': 0
+    }}}
+    assert changes['header'] == {'set': {'map_name': 'New name'},
+                                 'unset': ['map_description']}
+
+    # much smaller than the map, and saved as JSON
+    assert len(jsonio.dumps(changes)) < len(jsonio.dumps(new)) / 5
+    changes = jsonio.loads(jsonio.dumps(changes))
+
+    old_copy = deepcopy(old)
+    assert patch(old, changes) == new
+    assert old == old_copy
+    assert patch(jsonio.dumps(old), changes) == new
+
+
+def test_diff_same_map():
+    the_map = synth.generate_map(n_reactions=5, seed=1)
+    changes = diff(the_map, jsonio.dumps(the_map))
+    assert changes == {'version': 1}
+    assert patch(the_map, changes) == the_map
+
+
+def test_patch_errors():
+    old = synth.generate_map(n_reactions=5, seed=1)
+    new = deepcopy(old)
+    node_id = next(iter(new[1]['nodes']))
+    new[1]['nodes'][node_id]['y'] += 1
+    changes = diff(old, new)
+
+    with raises(ValueError) as e:
+        patch(old, dict(changes, version=99))
+    assert 'version' in str(e.value)
+
+    del old[1]['nodes'][node_id]
+    with raises(ValueError) as e:
+        patch(old, changes)
+    assert node_id in str(e.value)
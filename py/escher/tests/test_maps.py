@@ -0,0 +1,119 @@
+from escher import Map
+from escher.maps import GridIndex
+from escher.testing import synth
+
+import json
+import numpy as np
+from pytest import fixture, mark, raises
+
+
+@fixture(scope='module')
+def synth_map():
+    return synth.generate_map(n_reactions=200, n_metabolites=150,
+                              n_text_labels=20, seed=2)
+
+
+def brute_in_bbox(points, x_min, y_min, x_max, y_max):
+    return sorted(k for k, (x, y) in points.items()
+                  if x_min <= x <= x_max and y_min <= y <= y_max)
+
+
+def test_map_arrays(synth_map):
+    m = Map(json.dumps(synth_map))
+    body = synth_map[1]
+    assert len(m.node_ids) == len(body['nodes'])
+    assert m.node_xy.shape == (len(body['nodes']), 2)
+    assert len(m.segment_ids) == 200 * 4
+    assert m.segment_nodes.min() >= 0
+    assert len(m.text_label_ids) == 20
+    assert 'Map synthetic' in repr(m)
+
+
+def test_nodes_in_bbox(synth_map):
+    m = Map(synth_map)
+    points = {k: (n['x'], n['y']) for k, n in synth_map[1]['nodes'].items()}
+    for bbox in [(0, 0, 500, 500), (300, 200, 1200, 900), (-50, -50, -10, -10),
+                 m.bbox()]:
+        assert sorted(m.nodes_in_bbox(*bbox)) == brute_in_bbox(points, *bbox)
+
+
+def test_text_labels_in_bbox(synth_map):
+    m = Map(synth_map)
+    points = {k: (t['x'], t['y'])
+              for k, t in synth_map[1]['text_labels'].items()}
+    bbox = (0, 0, 1500, 1500)
+    assert (sorted(m.text_labels_in_bbox(*bbox))
+            == brute_in_bbox(points, *bbox))
+
+
+def test_nearest_and_radius(synth_map):
+    m = Map(synth_map)
+    nodes = synth_map[1]['nodes']
+    for x, y in [(0, 0), (777, 333), (5000, 5000)]:
+        distances = {k: np.hypot(n['x'] - x, n['y'] - y)
+                     for k, n in nodes.items()}
+        node_id, distance = m.nearest_node(x, y)
+        assert np.isclose(distance, min(distances.values()))
+        assert np.isclose(distances[node_id], distance)
+
+        metabolites = {k: d for k, d in distances.items()
+                       if nodes[k]['node_type'] == 'metabolite'}
+        node_id, distance = m.nearest_node(x, y, node_type='metabolite')
+        assert nodes[node_id]['node_type'] == 'metabolite'
+        assert np.isclose(distance, min(metabolites.values()))
+
+        within = sorted(m.nodes_within_radius(x, y, 300))
+        assert within == sorted(k for k, d in distances.items() if d <= 300)
+
+
+def test_reaction_bboxes():
+    m = Map([{}, {
+        'nodes': {
+            '1': {'node_type': 'metabolite', 'x': 0, 'y': 0},
+            '2': {'node_type': 'midmarker', 'x': 10, 'y': 10},
+        },
+        'reactions': {
+            '3': {'segments': {'4': {'from_node_id': '1', 'to_node_id': '2',
+                                     'b1': {'x': -5, 'y': 3},
+                                     'b2': {'x': 8, 'y': 20}}}},
+            '5': {'segments': {}},
+        },
+        'text_labels': {},
+    }])
+    assert m.reaction_bbox('3') == (-5, 0, 10, 20)
+    assert m.reaction_bbox('5') is None
+    assert m.reactions_in_bbox(-6, 15, -5, 16) == ['3']
+    assert m.reactions_in_bbox(11, 0, 20, 20) == []
+    assert m.bbox() == (-5, 0, 10, 20)
+
+
+def test_reactions_in_bbox(synth_map):
+    m = Map(synth_map)
+    b = m.reaction_bboxes
+    for x_min, y_min, x_max, y_max in [(0, 0, 500, 500), (300, 200, 1200, 900),
+                                       (-50, -50, -10, -10), m.bbox()]:
+        overlap = ((b[:, 0] <= x_max) & (b[:, 2] >= x_min) &
+                   (b[:, 1] <= y_max) & (b[:, 3] >= y_min))
+        expected = [m.reaction_ids[i] for i in np.flatnonzero(overlap)]
+        assert m.reactions_in_bbox(x_min, y_min, x_max, y_max) == expected
+    assert m.reactions_in_bbox(np.nan, 0, 10, 10) == []
+
+
+def test_empty_map():
+    m = Map([{}, {'nodes': {}, 'reactions': {}, 'text_labels': {}}])
+    assert m.nodes_in_bbox(0, 0, 10, 10) == []
+    assert m.nearest_node(0, 0) == (None, None)
+    assert m.bbox() is None
+
+
+def test_grid_index_single_point():
+    index = GridIndex([[1, 1]])
+    assert list(index.in_bbox(0, 0, 2, 2)) == [0]
+    assert index.nearest(100, 100)[0] == 0
+
+
+@mark.parametrize('point', [(np.nan, 0), (0, np.inf), (-np.inf, np.nan)])
+def test_nearest_bad_point(point):
+    index = GridIndex([[1, 1], [5, 5]])
+    with raises(ValueError):
+        index.nearest(*point)
@@ -0,0 +1,91 @@
+from escher import metrics, Builder
+from escher.plots import _load_resource
+from escher.validate import validate_map
+
+import json
+from os.path import join
+from pytest import fixture
+
+
+@fixture
+def clean_metrics():
+    metrics.disable()
+    metrics.clear()
+    yield
+    metrics.disable()
+    metrics.clear()
+
+
+def test_disabled_by_default(clean_metrics):
+    assert not metrics.is_enabled()
+    with metrics.timer('nothing') as timer:
+        timer.add_bytes(10)
+    metrics.record('nothing', seconds=1)
+    assert metrics.events() == []
+
+
+def test_timer_and_summary(clean_metrics):
+    metrics.enable()
+    with metrics.timer('op', resource='a') as timer:
+        timer.add_bytes(3)
+        timer.add_bytes(4)
+    metrics.record('op', seconds=2.0, nbytes=1)
+    summary = metrics.to_dict()
+    assert summary['op']['count'] == 2
+    assert summary['op']['total_bytes'] == 8
+    assert summary['op']['max_seconds'] == 2.0
+    assert metrics.events()[0]['tags'] == {'resource': 'a'}
+
+
+def test_json_lines(clean_metrics, tmpdir):
+    metrics.enable()
+    metrics.record('op', seconds=1.0, nbytes=2, kind='map')
+    filepath = join(str(tmpdir), 'metrics.jsonl')
+    metrics.write_json_lines(filepath)
+    with open(filepath) as f:
+        lines = [json.loads(line) for line in f]
+    assert lines == [{'name': 'op', 'seconds': 1.0, 'bytes': 2,
+                      'tags': {'kind': 'map'}}]
+
+
+def test_profile(clean_metrics, tmpdir):
+    metrics.record('before', seconds=1.0)
+    with metrics.profile() as prof:
+        _load_resource('{"r": "val"}', 'map_json')
+        b = Builder(map_json='"useless_map"')
+        b.save_html(join(str(tmpdir), 'builder.html'))
+    assert not metrics.is_enabled()
+    summary = prof.to_dict()
+    assert summary['load_resource.parse']['count'] == 2
+    assert summary['sync_payload']['total_bytes'] == len('"useless_map"')
+    assert 'save_html.render' in summary
+    assert 'save_html.encode' in summary
+    assert 'before' not in summary
+    assert len(prof.to_json_lines().splitlines()) == len(prof.events)
+
+
+def test_profile_validate_map(clean_metrics):
+    with metrics.profile() as prof:
+        try:
+            validate_map([{}, {}])
+        except Exception:
+            pass
+    assert 'validate_map.load_schema' in prof.to_dict()
+
+
+def test_profile_keeps_events_after_clear(clean_metrics):
+    with metrics.profile() as prof:
+        metrics.record('first', seconds=1.0)
+        metrics.clear()
+        metrics.record('second', seconds=2.0)
+    assert [event['name'] for event in prof.events] == ['first', 'second']
+    assert [event['name'] for event in metrics.events()] == ['second']
+
+
+def test_sizes_in_bytes(clean_metrics):
+    metrics.enable()
+    with metrics.timer('op') as timer:
+        timer.add_bytes('{"name": "café"}')
+        timer.add_bytes(b'ab')
+    assert metrics.events()[0]['bytes'] == len('{"name": "café"}') + 1 + 2
+    assert metrics.text_size('ascii') == 5
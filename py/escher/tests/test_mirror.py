@@ -0,0 +1,85 @@
+from escher import rc
+from escher.mirror import mirror
+from escher.plots import map_json_for_name, model_json_for_name
+from escher.testing import synth
+from escher.version import __schema_version__, __map_model_version__
+
+import json
+import os
+from os.path import join
+
+import pytest
+
+
+def _server(directory):
+    """Write a server with two maps and a model."""
+    root = join(str(directory), __schema_version__, __map_model_version__)
+    index = {
+        'maps': [
+            {'organism': 'Synthetic organism', 'map_name': 'small.Map'},
+            {'organism': 'Synthetic organism', 'map_name': 'large.Map'},
+        ],
+        'models': [
+            {'organism': 'Synthetic organism', 'model_name': 'small'},
+        ],
+    }
+    for kind, name, data in [
+        ('maps', 'small.Map', synth.generate_map(5)),
+        ('maps', 'large.Map', synth.generate_map(50)),
+        ('models', 'small', synth.generate_model(5)),
+    ]:
+        folder = join(root, kind, 'Synthetic organism')
+        os.makedirs(folder, exist_ok=True)
+        with open(join(folder, name + '.json'), 'w') as f:
+            json.dump(data, f)
+    with open(join(root, 'index.json'), 'w') as f:
+        json.dump(index, f)
+
+
+@pytest.fixture()
+def server_root():
+    old = rc.get('server_root')
+    yield
+    if old is None:
+        rc.pop('server_root', None)
+    else:
+        rc['server_root'] = old
+
+
+def test_mirror_selected(tmpdir, server_root):
+    source = str(tmpdir.mkdir('source'))
+    _server(source)
+    destination = str(tmpdir.join('mirror'))
+    result = mirror(destination, maps=['small.Map'], source=source)
+    assert len(result['downloaded']) == 1
+    assert result['failed'] == {}
+
+    rc['server_root'] = destination
+    data = json.loads(map_json_for_name('small.Map'))
+    assert len(data[1]['reactions']) == 5
+    with pytest.raises(Exception):
+        map_json_for_name('large.Map')
+
+
+def test_mirror_resume(tmpdir, server_root):
+    source = str(tmpdir.mkdir('source'))
+    _server(source)
+    destination = str(tmpdir.join('mirror'))
+    mirror(destination, maps=['small.Map'], source=source)
+    result = mirror(destination, source='file://' + source, workers=2)
+    assert len(result['skipped']) == 1
+    assert len(result['downloaded']) == 2
+    assert not any(f.endswith('.part') for _, _, files in os.walk(destination)
+                   for f in files)
+
+    rc['server_root'] = 'file://' + destination
+    model = json.loads(model_json_for_name('small'))
+    assert len(model['reactions']) == 5
+    assert len(json.loads(map_json_for_name('large.Map'))[1]['reactions']) == 50
+
+
+def test_mirror_unknown_name(tmpdir):
+    source = str(tmpdir.mkdir('source'))
+    _server(source)
+    with pytest.raises(ValueError):
+        mirror(str(tmpdir.join('mirror')), models=['missing'], source=source)
@@ -1,19 +1,22 @@
 from escher import __schema_version__, __map_model_version__
-from escher import Builder
+from escher import Builder, jsonio
 from escher.plots import (
     _load_resource,
     server_index,
     model_json_for_name,
     map_json_for_name,
+    env,
 )
 from escher.urls import get_url
+from escher.util import b64dump
 
 import base64
+import gzip
 import os
 import sys
 from os.path import join, basename
 import json
-from pytest import raises, mark, param
+from pytest import raises, mark, param, warns
 from urllib.error import URLError
 import pandas as pd
 
@@ -112,6 +115,384 @@ def test_save_html_embedded_css(tmpdir):
     )
 
 
+def test_save_html_matches_render(tmpdir):
+    # streamed output is identical to rendering the whole document
+    map_json = json.dumps([{'map_name': 'árvíztűrő'}, {'reactions': {}}])
+    b = Builder(map_json=map_json, model_json='"useless_model"',
+                embedded_css='.tükör {}')
+    filepath = join(str(tmpdir), 'builder.html')
+    b.save_html(filepath)
+    with open(filepath, 'rb') as f:
+        html = f.read().decode('utf-8')
+
+    options = {key: getattr(b, key) for key in b.traits(option=True)
+               if getattr(b, key) is not None}
+    expected = env.get_template('standalone.html').render(
+        escher_url=get_url('escher_min'),
+        embedded_css_b64=b64dump('.tükör {}'),
+        map_data_json_b64=b64dump(map_json),
+        model_data_json_b64=b64dump('"useless_model"'),
+        options_json_b64=b64dump(jsonio.dumps(options)),
+    )
+    assert html == expected
+
+
+def test_progressive_loading():
+    from escher.testing import synth
+    map_json = json.dumps(synth.generate_map(n_reactions=100, seed=1))
+    b = Builder(map_json=map_json, progressive_loading='stream',
+                tile_size=500, share_payloads=True)
+    info = b._map_tiles_info
+    assert info['mode'] == 'stream'
+    assert len(info['keys']) > 1
+    assert len(info['initial']) >= 1
+    # the widget gets the initial tiles only
+    state = b.get_state('_loaded_map_json')['_loaded_map_json']
+    sent = json.loads(state)
+    assert 0 < len(sent[1]['reactions']) < 100
+    # and can request the rest
+    messages = []
+    b.send = messages.append
+    rest = [k for k in info['keys'] if k not in info['initial']]
+    b._handle_custom_msg(b, {'event': 'request_tiles', 'keys': rest}, [])
+    tiles = [t for m in messages for t in m['tiles']]
+    assert [t['key'] for t in tiles] == rest
+    reactions = set(sent[1]['reactions'])
+    for tile in tiles:
+        reactions.update(tile['reactions'])
+    assert len(reactions) == 100
+    # the full map is kept in Python
+    assert b._loaded_map_json == map_json
+    assert b._map_blob is None
+
+    b.progressive_loading = False
+    assert b._map_tiles_info is None
+    # the whole map is sent as a shared blob
+    assert b.get_state('_loaded_map_json')['_loaded_map_json'] is None
+    assert b._map_blob.content == map_json
+    b.progressive_loading = True
+    assert b.progressive_loading == 'on_demand'
+    with raises(Exception):
+        b.progressive_loading = 'eventually'
+
+
+def test_share_payloads():
+    from escher.blobs import store
+    from escher.testing import synth
+    map_json = json.dumps(synth.generate_map(n_reactions=10, seed=2))
+    model_json = json.dumps(synth.generate_model(n_reactions=10, seed=2))
+    b1 = Builder(map_json=map_json, model_json=model_json,
+                 share_payloads=True)
+    # an equal copy of the map
+    b2 = Builder(map_json=json.dumps(json.loads(map_json)),
+                 model_json=model_json, share_payloads=True)
+    assert b1._map_blob is b2._map_blob
+    assert b1._model_blob is b2._model_blob
+    assert store.references(b1._map_blob) == 2
+    # the Builders hold one copy of the map
+    assert b1._loaded_map_json is b2._loaded_map_json
+    assert b1.get_state('_loaded_model_json')['_loaded_model_json'] is None
+    # sharing again does not notify that the map changed
+    changes = []
+    b2.observe(changes.append, '_loaded_map_json')
+    b2.share_payloads = False
+    b2.share_payloads = True
+    assert b1._loaded_map_json is b2._loaded_map_json
+    assert changes == []
+
+    blob = b1._map_blob
+    b1.close()
+    assert store.references(blob) == 1
+    b2.map_json = None
+    assert store.references(blob) == 0
+    assert b2._map_blob is None
+
+    # not shared by default
+    b3 = Builder(map_json=map_json)
+    assert b3._map_blob is None
+    assert b3.get_state('_loaded_map_json')['_loaded_map_json'] == map_json
+    b3.share_payloads = True
+    assert b3._map_blob.content == map_json
+    b3.close()
+    b2.close()
+    assert store.references(blob) == 0
+
+
+def test_compress_payloads():
+    from escher.testing import synth
+    map_json = json.dumps(synth.generate_map(n_reactions=10, seed=3))
+    model_json = json.dumps(synth.generate_model(n_reactions=10, seed=3))
+    b = Builder(map_json=map_json, model_json=model_json,
+                share_payloads=True, compress_payloads=True)
+    assert b._map_blob.compress
+    content = b._map_blob.get_state('content')['content']
+    assert gzip.decompress(content['data']).decode('utf-8') == map_json
+    sizes = b.payload_sizes()
+    assert sizes['map']['size'] == len(map_json)
+    assert sizes['map']['compressed_size'] < len(map_json)
+    assert sizes['model']['compressed_size'] < len(model_json)
+
+    # without shared blobs, the traits are compressed
+    b.share_payloads = False
+    state = b.get_state('_loaded_model_json')['_loaded_model_json']
+    assert gzip.decompress(state['data']).decode('utf-8') == model_json
+
+    b.compress_payloads = False
+    assert b.get_state('_loaded_model_json')['_loaded_model_json'] == \
+        model_json
+    assert b.payload_sizes()['model'] == {'size': len(model_json),
+                                          'compressed_size': None}
+    b.close()
+    assert Builder().payload_sizes() == {'map': None, 'model': None}
+
+
+def test_external_state(tmpdir):
+    from escher.testing import synth
+    map_json = json.dumps(synth.generate_map(n_reactions=10, seed=4))
+    directory = str(tmpdir.join('state'))
+    b = Builder(map_json=map_json, external_state=directory,
+                share_payloads=False)
+    # the state references a sidecar file instead of holding the map
+    assert b.get_state('_loaded_map_json')['_loaded_map_json'] is None
+    assert b._map_blob.get_state('content')['content'] == ''
+    source = b._map_blob.source
+    with open(join(directory, basename(source))) as f:
+        assert f.read() == map_json
+    b.external_state = False
+    assert b._map_blob is None
+    assert b.get_state('_loaded_map_json')['_loaded_map_json'] == map_json
+    b.close()
+
+    # maps from a url are referenced by the url
+    url = 'https://escher.github.io/1-0-0/6/maps/a.json'
+    b = Builder(external_state=True)
+    b._sources['map'] = (_load_resource, (url, 'map_json'))
+    b._loaded_map_json = map_json
+    assert b._map_blob.source == url
+    b.close()
+
+
+def test_external_state_by_name(tmpdir, monkeypatch):
+    from escher import plots
+    from escher.testing import synth
+    urls = {'remote': 'https://escher.github.io/1-0-0/6/maps/a.json',
+            'mirrored': join(str(tmpdir), 'mirror', 'a.json')}
+    downloads = []
+
+    def download(name, kind):
+        downloads.append(name)
+        seed = len(downloads)
+        return urls[name], json.dumps(synth.generate_map(n_reactions=10,
+                                                         seed=seed))
+
+    def no_index(name, kind):
+        raise AssertionError('the server index is not needed again')
+
+    monkeypatch.setattr(plots, '_download_for_name', download)
+    monkeypatch.setattr(plots, '_url_for_name', no_index)
+    directory = str(tmpdir.join('state'))
+    # referenced by the url it was downloaded from
+    b = Builder(map_name='remote', external_state=directory)
+    assert b._map_blob.source == urls['remote']
+    # a local mirror cannot be loaded by the browser
+    b.map_name = 'mirrored'
+    assert basename(b._map_blob.source) != 'a.json'
+    assert os.path.isfile(join(directory, basename(b._map_blob.source)))
+    assert downloads == ['remote', 'mirrored']
+    b.close()
+
+
+def test_load_data(tmpdir):
+    from escher.testing import synth
+    the_map = synth.generate_map(n_reactions=5, seed=4)
+    reaction = next(iter(the_map[1]['reactions'].values()))
+    path = str(tmpdir.join('fluxes.csv'))
+    with open(path, 'w') as f:
+        f.write('reaction,flux\n%s,2.5\nnot_on_map,1\n' %
+                reaction['bigg_id'])
+    b = Builder(map_json=json.dumps(the_map))
+    b.load_data(path, kind='reaction', columns='flux')
+    assert b.reaction_data == {reaction['bigg_id']: 2.5}
+    with raises(ValueError):
+        b.load_data(path, kind='protein')
+
+
+def test_patch_map():
+    from escher.mapdiff import diff
+    from escher.testing import synth
+    old = synth.generate_map(n_reactions=10, seed=4)
+    new = json.loads(json.dumps(old))
+    new[0]['map_name'] = 'Patched'
+    b = Builder()
+    with raises(ValueError):
+        b.patch_map(diff(old, new))
+    b.map_json = json.dumps(old)
+    b.patch_map(diff(old, new))
+    assert json.loads(b._loaded_map_json) == new
+
+
+def test_precompute_comparisons():
+    data = [{'PGI': 10, 'GAPD': 2}, {'PGI': 5, 'GAPD': 8}]
+    # off by default
+    b = Builder(reaction_data=data)
+    assert b.get_state('reaction_data')['reaction_data'] == data
+    b = Builder(reaction_data=data, reaction_compare_style='diff',
+                metabolite_data=[{'glc__D_c': 1}, {'glc__D_c': 4}],
+                precompute_comparisons=True)
+    # the Builder keeps the data, and the widget gets the comparison
+    assert b.reaction_data == data
+    sent = b.get_state('reaction_data')['reaction_data']
+    assert sent == [{
+        'PGI': {'value': -5.0, 'text': '10.0, 5.00: -5.00',
+                'reverse_flux': False},
+        'GAPD': {'value': 6.0, 'text': '2.00, 8.00: 6.00',
+                 'reverse_flux': False},
+    }]
+    sent = b.get_state('metabolite_data')['metabolite_data']
+    assert sent[0]['glc__D_c']['value'] == 2.0
+    b.reaction_compare_style = 'fold'
+    sent = b.get_state('reaction_data')['reaction_data']
+    assert sent[0]['GAPD']['value'] == 4.0
+
+    b.precompute_comparisons = False
+    assert b.get_state('reaction_data')['reaction_data'] == data
+    b.reaction_data = {'PGI': 1}
+    b.precompute_comparisons = True
+    assert b.get_state('reaction_data')['reaction_data'] == [{'PGI': 1}]
+
+
+def test_prune_data():
+    from escher.testing import synth
+    map_json = json.dumps(synth.generate_map(n_reactions=5))
+    model_json = json.dumps(synth.generate_model(n_reactions=20))
+    gene_data = synth.generate_data(synth.gene_ids(20))
+    reaction_data = {'R0': 1, 'Reaction 1': 2, 'R10': 3}
+    b = Builder(model_json=model_json, reaction_data=reaction_data,
+                gene_data=gene_data)
+    # without a map, everything is sent
+    assert b.data_coverage() == {}
+    assert b.get_state('gene_data')['gene_data'] == gene_data
+
+    b.map_json = map_json
+    # names are matched too
+    assert b.get_state('reaction_data')['reaction_data'] == [
+        {'R0': 1, 'Reaction 1': 2}
+    ]
+    sent = b.get_state('gene_data')['gene_data']
+    assert sorted(sent) == ['G0', 'G1', 'G2', 'G3', 'G4']
+    coverage = b.data_coverage()
+    assert coverage['reaction_data'] == {'matched': 2, 'unmatched': 1,
+                                         'unmatched_ids': ['R10']}
+    assert coverage['gene_data']['matched'] == 5
+    assert coverage['gene_data']['unmatched'] == 15
+    assert 'metabolite_data' not in coverage
+    # the Builder keeps all of the data
+    assert b.reaction_data == reaction_data
+
+    # the model is used to build new reactions
+    b.enable_editing = True
+    assert b.data_coverage()['reaction_data']['matched'] == 3
+    b.enable_editing = False
+
+    b.prune_data = False
+    assert b.get_state('gene_data')['gene_data'] == gene_data
+
+
+def _write_json(tmpdir, name, data):
+    filepath = join(str(tmpdir), name)
+    with open(filepath, 'w') as f:
+        json.dump(data, f)
+    return filepath
+
+
+def test_background_loading(tmpdir):
+    from escher.testing import synth
+    map_path = _write_json(tmpdir, 'map.json', synth.generate_map(10))
+    model_path = _write_json(tmpdir, 'model.json', synth.generate_model(10))
+    b = Builder(map_json=map_path, model_json=model_path,
+                background_loading=True)
+    assert b.wait(timeout=10) is b
+    assert b._loading == []
+    assert len(json.loads(b._loaded_map_json)[1]['reactions']) == 10
+    assert len(json.loads(b._loaded_model_json)['reactions']) == 10
+
+    b.map_json = None
+    assert b._loaded_map_json is None
+
+
+def test_background_loading_ready(tmpdir):
+    from escher.testing import synth
+    import asyncio
+    map_path = _write_json(tmpdir, 'map.json', synth.generate_map(10))
+
+    async def load():
+        b = Builder(map_json=map_path, background_loading=True)
+        assert b._loading == ['map']
+        return await b.ready()
+
+    b = asyncio.run(load())
+    assert b._loading == []
+    assert b._loaded_map_json is not None
+
+    async def fail():
+        b = Builder(map_json=join(str(tmpdir), 'missing.json'),
+                    background_loading=True)
+        await b.ready()
+
+    with raises(ValueError), warns(UserWarning):
+        asyncio.run(fail())
+
+
+def test_level_of_detail(tmpdir):
+    from escher import lod
+    from escher.testing import synth
+    escher_map = synth.generate_map(n_reactions=20)
+    b = Builder(map_json=json.dumps(escher_map), level_of_detail=True)
+    levels = b._map_detail_levels
+    assert len(levels) == len(lod.DEFAULT_LEVELS)
+    assert levels[0]['max_zoom'] == lod.DEFAULT_LEVELS[0]['max_zoom']
+
+    filepath = join(str(tmpdir), 'map.lod.json')
+    lod.save_pyramid(levels[:1], filepath)
+    b.level_of_detail = filepath
+    assert b._map_detail_levels == levels[:1]
+
+    b.level_of_detail = False
+    assert b._map_detail_levels is None
+    b.level_of_detail = [{'max_zoom': 0.2, 'drop_multimarkers': True}]
+    assert b._map_detail_levels[0]['max_zoom'] == 0.2
+    b.map_json = None
+    assert b._map_detail_levels is None
+
+
+def test_level_of_detail_shared(tmpdir):
+    from escher import jsonio
+    from escher.blobs import store
+    from escher.testing import synth
+    map_json = json.dumps(synth.generate_map(n_reactions=20))
+    b1 = Builder(map_json=map_json, level_of_detail=True, share_payloads=True)
+    b2 = Builder(map_json=map_json, level_of_detail=True, share_payloads=True)
+    blob = b1._map_detail_levels_blob
+    assert blob is b2._map_detail_levels_blob
+    assert json.loads(blob.content) == json.loads(jsonio.dumps(b1._map_detail_levels))
+    # not synced twice
+    assert b1.get_state('_map_detail_levels')['_map_detail_levels'] is None
+    b2.close()
+    assert store.references(blob) == 1
+    b1.level_of_detail = False
+    assert b1._map_detail_levels_blob is None
+    assert store.references(blob) == 0
+
+    # kept out of the saved state
+    directory = str(tmpdir.join('state'))
+    b3 = Builder(map_json=map_json, level_of_detail=True,
+                 external_state=directory)
+    blob = b3._map_detail_levels_blob
+    assert blob.get_state('content')['content'] == ''
+    assert os.path.isfile(join(str(tmpdir), blob.source))
+    b3.close()
+
+
 def test_Builder_options():
     b = Builder(metabolite_no_data_color='blue')
     assert b.metabolite_no_data_color == 'blue'
@@ -0,0 +1,31 @@
+from escher.prune import data_identifiers, prune_data
+from escher.testing import synth
+
+
+def test_data_identifiers():
+    escher_map = synth.generate_map(n_reactions=3)
+    identifiers = data_identifiers(escher_map)
+    assert identifiers['reaction'] == {'R0', 'R1', 'R2', 'Reaction 0',
+                                       'Reaction 1', 'Reaction 2'}
+    assert 'M0_c' in identifiers['metabolite']
+    assert 'Metabolite 0' in identifiers['metabolite']
+    assert identifiers['gene'] == {'G0', 'G1', 'G2', 'g0', 'g1', 'g2'}
+
+    model = synth.generate_model(n_reactions=5)
+    identifiers = data_identifiers(escher_map, model)
+    assert 'R4' in identifiers['reaction']
+    assert 'G4' in identifiers['gene']
+    assert data_identifiers() == {'reaction': set(), 'metabolite': set(),
+                                  'gene': set()}
+
+
+def test_prune_data():
+    pruned, coverage = prune_data({'a': 1, 'b': 2}, {'a', 'c'})
+    assert pruned == {'a': 1}
+    assert coverage == {'matched': 1, 'unmatched': 1, 'unmatched_ids': ['b']}
+
+    pruned, coverage = prune_data([{'a': 1, 'b': 2}, {'c': 3}], {'a', 'c'})
+    assert pruned == [{'a': 1}, {'c': 3}]
+    assert coverage['matched'] == 2
+
+    assert prune_data(None, {'a'})[0] is None
@@ -0,0 +1,133 @@
+from escher import Builder
+from escher.search import SearchIndex, frontend_search_index, trigrams
+
+import json
+from os.path import join
+from pytest import fixture, raises
+
+
+@fixture
+def escher_map():
+    return [
+        {'map_name': 'glycolysis'},
+        {'reactions': {
+            '1': {'bigg_id': 'PGI', 'name': 'Glucose-6-phosphate isomerase',
+                  'gene_reaction_rule': 'b4025 or b0001',
+                  'genes': [{'bigg_id': 'b4025', 'name': 'pgi'}],
+                  'segments': {}},
+        },
+         'nodes': {
+             '2': {'node_type': 'metabolite', 'bigg_id': 'g6p_c',
+                   'name': 'D-Glucose 6-phosphate', 'x': 0, 'y': 0},
+             '3': {'node_type': 'midmarker', 'x': 0, 'y': 0},
+         },
+         'text_labels': {'4': {'text': 'Upper glycolysis', 'x': 0, 'y': 0}}},
+    ]
+
+
+@fixture
+def model():
+    return {
+        'id': 'core',
+        'reactions': [{'id': 'PFK', 'name': 'Phosphofructokinase',
+                       'gene_reaction_rule': 'b3916'}],
+        'metabolites': [{'id': 'f6p_c', 'name': 'D-Fructose 6-phosphate'}],
+        'genes': [{'id': 'b3916', 'name': 'pfkA'}],
+    }
+
+
+def test_trigrams():
+    assert trigrams('ab') == {'  a', ' ab', 'ab '}
+
+
+def test_prefix_search(escher_map, model):
+    index = SearchIndex()
+    index.add_map(escher_map)
+    index.add_model(json.dumps(model))
+    assert len(index) == 6
+
+    results = index.search('pgi')
+    assert results[0]['bigg_id'] == 'PGI'
+    assert results[0]['score'] == 1.0
+    assert results[0]['source'] == 'glycolysis'
+    assert results[0]['id'] == '1'
+
+    # gene reaction rule tokens and gene names
+    assert index.search('b0001')[0]['bigg_id'] == 'PGI'
+    assert index.search('pfka')[0]['type'] == 'gene'
+
+    # words of names
+    found = {(r['type'], r['bigg_id']) for r in index.search('phosph')}
+    assert ('metabolite', 'g6p_c') in found
+    assert ('metabolite', 'f6p_c') in found
+    assert ('reaction', 'PFK') in found
+
+    assert index.search('upper')[0]['type'] == 'text_label'
+    assert index.search('   ') == []
+
+
+def test_trigram_search(escher_map, model):
+    index = SearchIndex()
+    index.add_map(escher_map)
+    index.add_model(model)
+    # misspelled
+    results = index.search('fosphofructokinase')
+    assert results[0]['bigg_id'] == 'PFK'
+    assert 0.3 < results[0]['score'] < 0.9
+
+
+def test_search_filters(escher_map, model):
+    index = SearchIndex()
+    index.add_map(escher_map)
+    index.add_model(model)
+    assert all(r['type'] == 'metabolite'
+               for r in index.search('phosphate', kind='metabolite'))
+    assert all(r['source'] == 'core'
+               for r in index.search('phosphate', source='core'))
+    assert len(index.search('phosphate', limit=1)) == 1
+
+
+def test_save_and_load(escher_map, tmpdir):
+    index = SearchIndex()
+    index.add_map(escher_map)
+    filepath = join(str(tmpdir), 'index.json')
+    index.save(filepath)
+    loaded = SearchIndex.load(filepath)
+    assert loaded.search('g6p') == index.search('g6p')
+    with raises(ValueError):
+        SearchIndex.from_dict({'version': 0})
+
+
+def test_frontend_search_index(escher_map):
+    records = frontend_search_index(escher_map)
+    assert records['r1'] == {'name': 'PGI',
+                             'data': {'type': 'reaction', 'reaction_id': '1'}}
+    assert records['r1_g_name0']['name'] == 'pgi'
+    assert records['n_name2']['data'] == {'type': 'metabolite',
+                                          'node_id': '2'}
+    assert 'n3' not in records
+    assert records['l4']['data'] == {'type': 'text_label',
+                                     'text_label_id': '4'}
+
+
+def test_builder_prebuild_search_index(escher_map):
+    b = Builder(map_json=json.dumps(escher_map))
+    assert b._search_index is None
+    b.prebuild_search_index = True
+    assert b._search_index == frontend_search_index(escher_map)
+
+    # a new map is sent in one message with its index
+    messages = []
+    b.comm.send = lambda data=None, buffers=None: messages.append(data)
+    escher_map[1]['reactions']['1'].update(bigg_id='PGI2', label_x=0,
+                                           label_y=0)
+    b.map_json = json.dumps(escher_map)
+    sent = [m['state'] for m in messages if '_loaded_map_json' in m['state']]
+    assert len(sent) == 1
+    assert sent[0]['_search_index']['r1']['name'] == 'PGI2'
+
+    # tiles are added to the index in the widget as they load
+    b.progressive_loading = True
+    assert b._search_index is None
+    b.progressive_loading = False
+    assert b._search_index == frontend_search_index(escher_map)
@@ -0,0 +1,75 @@
+from escher.store import MapStore, map_elements
+from escher.testing import synth
+
+import json
+from os.path import join
+from pytest import fixture, raises
+
+
+@fixture
+def store():
+    with MapStore() as store:
+        yield store
+
+
+def test_map_elements():
+    elements = map_elements(synth.generate_map(n_reactions=2))
+    assert elements['reaction'] == {('R0', 'Reaction 0'), ('R1', 'Reaction 1')}
+    assert ('G0', 'g0') in elements['gene']
+    assert ('M0_c', 'Metabolite 0') in elements['metabolite']
+
+
+def test_find(store):
+    small = synth.generate_map(n_reactions=2)
+    small[0]['map_name'] = 'small'
+    large = synth.generate_map(n_reactions=5)
+    large[0]['map_name'] = 'large'
+    assert store.add_map(small) == 'small'
+    store.add_map(json.dumps(large))
+    store.add_model(synth.generate_model(n_reactions=3), name='model')
+
+    assert store.list_maps() == ['large', 'small']
+    assert store.find_maps(reaction='R1') == ['large', 'small']
+    assert store.find_maps(reaction='R4') == ['large']
+    assert store.find_maps(gene='g4') == ['large']
+    assert store.find_maps(reaction='R0', gene='G4') == ['large']
+    assert store.find_maps(reaction='R3', gene='G0') == ['large']
+    assert store.find_maps(reaction='R9') == []
+    assert store.find_models(reaction='Reaction 2') == ['model']
+    assert store.find_models(reaction='R3') == []
+    with raises(ValueError):
+        store.find_maps()
+
+    # replace and remove
+    store.add_map(small, name='large')
+    assert store.find_maps(reaction='R4') == []
+    store.remove_map('large')
+    assert store.list_maps() == ['small']
+    with raises(KeyError):
+        store.remove_map('large')
+    assert store.stats()['maps'] == 1
+
+
+def test_ingest_and_builder(tmpdir):
+    escher_map = synth.generate_map(n_reactions=3)
+    model = synth.generate_model(n_reactions=3)
+    del model['id']
+    paths = [join(str(tmpdir), 'core.json'), join(str(tmpdir), 'model.json')]
+    for path, data in zip(paths, (escher_map, model)):
+        with open(path, 'w') as f:
+            json.dump(data, f)
+    db = join(str(tmpdir), 'maps.db')
+    with MapStore(db) as store:
+        added = store.ingest(paths)
+    assert added == {'maps': [escher_map[0]['map_name']], 'models': ['model']}
+
+    # the store is saved in the file
+    with MapStore(db) as store:
+        assert store.find_models(gene='G2') == ['model']
+        builder = store.builder(map_name=escher_map[0]['map_name'],
+                                model_name='model')
+        assert json.loads(builder._loaded_map_json) == escher_map
+        assert json.loads(builder._loaded_model_json) == model
+        builder.close()
+        with raises(KeyError):
+            store.map_json('missing')
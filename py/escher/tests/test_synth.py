@@ -0,0 +1,89 @@
+from escher import Builder
+from escher.testing import synth
+from escher.validate import validate_map
+
+from pytest import raises
+import json
+
+
+def test_generate_map_is_valid():
+    escher_map = synth.generate_map(n_reactions=30, n_metabolites=12,
+                                    segments_per_reaction=3, n_text_labels=4,
+                                    genes_per_reaction=2, seed=1)
+    validate_map(escher_map)
+
+
+def test_generate_map_counts():
+    escher_map = synth.generate_map(n_reactions=20, n_metabolites=10,
+                                    segments_per_reaction=4,
+                                    bezier_fraction=1.0, n_text_labels=3)
+    body = escher_map[1]
+    assert len(body['reactions']) == 20
+    assert len(body['nodes']) == 10 + 20 * 3
+    assert len(body['text_labels']) == 3
+    segments = [s for r in body['reactions'].values()
+                for s in r['segments'].values()]
+    assert len(segments) == 20 * 4
+    assert all(s['b1'] is not None and s['b2'] is not None for s in segments)
+    midmarkers = [n for n in body['nodes'].values()
+                  if n['node_type'] == 'midmarker']
+    assert len(midmarkers) == 20
+
+
+def test_generate_map_is_deterministic():
+    assert synth.generate_map(10, seed=3) == synth.generate_map(10, seed=3)
+    assert synth.generate_map(10, seed=3) != synth.generate_map(10, seed=4)
+
+
+def test_generate_map_bad_counts():
+    with raises(ValueError):
+        synth.generate_map(0)
+    with raises(ValueError):
+        synth.generate_map(5, n_metabolites=1)
+    with raises(ValueError):
+        synth.generate_map(5, segments_per_reaction=1)
+
+
+def test_model_matches_map():
+    escher_map = synth.generate_map(15, n_metabolites=6, genes_per_reaction=2,
+                                    seed=2)
+    model = synth.generate_model(15, n_metabolites=6, genes_per_reaction=2,
+                                 seed=2)
+    model_reactions = {r['id']: r for r in model['reactions']}
+    for reaction in escher_map[1]['reactions'].values():
+        model_reaction = model_reactions[reaction['bigg_id']]
+        assert ({m['bigg_id']: m['coefficient']
+                 for m in reaction['metabolites']}
+                == model_reaction['metabolites'])
+        assert (reaction['gene_reaction_rule']
+                == model_reaction['gene_reaction_rule'])
+        assert (reaction['reversibility']
+                == (model_reaction['lower_bound'] < 0))
+    assert ({g['id'] for g in model['genes']}
+            == set(synth.gene_ids(15, 2)))
+
+
+def test_generate_model_loads_in_cobra():
+    from cobra.io import model_from_dict
+    model = model_from_dict(synth.generate_model(10, genes_per_reaction=2))
+    assert len(model.reactions) == 10
+    assert len(model.genes) == 20
+
+
+def test_generate_data():
+    ids = synth.reaction_ids(100)
+    data = synth.generate_data(ids, seed=5)
+    assert set(data) == set(ids)
+    assert data == synth.generate_data(ids, seed=5)
+    conditions = synth.generate_data(ids, n_conditions=2,
+                                     missing_fraction=0.5)
+    assert len(conditions) == 2
+    assert all(0 < len(c) < 100 for c in conditions)
+
+
+def test_builder_with_synthetic_data():
+    b = Builder(map_json=json.dumps(synth.generate_map(10)),
+                model_json=json.dumps(synth.generate_model(10)),
+                reaction_data=synth.generate_data(synth.reaction_ids(10)),
+                metabolite_data=synth.generate_data(synth.metabolite_ids(10)))
+    assert b.reaction_data is not None
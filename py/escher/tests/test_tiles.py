@@ -0,0 +1,59 @@
+from escher.tiles import MapTiles, tile_key
+from escher.testing import synth
+
+from pytest import fixture, raises
+
+
+@fixture(scope='module')
+def synth_map():
+    return synth.generate_map(n_reactions=120, n_metabolites=100,
+                              n_text_labels=10, seed=4)
+
+
+def test_tiles_cover_map(synth_map):
+    tiles = MapTiles(synth_map, tile_size=600)
+    assert len(tiles.keys) > 1
+    partial = tiles.partial_map(tiles.keys)
+    body = synth_map[1]
+    assert partial[0] == synth_map[0]
+    assert partial[1]['canvas'] == body['canvas']
+    for name in ['nodes', 'reactions', 'text_labels']:
+        assert partial[1][name] == body[name]
+
+
+def test_tiles_are_self_contained(synth_map):
+    tiles = MapTiles(synth_map, tile_size=600)
+    reaction_ids = []
+    for key in tiles.keys:
+        tile = tiles.tile(key)
+        assert tile['key'] == key
+        reaction_ids.extend(tile['reactions'])
+        for reaction in tile['reactions'].values():
+            for segment in reaction['segments'].values():
+                assert segment['from_node_id'] in tile['nodes']
+                assert segment['to_node_id'] in tile['nodes']
+    # each reaction is in exactly one tile
+    assert sorted(reaction_ids) == sorted(synth_map[1]['reactions'])
+
+
+def test_keys_for_bbox(synth_map):
+    tiles = MapTiles(synth_map, tile_size=600)
+    x, y = tiles.x, tiles.y
+    assert tiles.keys_for_bbox(x, y, x + 1, y + 1) == [tile_key(0, 0)]
+    assert tiles.keys_for_bbox(x - 10000, y - 10000, x - 9000, y - 9000) == []
+    assert set(tiles.keys_for_bbox(x, y, x + 10 ** 6, y + 10 ** 6)) == \
+        set(tiles.keys)
+    assert tiles.tile('1000,1000')['reactions'] == {}
+
+
+def test_info(synth_map):
+    tiles = MapTiles(synth_map, tile_size=600)
+    info = tiles.info()
+    assert info['keys'] == tiles.keys
+    assert info['tile_size'] == 600
+    assert info['largest_id'] == max(int(i) for i in synth_map[1]['text_labels'])
+
+
+def test_bad_tile_size(synth_map):
+    with raises(ValueError):
+        MapTiles(synth_map, tile_size=0)
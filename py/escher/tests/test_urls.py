@@ -1,3 +1,4 @@
+from escher import rc
 from escher.urls import (
     get_url,
     get_filepath,
@@ -36,3 +37,21 @@ def test_map_download_url():
 def test_bad_url():
     with raises(Exception):
         get_url('bad-name')
+
+
+def test_server_root():
+    old = rc.get('server_root')
+    try:
+        rc['server_root'] = 'http://localhost:8000/escher'
+        assert get_url('server_index') == (
+            'http://localhost:8000/escher/%s/%s/index.json' %
+            (__schema_version__, __map_model_version__)
+        )
+        rc['server_root'] = '/data/escher/'
+        assert get_url('map_download').startswith('file:///data/escher/')
+        assert get_url('escher_root') == 'https://escher.github.io/'
+    finally:
+        rc['server_root'] = old
+    assert get_url('server_index', root='file:///mirror').startswith(
+        'file:///mirror/'
+    )
@@ -1,7 +1,7 @@
 import base64
 import json
 
-from escher.util import b64dump
+from escher.util import b64dump, b64dump_chunks
 
 
 def b64decode(str):
@@ -14,3 +14,13 @@ def test_b64dump():
     assert b64decode(b64dump(accented_str)) == accented_str
     obj = {'foo': 1, 'bar': 2}
     assert json.loads(b64decode(b64dump(obj))) == obj
+
+
+def test_b64dump_chunks():
+    accented_str = 'árvíztűrő tükörfúrógép' * 10
+    for chunk_size in [1, 2, 5, 7, 1000]:
+        chunks = list(b64dump_chunks(accented_str, chunk_size=chunk_size))
+        assert ''.join(chunks) == b64dump(accented_str)
+        assert all(len(c) % 4 == 0 for c in chunks)
+    assert ''.join(b64dump_chunks(None)) == b64dump(None)
+    assert list(b64dump_chunks('')) == []
@@ -75,3 +75,47 @@ def test_validate_map():
 
 def test_schema():
     validate_schema()
+
+
+def test_incremental_validator():
+    from escher.testing import synth
+    from escher.validate import IncrementalValidator
+    from jsonschema import ValidationError
+
+    the_map = synth.generate_map(n_reactions=20, seed=5)
+    validator = IncrementalValidator()
+    validator.validate(the_map)
+    assert validator.checked['reactions'] == 20
+    validator.validate(the_map)
+    assert validator.checked == {'reactions': 0, 'nodes': 0, 'text_labels': 0}
+
+    # a moved node rechecks the reactions that connect to it
+    first, second = list(the_map[1]['reactions'])[:2]
+    reaction = the_map[1]['reactions'][first]
+    node_id = next(iter(reaction['segments'].values()))['to_node_id']
+    the_map[1]['nodes'][node_id]['x'] += 10
+    validator.validate(the_map)
+    assert validator.checked['nodes'] == 1
+    assert 1 <= validator.checked['reactions'] < 20
+
+    # a removed node is found, and the error is kept until it is fixed
+    node = the_map[1]['nodes'].pop(node_id)
+    for _ in range(2):
+        with raises(Exception) as e:
+            validator.validate(the_map)
+        assert 'No nodes for segments' in str(e.value)
+    the_map[1]['nodes'][node_id] = node
+    validator.validate(the_map)
+
+    # changed elements are checked against the schema
+    reaction['name'] = 1
+    with raises(ValidationError):
+        validator.validate(the_map)
+    reaction['name'] = 'Reaction 0'
+    del the_map[1]['reactions'][second]
+    validator.validate(the_map)
+    # the reverted reaction is unchanged, and the removed one is forgotten
+    assert validator.checked['reactions'] == 0
+    assert second not in validator._results
+    with raises(ValidationError):
+        validator.validate([the_map[0], {}])
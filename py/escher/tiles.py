@@ -0,0 +1,162 @@
+"""Split Escher maps into square tiles for progressive loading.
+
+Each reaction belongs to the tile that holds the center of its bounding box,
+and the tile includes every node the reaction connects, so a tile can be drawn
+on its own. Nodes that are shared between tiles are repeated. Nodes that are
+not part of a reaction, and text labels, belong to the tile that holds them.
+
+"""
+
+from escher.maps import Map
+
+import math
+
+import numpy as np
+
+#: The default width and height of a tile in map coordinates
+DEFAULT_TILE_SIZE = 2000
+
+
+def tile_key(column, row):
+    """Return the key for the tile in a column and row."""
+    return '%d,%d' % (column, row)
+
+
+class MapTiles(object):
+    """A map split into square tiles.
+
+    :param escher_map: An escher.Map, or map data that is accepted by Map.
+
+    :param float tile_size: The width and height of each tile.
+
+    """
+
+    def __init__(self, escher_map, tile_size=DEFAULT_TILE_SIZE):
+        if not isinstance(escher_map, Map):
+            escher_map = Map(escher_map)
+        if tile_size <= 0:
+            raise ValueError('tile_size must be positive')
+        self.map = escher_map
+        self.tile_size = float(tile_size)
+        body = escher_map.data[1]
+        canvas = body.get('canvas')
+        bbox = escher_map.bbox()
+        if canvas is not None:
+            self.x, self.y = canvas['x'], canvas['y']
+        elif bbox is not None:
+            self.x, self.y = bbox[0], bbox[1]
+        else:
+            self.x = self.y = 0.0
+
+        reactions = body.get('reactions', {})
+
+        # reactions go to the tile with the center of their bbox, or their
+        # label if they have no segments
+        centers = np.column_stack([
+            (escher_map.reaction_bboxes[:, 0] + escher_map.reaction_bboxes[:, 2]) / 2,
+            (escher_map.reaction_bboxes[:, 1] + escher_map.reaction_bboxes[:, 3]) / 2,
+        ]).reshape(-1, 2)
+        for i, reaction_id in enumerate(escher_map.reaction_ids):
+            if np.isnan(centers[i]).any():
+                reaction = reactions[reaction_id]
+                centers[i] = (reaction['label_x'], reaction['label_y'])
+
+        self._reactions = {}
+        for reaction_id, key in zip(escher_map.reaction_ids,
+                                    self._keys_for_points(centers)):
+            self._reactions.setdefault(key, []).append(reaction_id)
+
+        connected = set()
+        for reaction in reactions.values():
+            for segment in reaction['segments'].values():
+                connected.add(segment['from_node_id'])
+                connected.add(segment['to_node_id'])
+        self._nodes = {}
+        for node_id, key in zip(escher_map.node_ids,
+                                self._keys_for_points(escher_map.node_xy)):
+            if node_id not in connected:
+                self._nodes.setdefault(key, []).append(node_id)
+
+        self._text_labels = {}
+        for label_id, key in zip(escher_map.text_label_ids,
+                                 self._keys_for_points(escher_map.text_label_xy)):
+            self._text_labels.setdefault(key, []).append(label_id)
+
+        #: The largest element ID in the map, so new elements can be given
+        #: IDs that are not in tiles that have not been loaded
+        self.largest_id = max(
+            [int(i) for ids in (escher_map.node_ids, escher_map.reaction_ids,
+                                escher_map.segment_ids,
+                                escher_map.text_label_ids)
+             for i in ids if i.isdigit()] or [0]
+        )
+
+        #: Keys of the tiles with content, sorted by row and column
+        self.keys = sorted(
+            set(self._reactions) | set(self._nodes) | set(self._text_labels),
+            key=lambda k: tuple(int(v) for v in k.split(','))[::-1],
+        )
+
+    def _keys_for_points(self, xy):
+        columns = np.floor((xy[:, 0] - self.x) / self.tile_size).astype(np.int64)
+        rows = np.floor((xy[:, 1] - self.y) / self.tile_size).astype(np.int64)
+        return [tile_key(c, r) for c, r in zip(columns.tolist(), rows.tolist())]
+
+    def keys_for_bbox(self, x_min, y_min, x_max, y_max):
+        """Keys of the tiles with content that overlap a bbox."""
+        column_min = int(math.floor((x_min - self.x) / self.tile_size))
+        column_max = int(math.floor((x_max - self.x) / self.tile_size))
+        row_min = int(math.floor((y_min - self.y) / self.tile_size))
+        row_max = int(math.floor((y_max - self.y) / self.tile_size))
+        return [k for k in self.keys
+                if column_min <= int(k.split(',')[0]) <= column_max
+                and row_min <= int(k.split(',')[1]) <= row_max]
+
+    def tile(self, key):
+        """Return a tile as a dictionary with a key, nodes, reactions and
+        text_labels. Unknown keys give an empty tile.
+
+        """
+        body = self.map.data[1]
+        all_reactions = body.get('reactions', {})
+        all_nodes = body.get('nodes', {})
+        all_text_labels = body.get('text_labels', {})
+        reactions = {r: all_reactions[r] for r in self._reactions.get(key, [])}
+        nodes = {n: all_nodes[n] for n in self._nodes.get(key, [])}
+        for reaction in reactions.values():
+            for segment in reaction['segments'].values():
+                for node_id in (segment['from_node_id'], segment['to_node_id']):
+                    if node_id in all_nodes:
+                        nodes[node_id] = all_nodes[node_id]
+        text_labels = {t: all_text_labels[t]
+                       for t in self._text_labels.get(key, [])}
+        return {
+            'key': key,
+            'nodes': nodes,
+            'reactions': reactions,
+            'text_labels': text_labels,
+        }
+
+    def partial_map(self, keys):
+        """Return map data with the header and canvas of the full map, and the
+        contents of the given tiles.
+
+        """
+        body = {'nodes': {}, 'reactions': {}, 'text_labels': {}}
+        for key in keys:
+            tile = self.tile(key)
+            for name in body:
+                body[name].update(tile[name])
+        if 'canvas' in self.map.data[1]:
+            body['canvas'] = self.map.data[1]['canvas']
+        return [self.map.data[0], body]
+
+    def info(self):
+        """Return a dictionary that describes the tile grid."""
+        return {
+            'tile_size': self.tile_size,
+            'x': self.x,
+            'y': self.y,
+            'keys': self.keys,
+            'largest_id': self.largest_id,
+        }
@@ -1,3 +1,4 @@
+from escher import rc
 from escher.version import (
     __version__,
     __schema_version__,
@@ -5,7 +6,8 @@ from escher.version import (
 )
 import os
 import re
-from os.path import dirname, realpath, join
+from os.path import abspath, dirname, expanduser, realpath, join
+from pathlib import Path
 
 root_directory = realpath(join(dirname(__file__), '..'))
 
@@ -45,11 +47,41 @@ def get_filepath(key):
         raise Exception('File key not recognized: %s' % key)
 
 
-def get_url(name):
-    """Get a url for the key"""
+def _as_root_url(root):
+    if '://' not in root:
+        root = Path(abspath(expanduser(root))).as_uri()
+    if not root.endswith('/'):
+        root += '/'
+    return root
+
+
+def server_root():
+    """Get the root url of the map and model server.
+
+    Set escher.rc['server_root'] to use a mirror instead of the Escher
+    website. The root can be an http(s):// or file:// url, or a local
+    directory, e.g. one created with escher.mirror.
+
+    """
+    return _as_root_url(rc.get('server_root') or _links['escher_root'])
+
+
+def get_url(name, root=None):
+    """Get a url for the key
+
+    Arguments
+    ---------
+
+    name: The key.
+
+    root: For the map and model server, a root url or directory to use
+    instead of server_root().
+
+    """
 
     if name in _escher_web:
-        return _links['escher_root'] + _escher_web[name]
+        return (_as_root_url(root) if root else server_root()) + \
+            _escher_web[name]
     elif name in _links:
         return _links[name]
     elif name in _dependencies_cdn:
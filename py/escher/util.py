@@ -1,5 +1,22 @@
+from escher import jsonio
+
 import base64
-import json
+import gzip
+
+# Characters of input per chunk in b64dump_chunks
+B64_CHUNK_SIZE = 3 * 2 ** 16
+
+# gzip level for compress_payload. Higher levels are several times slower for
+# a few percent smaller maps.
+COMPRESS_LEVEL = 6
+
+
+def _dump(data):
+    if isinstance(data, dict):
+        return jsonio.dumps(data)
+    elif data is None:
+        return jsonio.dumps(None)
+    return data
 
 
 def b64dump(data):
@@ -11,8 +28,57 @@ def b64dump(data):
     data: Can be a dict, a (JSON or plain) string, or None
 
     """
-    if isinstance(data, dict):
-        data = json.dumps(data)
-    elif data is None:
-        data = json.dumps(None)
+    data = _dump(data)
     return base64.b64encode(data.encode('utf-8')).decode('utf-8')
+
+
+def b64dump_chunks(data, chunk_size=B64_CHUNK_SIZE):
+    """Yields the base64 encoded dump of the input in chunks. Joining the
+    chunks gives the same result as b64dump, but only one chunk of the encoded
+    data is held in memory at a time.
+
+    Arguments
+    ---------
+
+    data: Can be a dict, a (JSON or plain) string, or None
+
+    chunk_size: The number of characters of the input to encode at a time
+
+    """
+    data = _dump(data)
+    # base64 encodes 3 bytes at a time, so carry over the bytes that do not
+    # fill a group to the next chunk
+    remainder = b''
+    for start in range(0, len(data), chunk_size):
+        raw = remainder + data[start:start + chunk_size].encode('utf-8')
+        cut = len(raw) - len(raw) % 3
+        remainder = raw[cut:]
+        if cut > 0:
+            yield base64.b64encode(raw[:cut]).decode('utf-8')
+    if remainder:
+        yield base64.b64encode(remainder).decode('utf-8')
+
+
+def compress_payload(text, level=COMPRESS_LEVEL):
+    """Returns a JSON string gzipped for the widget, as a dictionary with the
+    encoding, the compressed data, and the sizes in bytes before and after
+    compression. The data is a memoryview, so ipywidgets sends it as a binary
+    buffer instead of text.
+
+    Arguments
+    ---------
+
+    text: A JSON string
+
+    level: The gzip compression level
+
+    """
+    raw = text.encode('utf-8')
+    # no timestamp, so the same text always gives the same bytes
+    data = gzip.compress(raw, compresslevel=level, mtime=0)
+    return {
+        'encoding': 'gzip',
+        'data': memoryview(data),
+        'size': len(raw),
+        'compressed_size': len(data),
+    }
@@ -1,8 +1,8 @@
-from escher import __schema_version__
+from escher import __schema_version__, metrics, jsonio
 from escher.urls import get_filepath
+from hashlib import blake2b
 from os.path import join
 import re
-import json
 import sys
 
 usage_string = """
@@ -22,8 +22,8 @@ def main():
         print(usage_string)
         sys.exit(1)
 
-    with open(sys.argv[1], 'r') as f:
-        map_data = json.load(f)
+    with open(sys.argv[1], 'rb') as f:
+        map_data = jsonio.load(f)
     validate_map(map_data)
     print('Your map passed inspection and is free of infection.')
 
@@ -31,17 +31,23 @@ def main():
 def validate_map(map_data):
     """Validate a map using the jsonschema, and some extra checks for consistency."""
     import jsonschema
-    schema = get_jsonschema()
-    jsonschema.validate(map_data, schema)
+    with metrics.timer('validate_map.load_schema'):
+        schema = get_jsonschema()
+    with metrics.timer('validate_map.schema'):
+        jsonschema.validate(map_data, schema)
 
     # check that all segments have nodes, segments never connect midmarkers with
     # metabolites, and check that every metabolite is represented with
     # stoichiometry information
-    (bad_segments,
-     missing_multimarkers,
-     missing_stoich,
-     missing_gene_names) = check_map(map_data)
+    with metrics.timer('validate_map.check_map'):
+        (bad_segments,
+         missing_multimarkers,
+         missing_stoich,
+         missing_gene_names) = check_map(map_data)
+    _raise_check_errors(bad_segments, missing_stoich, missing_gene_names)
+
 
+def _raise_check_errors(bad_segments, missing_stoich, missing_gene_names):
     error = ''
     if len(bad_segments) > 0:
         error += 'No nodes for segments: %s\n' % (', '.join(str(x) for x in bad_segments))
@@ -73,38 +79,211 @@ def check_map(map_data):
     """
     reactions = map_data[1]['reactions'];
     nodes = map_data[1]['nodes'];
+    results = ([], [], [], [])
+    for _, reaction in reactions.items():
+        for result, found in zip(results, check_reaction(reaction, nodes)):
+            result.extend(found)
+    return results
+
+
+def check_reaction(reaction, nodes):
+    """Run the checks of check_map for one reaction. Only the nodes that the
+    segments of the reaction connect are used.
+
+    """
     bad_segments = []
     missing_multimarkers = []
     missing_stoich = []
     missing_gene_names = []
-    for _, reaction in reactions.items():
-        metabolites = reaction['metabolites']
-        for segment_id, segment in reaction['segments'].items():
-            for n in ['to_node_id', 'from_node_id']:
-                # check that the node exists
-                if segment[n] not in nodes:
-                    bad_segments.append((n, segment_id))
-                else:
-                    # check that the coefficients exist and are non-zero
-                    node = nodes[segment[n]]
-                    if node['node_type'] == 'metabolite':
-                        if not any((node['bigg_id'] == m['bigg_id'] and abs(m['coefficient']) > 0) for m in metabolites):
-                            missing_stoich.append((n, segment_id))
-
-        # check gene reaction rule
-        found_genes = genes_for_gene_reaction_rule(reaction['gene_reaction_rule'])
-        for found_gene in found_genes:
-            if not any((found_gene == g['bigg_id'] and 'name' in g) for g in reaction['genes']):
-                missing_gene_names.append(found_gene)
+    metabolites = reaction['metabolites']
+    for segment_id, segment in reaction['segments'].items():
+        for n in ['to_node_id', 'from_node_id']:
+            # check that the node exists
+            if segment[n] not in nodes:
+                bad_segments.append((n, segment_id))
+            else:
+                # check that the coefficients exist and are non-zero
+                node = nodes[segment[n]]
+                if node['node_type'] == 'metabolite':
+                    if not any((node['bigg_id'] == m['bigg_id'] and abs(m['coefficient']) > 0) for m in metabolites):
+                        missing_stoich.append((n, segment_id))
+
+    # check gene reaction rule
+    found_genes = genes_for_gene_reaction_rule(reaction['gene_reaction_rule'])
+    for found_gene in found_genes:
+        if not any((found_gene == g['bigg_id'] and 'name' in g) for g in reaction['genes']):
+            missing_gene_names.append(found_gene)
     return bad_segments, missing_multimarkers, missing_stoich, missing_gene_names
 
 
+# the collections of elements in the map body, validated element by element
+_COLLECTIONS = ('reactions', 'nodes', 'text_labels')
+
+
+def element_hash(element):
+    """Return a hash of the JSON content of a map element."""
+    return blake2b(jsonio.dumpb(element), digest_size=16).digest()
+
+
+class IncrementalValidator(object):
+    """Validate versions of a map, checking only what changed.
+
+    The first call to validate checks the whole map, like validate_map. It
+    keeps a hash of each reaction, node and text label, and the reactions that
+    connect to each node. Later calls only check the elements whose hash
+    changed, and the reactions that connect to changed nodes:
+
+    .. code:: python
+
+        validator = IncrementalValidator()
+        validator.validate(map_data)
+        map_data[1]['nodes']['42']['x'] += 10
+        validator.validate(map_data)
+        validator.checked
+        # {'reactions': 2, 'nodes': 1, 'text_labels': 0}
+
+    The hashes are only kept when a map passes, so after an error the changes
+    since the last valid map are checked again.
+
+    """
+
+    def __init__(self):
+        self._validators = None
+        self.reset()
+
+    def reset(self):
+        """Forget the previous map, so the next map is checked in full."""
+        self._hashes = {collection: {} for collection in _COLLECTIONS}
+        # results of check_reaction by reaction ID
+        self._results = {}
+        # the node IDs that the segments of each reaction connect, and the
+        # reverse
+        self._reaction_nodes = {}
+        self._node_reactions = {}
+        #: The number of elements checked in the last call to validate
+        self.checked = None
+
+    def _get_validators(self):
+        if self._validators is None:
+            import jsonschema
+            schema = get_jsonschema()
+            cls = jsonschema.validators.validator_for(schema)
+            body = schema['items'][1]['properties']
+            self._validators = {'map': cls(schema)}
+            for collection in _COLLECTIONS:
+                patterns = body[collection]['patternProperties']
+                (pattern, element_schema), = patterns.items()
+                self._validators[collection] = (re.compile(pattern),
+                                                cls(element_schema))
+        return self._validators
+
+    def _validate_schema(self, map_data, body, changed):
+        validators = self._get_validators()
+        if not all(isinstance(body.get(c), dict) for c in _COLLECTIONS):
+            # not shaped like a map, so report the errors for the whole map
+            validators['map'].validate(map_data)
+        # the map without its elements, and then the changed elements
+        shell = [map_data[0], dict(body, **{c: {} for c in _COLLECTIONS})]
+        validators['map'].validate(shell)
+        for collection in _COLLECTIONS:
+            pattern, validator = validators[collection]
+            for element_id in changed[collection]:
+                if not pattern.search(element_id):
+                    # report the error for the collection
+                    validators['map'].validate(map_data)
+                validator.validate(body[collection][element_id])
+
+    def validate(self, map_data):
+        """Validate a map, checking only what changed since the last valid
+        map. Raises the same errors as validate_map.
+
+        """
+        body = map_data[1] if isinstance(map_data, list) and \
+            len(map_data) > 1 else None
+        if not isinstance(body, dict):
+            body = {}
+        hashes, changed = {}, {}
+        with metrics.timer('incremental_validate.hash'):
+            for collection in _COLLECTIONS:
+                elements = body.get(collection)
+                if not isinstance(elements, dict):
+                    elements = {}
+                old = self._hashes[collection]
+                hashes[collection] = {
+                    element_id: element_hash(element)
+                    for element_id, element in elements.items()
+                }
+                changed[collection] = [
+                    element_id
+                    for element_id, digest in hashes[collection].items()
+                    if old.get(element_id) != digest
+                ]
+        with metrics.timer('incremental_validate.schema'):
+            self._validate_schema(map_data, body, changed)
+
+        reactions, nodes = body['reactions'], body['nodes']
+        # the changed reactions, and the reactions that connect to changed or
+        # removed nodes
+        to_check = set(changed['reactions'])
+        to_check.update(r for r in self._results if r not in reactions)
+        changed_nodes = set(changed['nodes'])
+        changed_nodes.update(n for n in self._hashes['nodes']
+                             if n not in nodes)
+        for node_id in changed_nodes:
+            to_check.update(self._node_reactions.get(node_id, ()))
+
+        # copies, with new sets for the nodes that change, so nothing is kept
+        # if the map is not valid
+        results = dict(self._results)
+        reaction_nodes = dict(self._reaction_nodes)
+        node_reactions = dict(self._node_reactions)
+        with metrics.timer('incremental_validate.check_map'):
+            for reaction_id in to_check:
+                results.pop(reaction_id, None)
+                for node_id in reaction_nodes.pop(reaction_id, ()):
+                    remaining = node_reactions[node_id] - {reaction_id}
+                    if remaining:
+                        node_reactions[node_id] = remaining
+                    else:
+                        del node_reactions[node_id]
+                reaction = reactions.get(reaction_id)
+                if reaction is None:
+                    continue
+                results[reaction_id] = check_reaction(reaction, nodes)
+                connected = reaction_nodes[reaction_id] = {
+                    segment[n] for segment in reaction['segments'].values()
+                    for n in ('to_node_id', 'from_node_id')
+                }
+                for node_id in connected:
+                    node_reactions[node_id] = (
+                        node_reactions.get(node_id, frozenset()) |
+                        {reaction_id}
+                    )
+
+        # report the errors in the order of the map, like validate_map
+        found = ([], [], [], [])
+        for reaction_id in reactions:
+            for errors, result in zip(found, results[reaction_id]):
+                errors.extend(result)
+        self.checked = {
+            'reactions': sum(1 for r in to_check if r in reactions),
+            'nodes': len(changed['nodes']),
+            'text_labels': len(changed['text_labels']),
+        }
+        _raise_check_errors(found[0], found[2], found[3])
+
+        self._hashes = hashes
+        self._results = results
+        self._reaction_nodes = reaction_nodes
+        self._node_reactions = node_reactions
+
+
 def get_jsonschema():
     """Get the local jsonschema.
 
     """
-    with open(get_filepath('map_jsonschema'), 'r') as f:
-        return json.load(f)
+    with open(get_filepath('map_jsonschema'), 'rb') as f:
+        return jsonio.load(f)
 
 
 def genes_for_gene_reaction_rule(rule):
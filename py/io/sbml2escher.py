@@ -3,14 +3,64 @@ This module provides tools for converting SBML and CellDesigner XML files to Esc
 """
 import json
 import argparse
+import asyncio
+import contextlib
+import gzip
+import hashlib
+import io
+import itertools
+import shutil
 import sys
+import tempfile
 import time
 import os
+from collections import ChainMap
+from concurrent.futures import ProcessPoolExecutor
 
 from xml.parsers.expat import ExpatError
 import xmltodict
 import requests
 
+try:
+    from escher import metrics
+    from escher.metrics import timer as metrics_timer
+except ImportError:
+    # the converter also runs without the escher package, then the phases are not timed
+    metrics = None
+
+    def metrics_timer(name, **tags):
+        """
+        Stand in for escher.metrics.timer
+        :return: context manager doing nothing
+        """
+        return contextlib.nullcontext()
+
+try:
+    from escher import jsonio
+except ImportError:
+    # without the escher package, JSON is written with the standard library
+    jsonio = None
+
+# conversion service for CellDesigner XML to SBML XML
+MINERVA_CONVERT_URL = 'https://minerva-service.lcsb.uni.lu/minerva/api/convert/CellDesigner_SBML:SBML'
+# chunk size for the streamed upload and download of the conversion service
+TRANSFER_CHUNK_SIZE = 64 * 1024
+
+# version of the conversion, part of the cache key of the converted files
+CONVERTER_VERSION = '1.1.0'
+# default size limit of the conversion cache, 512 MB
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# indentation of the Escher JSON output, except in compact mode
+INDENT = 4
+
+
+class ConversionError(Exception):
+    """
+    A file cannot be converted, reported as an error by the script
+    """
+
+
 # define edges
 edges = {}
 # define nodes
@@ -47,7 +97,7 @@ def celldesigner2sbml(input_file_path, output_file_path):
         file_data = file.read()
 
     # Define the URL for the conversion service
-    url = 'https://minerva-service.lcsb.uni.lu/minerva/api/convert/CellDesigner_SBML:SBML'
+    url = MINERVA_CONVERT_URL
     # Define the headers for the HTTP request
     headers = {
         'Content-Type': 'text/plain'
@@ -66,9 +116,453 @@ def celldesigner2sbml(input_file_path, output_file_path):
 
         print(f"CellDesigner2SBML request successful, file saved as {output_file_path}")
     else:
-        print(f"CellDesigner2SBML request failed with status code {response.status_code}, "
-              f"error message: {response.text}")
-        sys.exit(1)
+        raise ConversionError(f"CellDesigner2SBML request failed with status code "
+                              f"{response.status_code}, error message: {response.text}")
+
+
+async def read_file_chunks(file_path):
+    """
+    Read a file in chunks, for the streamed upload
+    :param file_path: path to the file
+    :return: async generator of bytes
+    """
+    with open(file_path, 'rb') as file:
+        while True:
+            chunk = await asyncio.to_thread(file.read, TRANSFER_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+async def celldesigner2sbml_async(client, input_file_path, output_file_path,
+                                  url=MINERVA_CONVERT_URL, retries=3, backoff=1.0):
+    """
+    Convert CellDesigner XML to SBML XML with the remote conversion service, without blocking
+    :param client: httpx.AsyncClient, shared by all conversions for the connection pooling
+    :param input_file_path: path to the CellDesigner XML file
+    :param output_file_path: path to the output SBML XML file
+    :param url: URL of the conversion service
+    :param retries: number of retries after a failed request
+    :param backoff: delay before the first retry in seconds, doubled for every retry
+    :return: {'input': str, 'output': str or None, 'error': str or None, 'attempts': int,
+             'seconds': float}
+    """
+    import httpx
+
+    start_at = time.time()
+    result = {'input': input_file_path, 'output': None, 'error': None, 'attempts': 0}
+    for attempt in range(retries + 1):
+        result['attempts'] = attempt + 1
+        retry = False
+        try:
+            async with client.stream('POST', url, content=read_file_chunks(input_file_path),
+                                     headers={'Content-Type': 'text/plain'}) as response:
+                if response.status_code == 200:
+                    # write to a temporary file, so failed downloads leave no partial output
+                    temp_path = f"{output_file_path}.part"
+                    with open(temp_path, 'wb') as file:
+                        async for chunk in response.aiter_bytes(TRANSFER_CHUNK_SIZE):
+                            file.write(chunk)
+                    os.replace(temp_path, output_file_path)
+                    result['output'] = output_file_path
+                    result['error'] = None
+                    break
+                body = (await response.aread()).decode('utf-8', errors='replace')
+                result['error'] = (f"request failed with status code {response.status_code}, "
+                                   f"error message: {body}")
+                # retry the server errors and the rate limiting, not the rejected files
+                retry = response.status_code >= 500 or response.status_code == 429
+        except httpx.HTTPError as e:
+            result['error'] = f"request failed: {e!r}"
+            retry = True
+        except OSError as e:
+            result['error'] = f"I/O error: {e}"
+        if not retry or attempt == retries:
+            break
+        await asyncio.sleep(backoff * 2 ** attempt)
+    result['seconds'] = time.time() - start_at
+    return result
+
+
+async def celldesigner2sbml_batch_async(conversions, url=MINERVA_CONVERT_URL, concurrency=8,
+                                        retries=3, backoff=1.0, timeout=600):
+    """
+    Convert many CellDesigner XML files to SBML XML concurrently with the remote conversion
+    service. Failed conversions are reported in the results instead of stopping the batch.
+    :param conversions: list of (input file path, output file path)
+    :param url: URL of the conversion service
+    :param concurrency: maximum number of requests in progress
+    :param retries: number of retries after a failed request
+    :param backoff: delay before the first retry in seconds, doubled for every retry
+    :param timeout: timeout of each request in seconds
+    :return: list of results of celldesigner2sbml_async, in the order of the conversions
+    """
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        async def convert(input_file_path, output_file_path):
+            async with semaphore:
+                return await celldesigner2sbml_async(client, input_file_path, output_file_path,
+                                                     url, retries, backoff)
+
+        return await asyncio.gather(*(convert(input_file_path, output_file_path)
+                                      for input_file_path, output_file_path in conversions))
+
+
+def celldesigner2escher_batch(input_file_paths, output_dir, url=MINERVA_CONVERT_URL,
+                              concurrency=8, retries=3, backoff=1.0, timeout=600):
+    """
+    Convert many CellDesigner XML files to Escher JSON with the remote conversion service
+    :param input_file_paths: paths to the CellDesigner XML files
+    :param output_dir: directory for the Escher JSON files, named after the input files and
+                       their position in the list, so inputs with the same name do not collide
+    :param url: URL of the conversion service
+    :param concurrency: maximum number of requests in progress
+    :param retries: number of retries after a failed request
+    :param backoff: delay before the first retry in seconds, doubled for every retry
+    :param timeout: timeout of each request in seconds
+    :return: list of results, with the Escher JSON file path as output. Files failing the
+             remote or the local part of the conversion have an error instead.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    conversions = []
+    for index, input_file_path in enumerate(input_file_paths):
+        name = os.path.splitext(os.path.basename(input_file_path))[0]
+        conversions.append((input_file_path,
+                            os.path.join(output_dir, f"{name}_{index}_SBML_converted.xml")))
+    results = asyncio.run(celldesigner2sbml_batch_async(conversions, url, concurrency, retries,
+                                                        backoff, timeout))
+    for index, result in enumerate(results):
+        if result['output'] is not None:
+            name = os.path.splitext(os.path.basename(result['input']))[0]
+            output_file_path = os.path.join(output_dir, f"{name}_{index}.json")
+            try:
+                sbml2escher(result['output'], output_file_path, True)
+                result['output'] = output_file_path
+            except Exception as e:
+                # a malformed file fails in many ways, and only fails itself
+                result['output'] = None
+                result['error'] = f"conversion to Escher failed: {e}"
+        if result['output'] is None:
+            print(f"Error: {result['input']} - {result['error']}")
+    return results
+
+
+# positions of the CellDesigner link anchors, as fractions of the width and height of the alias
+LINK_ANCHORS = {
+    'N': (0.5, 0), 'NNE': (0.75, 0), 'NE': (1, 0), 'ENE': (1, 0.25),
+    'E': (1, 0.5), 'ESE': (1, 0.75), 'SE': (1, 1), 'SSE': (0.75, 1),
+    'S': (0.5, 1), 'SSW': (0.25, 1), 'SW': (0, 1), 'WSW': (0, 0.75),
+    'W': (0, 0.5), 'WNW': (0, 0.25), 'NW': (0, 0), 'NNW': (0.25, 0),
+}
+
+
+def as_list(value):
+    """
+    Normalize an xmltodict value that can be missing, a single element or a list of elements
+    :param value: xmltodict value
+    :return: list of elements
+    """
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def alias_anchor_point(bounds, target, link_anchor=None):
+    """
+    Get the point where a line to the target leaves the alias box
+    :param bounds: alias bounds, {'x': float, 'y': float, 'w': float, 'h': float}
+    :param target: the other end of the line, (x, y)
+    :param link_anchor: CellDesigner link anchor position, e.g. 'N' or 'WSW'
+    :return: (x, y) of the point on the border of the alias
+    """
+    if link_anchor in LINK_ANCHORS:
+        fraction_x, fraction_y = LINK_ANCHORS[link_anchor]
+        return bounds['x'] + bounds['w'] * fraction_x, bounds['y'] + bounds['h'] * fraction_y
+
+    center_x = bounds['x'] + bounds['w'] / 2
+    center_y = bounds['y'] + bounds['h'] / 2
+    dx = target[0] - center_x
+    dy = target[1] - center_y
+    if dx == 0 and dy == 0:
+        return center_x, center_y
+    # scale the direction until it reaches the border of the box
+    scale = min(bounds['w'] / 2 / abs(dx) if dx else float('inf'),
+                bounds['h'] / 2 / abs(dy) if dy else float('inf'))
+    return center_x + dx * scale, center_y + dy * scale
+
+
+def alias_center(bounds):
+    """
+    Get the center of an alias box
+    :param bounds: alias bounds
+    :return: (x, y) of the center
+    """
+    return bounds['x'] + bounds['w'] / 2, bounds['y'] + bounds['h'] / 2
+
+
+def edit_points_to_absolute(edit_points, start, end):
+    """
+    Convert CellDesigner edit points to absolute coordinates. The edit points are given in the
+    coordinate system with the origin at the start point, the x axis going to the end point and
+    the y axis perpendicular to it.
+    :param edit_points: edit points string, e.g. '0.5,-0.2 0.7,0.1'
+    :param start: start point, (x, y)
+    :param end: end point, (x, y)
+    :return: list of (x, y) points
+    """
+    if not edit_points:
+        return []
+    ex = (end[0] - start[0], end[1] - start[1])
+    ey = (-ex[1], ex[0])
+    points = []
+    for point in edit_points.split():
+        u, v = (float(value) for value in point.split(','))
+        points.append((start[0] + u * ex[0] + v * ey[0],
+                       start[1] + u * ex[1] + v * ey[1]))
+    return points
+
+
+def interpolate(start, end, fraction):
+    """
+    Get the point at the fraction of the line from start to end
+    :param start: start point, (x, y)
+    :param end: end point, (x, y)
+    :param fraction: fraction of the line
+    :return: (x, y)
+    """
+    return (start[0] + (end[0] - start[0]) * fraction,
+            start[1] + (end[1] - start[1]) * fraction)
+
+
+def layout_point(point):
+    """
+    Create an SBML layout point
+    :param point: (x, y)
+    :return: layout point object
+    """
+    return {'@layout:x': point[0], '@layout:y': point[1]}
+
+
+def layout_curve(points):
+    """
+    Create an SBML layout curve through the points
+    :param points: list of (x, y) points
+    :return: layout curve object
+    """
+    return {
+        'layout:listOfCurveSegments': {
+            'layout:curveSegment': [
+                {'layout:start': layout_point(start), 'layout:end': layout_point(end)}
+                for start, end in zip(points, points[1:])
+            ]
+        }
+    }
+
+
+def celldesigner_species_glyphs(extension):
+    """
+    Create the species glyphs for all CellDesigner species aliases and complex species aliases
+    :param extension: the celldesigner:extension of the model
+    :return: dict of alias id to species glyph, dict of alias id to bounds
+    """
+    species_glyphs = {}
+    alias_bounds = {}
+    for list_name, alias_name in (
+            ('celldesigner:listOfSpeciesAliases', 'celldesigner:speciesAlias'),
+            ('celldesigner:listOfComplexSpeciesAliases', 'celldesigner:complexSpeciesAlias')):
+        for alias in as_list((extension.get(list_name) or {}).get(alias_name)):
+            bounds = {key: float(alias['celldesigner:bounds']['@' + key])
+                      for key in ('x', 'y', 'w', 'h')}
+            alias_bounds[alias['@id']] = bounds
+            species_glyphs[alias['@id']] = {
+                '@layout:id': alias['@id'],
+                '@layout:species': alias['@species'],
+                'layout:boundingBox': {
+                    'layout:position': {'@layout:x': bounds['x'], '@layout:y': bounds['y']},
+                    'layout:dimensions': {'@layout:width': bounds['w'],
+                                          '@layout:height': bounds['h']},
+                },
+            }
+    return species_glyphs, alias_bounds
+
+
+def celldesigner_reaction_glyph(reaction_id, extension, alias_bounds):
+    """
+    Create the reaction glyph of a CellDesigner reaction. The reaction curve is placed on the
+    segment of the base line that holds the process node, and all species links leave from its
+    two ends.
+    :param reaction_id: reaction id
+    :param extension: the celldesigner:extension of the reaction
+    :param alias_bounds: dict of alias id to bounds
+    :return: reaction glyph object, or None if the reaction has no base reactant or product
+    """
+    base_reactants = as_list((extension.get('celldesigner:baseReactants') or {})
+                             .get('celldesigner:baseReactant'))
+    base_products = as_list((extension.get('celldesigner:baseProducts') or {})
+                            .get('celldesigner:baseProduct'))
+    if not base_reactants or not base_products:
+        return None
+
+    def link_anchor(link):
+        return (link.get('celldesigner:linkAnchor') or {}).get('@position')
+
+    # the base line goes from the first base reactant to the first base product
+    reactant_bounds = alias_bounds[base_reactants[0]['@alias']]
+    product_bounds = alias_bounds[base_products[0]['@alias']]
+    reactant_center = alias_center(reactant_bounds)
+    product_center = alias_center(product_bounds)
+    edit_points = edit_points_to_absolute(extension.get('celldesigner:editPoints'),
+                                          reactant_center, product_center)
+    start = alias_anchor_point(reactant_bounds, (edit_points or [product_center])[0],
+                               link_anchor(base_reactants[0]))
+    end = alias_anchor_point(product_bounds, (edit_points or [reactant_center])[-1],
+                             link_anchor(base_products[0]))
+    base_line = [start] + edit_points + [end]
+
+    # the process node sits on the segment given by the rectangle index
+    connect_scheme = extension.get('celldesigner:connectScheme') or {}
+    rectangle_index = min(int(connect_scheme.get('@rectangleIndex', 0)), len(base_line) - 2)
+    segment_start = base_line[rectangle_index]
+    segment_end = base_line[rectangle_index + 1]
+    reaction_start = interpolate(segment_start, segment_end, 0.4)
+    reaction_end = interpolate(segment_start, segment_end, 0.6)
+
+    species_reference_glyphs = []
+
+    def add_species_reference(role, link, points):
+        species_reference_glyphs.append({
+            '@layout:id': f"{role}-{link['@alias']}",
+            '@layout:role': role,
+            '@layout:speciesGlyph': link['@alias'],
+            'layout:curve': layout_curve(points),
+        })
+
+    add_species_reference(
+        'substrate', base_reactants[0],
+        [reaction_start] + base_line[rectangle_index::-1])
+    add_species_reference(
+        'product', base_products[0],
+        [reaction_end] + base_line[rectangle_index + 1:])
+
+    # the other base species and the reactant/product links connect directly to the reaction
+    for role, links, reaction_point in (
+            ('substrate', base_reactants[1:], reaction_start),
+            ('product', base_products[1:], reaction_end),
+            ('sidesubstrate', as_list((extension.get('celldesigner:listOfReactantLinks') or {})
+                                      .get('celldesigner:reactantLink')), reaction_start),
+            ('sideproduct', as_list((extension.get('celldesigner:listOfProductLinks') or {})
+                                    .get('celldesigner:productLink')), reaction_end)):
+        for link in links:
+            bounds = alias_bounds[link['@alias']]
+            add_species_reference(
+                role, link,
+                [reaction_point, alias_anchor_point(bounds, reaction_point, link_anchor(link))])
+
+    return {
+        '@layout:id': f"{reaction_id}-glyph",
+        '@layout:reaction': reaction_id,
+        'layout:curve': layout_curve([reaction_start, reaction_end]),
+        'layout:listOfSpeciesReferenceGlyphs': {
+            'layout:speciesReferenceGlyph': species_reference_glyphs
+        },
+    }
+
+
+def celldesigner2model(xml_data):
+    """
+    Read CellDesigner XML directly into the model records used by the converter, without the
+    remote conversion service or a temporary SBML file
+    :param xml_data: CellDesigner XML data parsed with xmltodict
+    :return: model object in the SBML layout structure
+    """
+    cd_model = xml_data['sbml']['model']
+    extension = cd_model['annotation']['celldesigner:extension']
+    model_display = extension['celldesigner:modelDisplay']
+
+    species = [{'@id': sp['@id'], '@name': sp.get('@name', sp['@id'])}
+               for sp in as_list((cd_model.get('listOfSpecies') or {}).get('species'))]
+
+    species_glyphs, alias_bounds = celldesigner_species_glyphs(extension)
+
+    reactions = []
+    reaction_glyphs = []
+    for reaction in as_list((cd_model.get('listOfReactions') or {}).get('reaction')):
+        reaction_extension = reaction['annotation']['celldesigner:extension']
+        # SBML level 2 reactions are reversible by default
+        reactions.append({
+            '@id': reaction['@id'],
+            '@name': reaction.get('@name', reaction['@id']),
+            '@reversible': reaction.get('@reversible', 'true'),
+            'listOfReactants': {'speciesReference': [
+                {'@species': ref['@species']}
+                for ref in as_list((reaction.get('listOfReactants') or {})
+                                   .get('speciesReference'))
+            ]},
+            'listOfProducts': {'speciesReference': [
+                {'@species': ref['@species']}
+                for ref in as_list((reaction.get('listOfProducts') or {})
+                                   .get('speciesReference'))
+            ]},
+        })
+        reaction_glyph = celldesigner_reaction_glyph(reaction['@id'], reaction_extension,
+                                                     alias_bounds)
+        if reaction_glyph is not None:
+            reaction_glyphs.append(reaction_glyph)
+
+    return {
+        '@id': cd_model.get('@id', 'celldesigner_model'),
+        'listOfSpecies': {'species': species},
+        'listOfReactions': {'reaction': reactions},
+        'layout:listOfLayouts': {
+            'layout:layout': {
+                'layout:dimensions': {'@layout:width': model_display['@sizeX'],
+                                      '@layout:height': model_display['@sizeY']},
+                'layout:listOfSpeciesGlyphs': {
+                    'layout:speciesGlyph': list(species_glyphs.values())
+                },
+                'layout:listOfReactionGlyphs': {'layout:reactionGlyph': reaction_glyphs},
+            }
+        },
+    }
+
+
+def benchmark_celldesigner(file_paths, output_dir='.'):
+    """
+    Compare the local CellDesigner conversion with the remote MINERVA conversion
+    :param file_paths: paths to CellDesigner XML files
+    :param output_dir: directory for the converted files
+    :return: list of {'file': str, 'local': float, 'remote': float or None} timings in seconds
+    """
+    results = []
+    for file_path in file_paths:
+        name = os.path.splitext(os.path.basename(file_path))[0]
+
+        start_at = time.time()
+        celldesigner2escher(file_path, os.path.join(output_dir, f"{name}_local.json"))
+        local_time = time.time() - start_at
+
+        start_at = time.time()
+        temp_file_path = os.path.join(output_dir, f"{name}_SBML_converted.xml")
+        try:
+            celldesigner2sbml(file_path, temp_file_path)
+            sbml2escher(temp_file_path, os.path.join(output_dir, f"{name}_remote.json"), True)
+            remote_time = time.time() - start_at
+        except (requests.RequestException, ConversionError) as e:
+            print(f"Remote conversion of {file_path} failed: {e}")
+            remote_time = None
+
+        results.append({'file': file_path, 'local': local_time, 'remote': remote_time})
+
+    print(f"{'file':<40} {'local (s)':>10} {'remote (s)':>11}")
+    for result in results:
+        remote = 'failed' if result['remote'] is None else f"{result['remote']:.2f}"
+        print(f"{result['file']:<40} {result['local']:>10.2f} {remote:>11}")
+    return results
 
 
 # Load XML data
@@ -76,39 +570,303 @@ def load_xml_data(file_path):
     """
     Load XML data from a file
     :param file_path: path to the XML file
-    :return: None
+    :return: parsed XML data
+    :raises ConversionError: if the file cannot be read or parsed
     """
     try:
         with open(file_path, 'r', encoding='utf-8') as file:
             return xmltodict.parse(file.read())
-    except FileNotFoundError:
-        print(f"Error: The file {file_path} was not found.")
-        sys.exit(1)
+    except FileNotFoundError as e:
+        raise ConversionError(f"The file {file_path} was not found.") from e
     except IOError as e:
-        print(f"Error: Could not read the XML file {file_path}. I/O error: {e}")
-        sys.exit(1)
+        raise ConversionError(f"Could not read the XML file {file_path}. I/O error: {e}") from e
     except ExpatError as e:
-        print(f"Error: Failed to parse XML file {file_path}. Parsing error: {e}")
-        sys.exit(1)
+        raise ConversionError(f"Failed to parse XML file {file_path}. "
+                              f"Parsing error: {e}") from e
 
 
 # Save escher JSON data
-def save_json_data(json_data, file_path):
+def save_json_data(json_data, file_path, compact=False, use_gzip=False, precision=2):
     """
     Save JSON data to a file
     :param data: formatted JSON data
     :param file_path: path to the output file
+    :param compact: write without indentation, with rounded coordinates and short ids
+    :param use_gzip: compress the output with gzip
+    :param precision: number of decimals kept for coordinates in compact mode
+    :return: None
+    """
+    check_output_extension(file_path, use_gzip)
+    if compact:
+        json_data = compact_escher_map(json_data, precision)
+    try:
+        with open_output_file(file_path, use_gzip) as file:
+            if compact:
+                file.write(compact_dumps(json_data))
+            else:
+                json.dump(json_data, file, indent=INDENT)
+    except IOError as e:
+        raise ConversionError(f"Could not write the JSON data to the file {file_path}. "
+                              f"I/O error: {e}") from e
+
+
+def compact_dumps(obj):
+    """
+    Encode an object as JSON without whitespace, with the fast JSON layer of escher if it is
+    installed
+    :param obj: object to encode
+    :return: JSON string
+    """
+    if jsonio is not None:
+        return jsonio.dumps(obj)
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def indented_dumps(obj, level):
+    """
+    Encode an object as JSON like json.dump with indent=INDENT, as a value nested in level
+    containers of the document
+    :param obj: object to encode
+    :param level: nesting depth of the object in the document
+    :return: JSON string
+    """
+    return json.dumps(obj, indent=INDENT).replace('\n', '\n' + ' ' * INDENT * level)
+
+
+def check_output_extension(file_path, use_gzip=False):
+    """
+    Warn if the output file does not have the expected extension
+    :param file_path: path to the output file
+    :param use_gzip: whether the output is gzip compressed
     :return: None
     """
-    if not file_path.endswith('.json'):
-        print(f"Warning: The output file {file_path} does not have a .json extension. "
+    extension = '.json.gz' if use_gzip else '.json'
+    if not file_path.endswith(extension):
+        print(f"Warning: The output file {file_path} does not have a {extension} extension. "
               f"It might not be opened correctly by JSON readers.")
+
+
+def open_output_file(file_path, use_gzip=False):
+    """
+    Open the output file for writing text, optionally gzip compressed
+    :param file_path: path to the output file
+    :param use_gzip: compress the output with gzip
+    :return: file object
+    """
+    if use_gzip:
+        # without a file name and a modification time in the header, so the same map is always
+        # compressed to the same bytes
+        raw_file = open(file_path, 'wb')
+        compressed = gzip.GzipFile(filename='', mode='wb', fileobj=raw_file, mtime=0)
+        # closing the text wrapper closes the gzip stream, which does not close raw_file
+        compressed.myfileobj = raw_file
+        return io.TextIOWrapper(compressed, encoding='utf-8')
+    return open(file_path, 'w', encoding='utf-8')
+
+
+def compact_id_allocator():
+    """
+    Create a function that maps the long converter ids to short integer-string ids,
+    like the ids used in native Escher maps
+    :return: function of the original id to the short id
+    """
+    short_ids = {}
+    counter = itertools.count()
+
+    def get_id(original_id):
+        if original_id not in short_ids:
+            short_ids[original_id] = str(next(counter))
+        return short_ids[original_id]
+
+    return get_id
+
+
+def round_coordinates(obj, keys, precision):
+    """
+    Round the coordinate values of an object
+    :param obj: node, reaction or bezier point
+    :param keys: keys of the coordinates to round
+    :param precision: number of decimals to keep
+    :return: new object with rounded coordinates
+    """
+    rounded = dict(obj)
+    for key in keys:
+        if rounded.get(key) is not None:
+            rounded[key] = round(rounded[key], precision)
+    return rounded
+
+
+def compact_reaction(reaction, node_id, segment_id, precision):
+    """
+    Create the compact version of a reaction
+    :param reaction: reaction object
+    :param node_id: function mapping the original node ids to short ids
+    :param segment_id: function mapping the original segment ids to short ids
+    :param precision: number of decimals kept for coordinates
+    :return: compact reaction object
+    """
+    compact = round_coordinates(reaction, ('label_x', 'label_y'), precision)
+    if 'segments' in reaction:
+        segments = {}
+        for seg_id, segment in reaction['segments'].items():
+            segments[segment_id(seg_id)] = {
+                'from_node_id': node_id(segment['from_node_id']),
+                'to_node_id': node_id(segment['to_node_id']),
+                'b1': (round_coordinates(segment['b1'], ('x', 'y'), precision)
+                       if segment['b1'] is not None else None),
+                'b2': (round_coordinates(segment['b2'], ('x', 'y'), precision)
+                       if segment['b2'] is not None else None),
+            }
+        compact['segments'] = segments
+    return compact
+
+
+def compact_node(node, precision):
+    """
+    Create the compact version of a node
+    :param node: node object
+    :param precision: number of decimals kept for coordinates
+    :return: compact node object
+    """
+    return round_coordinates(node, ('x', 'y', 'label_x', 'label_y'), precision)
+
+
+def compact_escher_map(escher_maps, precision=2):
+    """
+    Create the compact version of an Escher map, with rounded coordinates and short ids
+    :param escher_maps: Escher map, [header, body]
+    :param precision: number of decimals kept for coordinates
+    :return: compact Escher map
+    """
+    header, body = escher_maps
+    reaction_id = compact_id_allocator()
+    node_id = compact_id_allocator()
+    segment_id = compact_id_allocator()
+    # the nodes are numbered in the order they were created, like in the streaming writer
+    for n_id in body['nodes']:
+        node_id(n_id)
+    reactions = {
+        reaction_id(r_id): compact_reaction(reaction, node_id, segment_id, precision)
+        for r_id, reaction in body['reactions'].items()
+    }
+    compact_nodes = {
+        node_id(n_id): compact_node(node, precision)
+        for n_id, node in body['nodes'].items()
+    }
+    return [header, {
+        'reactions': reactions,
+        'nodes': compact_nodes,
+        'text_labels': body['text_labels'],
+        'canvas': round_coordinates(body['canvas'], ('x', 'y', 'width', 'height'), precision),
+    }]
+
+
+def stream_json_data(header, reactions, metabolite_nodes, canvas, file_path, compact=False,
+                     use_gzip=False, precision=2):
+    """
+    Write an Escher map to a file while it is being created, with the same content as
+    save_json_data. Every reaction is written as soon as it is produced. The nodes created for
+    a reaction are moved to a temporary file at the same time, so only the metabolite nodes are
+    kept in memory until the end.
+    :param header: map header object
+    :param reactions: iterable of (reaction_id, reaction, reaction_nodes), where reaction_nodes
+                      is a list of the (node_id, node) pairs created for the reaction, consumed
+                      while writing
+    :param metabolite_nodes: metabolite nodes of the map, written after all reactions are
+                             complete, because the reactions mark the primary metabolites
+    :param canvas: canvas object
+    :param file_path: path to the output file
+    :param compact: write with rounded coordinates and short ids
+    :param use_gzip: compress the output with gzip
+    :param precision: number of decimals kept for coordinates in compact mode
+    :return: None
+    """
+    check_output_extension(file_path, use_gzip)
+    reaction_id = compact_id_allocator()
+    node_id = compact_id_allocator()
+    segment_id = compact_id_allocator()
+
+    def entry(key, value, level):
+        """
+        Encode a member of an object at the given nesting depth, with its separator
+        """
+        if compact:
+            return f",{compact_dumps(key)}:{compact_dumps(value)}"
+        return f",\n{' ' * INDENT * level}{json.dumps(key)}: {indented_dumps(value, level)}"
+
+    def close(written, level):
+        """
+        Encode the end of an object at the given nesting depth
+        """
+        if compact or not written:
+            return '}'
+        return f"\n{' ' * INDENT * (level - 1)}}}"
+
+    def member(key, level):
+        """
+        Encode the name of a member of the map body
+        """
+        if compact:
+            return f",{compact_dumps(key)}:"
+        return f",\n{' ' * INDENT * level}{json.dumps(key)}: "
+
+    def first(text):
+        # the first entry of an object has no separator
+        return text[1:]
+
+    if compact:
+        # the nodes are numbered in the order they were created, like in compact_escher_map
+        for n_id in metabolite_nodes:
+            node_id(n_id)
+        start = f"[{compact_dumps(header)},{{"
+    else:
+        start = f"[\n{' ' * INDENT}{indented_dumps(header, 1)},\n{' ' * INDENT}{{"
+
     try:
-        with open(file_path, 'w', encoding='utf-8') as file:
-            json.dump(json_data, file, indent=4)
+        with open_output_file(file_path, use_gzip) as file, \
+                tempfile.TemporaryFile('w+', encoding='utf-8') as node_file:
+            file.write(start + first(member('reactions', 2)) + '{')
+            written = 0
+            for r_id, reaction, reaction_nodes in reactions:
+                if compact:
+                    for n_id, _ in reaction_nodes:
+                        node_id(n_id)
+                    r_id = reaction_id(r_id)
+                    reaction = compact_reaction(reaction, node_id, segment_id, precision)
+                text = entry(r_id, reaction, 3)
+                file.write(text if written else first(text))
+                written += 1
+                for n_id, node in reaction_nodes:
+                    if compact:
+                        n_id = node_id(n_id)
+                        node = compact_node(node, precision)
+                    node_file.write(entry(n_id, node, 3))
+            file.write(close(written, 3))
+
+            file.write(member('nodes', 2) + '{')
+            written = 0
+            for n_id, node in metabolite_nodes.items():
+                if compact:
+                    n_id = node_id(n_id)
+                    node = compact_node(node, precision)
+                text = entry(n_id, node, 3)
+                file.write(text if written else first(text))
+                written += 1
+            node_file.seek(0)
+            if not written and node_file.read(1):
+                written += 1
+            shutil.copyfileobj(node_file, file)
+            file.write(close(written, 3))
+
+            if compact:
+                canvas = round_coordinates(canvas, ('x', 'y', 'width', 'height'), precision)
+            file.write(member('text_labels', 2) + '{}')
+            file.write(member('canvas', 2) + (compact_dumps(canvas) if compact
+                                               else indented_dumps(canvas, 2)))
+            file.write('}]' if compact else f"\n{' ' * INDENT}}}\n]")
     except IOError as e:
-        print(f"Error: Could not write the JSON data to the file {file_path}. I/O error: {e}")
-        sys.exit(1)
+        raise ConversionError(f"Could not write the JSON data to the file {file_path}. "
+                              f"I/O error: {e}") from e
 
 
 # check if the role is substrate or sidesubstrate
@@ -207,7 +965,8 @@ def put_segment_to_segments(segments, segment_id, from_node_id, to_node_id, b1=N
 
 
 def process_metabolite(role, index, start_node_id, end_node_id, start_x, start_y, segments,
-                       mato_species_glyph, length_of_metabolite_segments, metabolite_curve_id):
+                       mato_species_glyph, length_of_metabolite_segments, metabolite_curve_id,
+                       nodes=nodes):
     """
     Process the metabolite
     :param role: metabolite role
@@ -220,6 +979,7 @@ def process_metabolite(role, index, start_node_id, end_node_id, start_x, start_y
     :param mato_species_glyph: mato species glyph
     :param length_of_metabolite_segments: length of the metabolite segments
     :param metabolite_curve_id: metabolite curve id
+    :param nodes: nodes of the layout
     :return: None
     """
     metabolite_segment_id = f"{metabolite_curve_id}-{mato_species_glyph}"
@@ -253,7 +1013,8 @@ def process_metabolite(role, index, start_node_id, end_node_id, start_x, start_y
 
             # update the segments
             update_segments_with_node(is_produce_node, segments, start_x, start_y,
-                                      extra_seg_id, node_in_reaction, current_metabolite_segment_id)
+                                      extra_seg_id, node_in_reaction, current_metabolite_segment_id,
+                                      nodes)
 
             # the flux direction is from the reaction to the product node
             # reverse when the node is a substrate
@@ -348,7 +1109,7 @@ def is_point_on_segment(px, py, x1, y1, x2, y2):
 
 def update_segments_with_node(is_produce_node, segments, start_x, start_y, extra_node_id,
                               node_in_reaction_curve,
-                              seg_id_for_debug=None):
+                              seg_id_for_debug=None, nodes=nodes):
     """
     Delete the target segment and insert new node and segments
     :param segments: all segments in the single reaction
@@ -357,6 +1118,7 @@ def update_segments_with_node(is_produce_node, segments, start_x, start_y, extra
     :param extra_node_id: current node id, which is not the same as the start/end node id
     :param node_in_reaction_curve: start/end node id, for the not found situation
     :param seg_id_for_debug: current segment id, for the debug
+    :param nodes: nodes of the layout
     :return: None
     """
     segment_to_remove = None
@@ -398,13 +1160,14 @@ def update_segments_with_node(is_produce_node, segments, start_x, start_y, extra
     put_segment_to_segments(segments, new_segment_2_id, extra_node_id, to_node_id)
 
 
-def create_reaction_basic_info(model, specie2bigg, layout_width, layout_height):
+def create_reaction_basic_info(model, specie2bigg, layout_width, layout_height, edges=edges):
     """
     Create the basic information of reactions, expect the label position and segments
     :param model: model object
     :param specie2bigg: species id to bigg_id, for the convenience of getting bigg_id
     :param layout_width: layout_width
     :param layout_height: layout_height
+    :param edges: reactions of the layout
     :return: None
     """
     reactions = model['listOfReactions']['reaction']
@@ -423,11 +1186,12 @@ def create_reaction_basic_info(model, specie2bigg, layout_width, layout_height):
         edges[reaction_id]['label_y'] = layout_height + 100
 
 
-def create_metabolite_nodes(specie2bigg, layout_root):
+def create_metabolite_nodes(specie2bigg, layout_root, nodes=nodes):
     """
     Create the nodes for metabolites, expect the multimarker nodes
     :param specie2bigg: species id to bigg_id, for the convenience of getting bigg_id
     :param layout_root: layout root object, contains all layout information
+    :param nodes: nodes of the layout
     :return: None
     """
     list_of_species_glyphs = layout_root['layout:listOfSpeciesGlyphs']['layout:speciesGlyph']
@@ -450,13 +1214,14 @@ def create_metabolite_nodes(specie2bigg, layout_root):
         }
 
 
-def create_reaction_segments(reaction_glyph, reaction_layout_id, segments, reaction):
+def create_reaction_segments(reaction_glyph, reaction_layout_id, segments, reaction, nodes=nodes):
     """
     Create the segments for a reaction, only the trunk reaction segments
     :param reaction_glyph: reaction glyph
     :param reaction_layout_id: reaction layout id
     :param segments: all segments in the single reaction
     :param reaction: current reaction object
+    :param nodes: nodes of the layout
     :return: reaction start node id and reaction end node id, for the connection of the metabolites
     """
     list_of_reaction_segments = []
@@ -513,7 +1278,7 @@ def create_reaction_segments(reaction_glyph, reaction_layout_id, segments, react
 
 def create_metabolite_segments(reaction, reaction_glyph, reaction_layout_id, segments,
                                reaction_seg_start_node_id,
-                               reaction_seg_end_node_id):
+                               reaction_seg_end_node_id, nodes=nodes):
     """
     Create the segments for metabolites
     :param reaction: reaction object
@@ -522,6 +1287,7 @@ def create_metabolite_segments(reaction, reaction_glyph, reaction_layout_id, seg
     :param segments: all segments in the single reaction
     :param reaction_seg_start_node_id: substart/sidesubstart connect to this node
     :param reaction_seg_end_node_id: this node connect to product/sideproduct
+    :param nodes: nodes of the layout
     :return: None
     """
     list_of_metabolite_curves = reaction_glyph['layout:listOfSpeciesReferenceGlyphs'][
@@ -563,15 +1329,17 @@ def create_metabolite_segments(reaction, reaction_glyph, reaction_layout_id, seg
             process_metabolite(role, index, start_node_id, end_node_id, start_x, start_y,
                                segments,
                                mato_species_glyph, length_of_metabolite_segments,
-                               metabolite_curve_id)
+                               metabolite_curve_id, nodes)
 
 
 # create the segments for all reactions
-def create_all_segments(layout_root):
+def iter_all_segments(layout_root, edges=edges, nodes=nodes):
     """
-    Create the segments for all reactions
+    Create the segments for all reactions, one reaction glyph at a time
     :param layout_root: layout root object, contains all layout information
-    :return: None
+    :param edges: reactions of the layout
+    :param nodes: nodes of the layout
+    :return: generator of (reaction id, reaction) pairs, each reaction complete with its segments
     """
     list_of_reaction_glyphs = layout_root['layout:listOfReactionGlyphs']['layout:reactionGlyph']
     for reaction_glyph in list_of_reaction_glyphs:
@@ -583,79 +1351,308 @@ def create_all_segments(layout_root):
         reaction_seg_start_node_id, reaction_seg_end_node_id = create_reaction_segments(
             reaction_glyph,
             reaction_layout_id,
-            segments, reaction)
+            segments, reaction, nodes)
 
         # create the segments of metabolites
         create_metabolite_segments(reaction, reaction_glyph, reaction_layout_id, segments,
                                    reaction_seg_start_node_id,
-                                   reaction_seg_end_node_id)
+                                   reaction_seg_end_node_id, nodes)
 
         reaction['segments'] = segments
         edges[reaction_glyph['@layout:reaction']] = reaction
+        yield reaction_glyph['@layout:reaction'], reaction
 
 
-def sbml2escher(input_file_path, output_file_path, delete_temp_file=False):
+def create_all_segments(layout_root, edges=edges, nodes=nodes):
     """
-    Main function to convert the SBML JSON to Escher JSON
-    :param input_file_path: input file path
-    :param output_file_path: output file path
+    Create the segments for all reactions
+    :param layout_root: layout root object, contains all layout information
+    :param edges: reactions of the layout
+    :param nodes: nodes of the layout
     :return: None
     """
+    for _ in iter_all_segments(layout_root, edges, nodes):
+        pass
 
-    # Load your original sbml data
-    xml_data = load_xml_data(input_file_path)
 
-    # map basic information
-    model = xml_data['sbml']['model']
+def iter_layout_reactions(layout_root, edges=edges, nodes=nodes):
+    """
+    Create the segments for all reactions, and list the reactions in the order of the map:
+    the reactions with a reaction glyph in the order of the glyphs, then the others
+    :param layout_root: layout root object, contains all layout information
+    :param edges: reactions of the layout
+    :param nodes: nodes of the layout
+    :return: generator of (reaction id, reaction) pairs
+    """
+    emitted = set()
+    for reaction_id, reaction in iter_all_segments(layout_root, edges, nodes):
+        emitted.add(reaction_id)
+        yield reaction_id, reaction
+
+    # the reactions without reaction glyph are kept in the map
+    for reaction_id, reaction in list(edges.items()):
+        if reaction_id not in emitted:
+            yield reaction_id, reaction
+
+
+def stream_all_segments(layout_root, edges=edges, nodes=nodes):
+    """
+    Create the segments for all reactions, for the streaming writer. The segments and the
+    nodes created for each reaction are released once the reaction has been consumed. The
+    metabolite nodes stay in nodes, because later reactions mark the primary metabolites.
+    :param layout_root: layout root object, contains all layout information
+    :param edges: reactions of the layout
+    :param nodes: metabolite nodes of the layout
+    :return: generator of (reaction id, reaction, list of (node id, node) created for the
+             reaction)
+    """
+    reaction_nodes = {}
+    # new nodes go to reaction_nodes, and the metabolite nodes are still found
+    layout_nodes = ChainMap(reaction_nodes, nodes)
+    for reaction_id, reaction in iter_layout_reactions(layout_root, edges, layout_nodes):
+        yield reaction_id, reaction, list(reaction_nodes.items())
+        reaction_nodes.clear()
+        reaction.pop('segments', None)
+
+
+def create_map_header(model, layout_id=None):
+    """
+    Create the header of the Escher map
+    :param model: model object
+    :param layout_id: id of the layout, to tell apart the maps of several layouts
+    :return: header object
+    """
+    map_id = model['@id'] if layout_id is None else f"{model['@id']}_{layout_id}"
+    return {
+        "map_name": map_id,
+        "map_id": map_id,
+        "map_description": "",
+        "homepage": "https://escher.github.io",
+        "schema": "https://escher.github.io/escher/jsonschema/1-0-0#"
+    }
+
+
+def create_canvas(layout_width, layout_height):
+    """
+    Create the canvas of the Escher map, with a margin around the layout
+    :param layout_width: layout_width
+    :param layout_height: layout_height
+    :return: canvas object
+    """
+    return {
+        "x": -layout_width / 20,
+        "y": -layout_height / 20,
+        "width": layout_width * 1.1,
+        "height": layout_height * 1.1
+    }
+
 
-    # create species2bigg, for the convenience of getting bigg_id
+def reset_records():
+    """
+    Clear the reactions and nodes of a previous conversion
+    :return: None
+    """
+    edges.clear()
+    nodes.clear()
+
+
+def create_specie2bigg(model):
+    """
+    Create species2bigg, for the convenience of getting bigg_id
+    :param model: model object
+    :return: dict of species id to bigg_id
+    """
     specie2bigg = {}
     for sp in model['listOfSpecies']['species']:
         # cause the bigg_id converted by minerva is not the format we want
         # so we need to replace the brackets for the link to the metabolite or reaction
         specie2bigg[sp['@id']] = sp['@name']
+    return specie2bigg
+
 
-    # define the list of layouts
+def get_layouts(model):
+    """
+    Get all layouts of the model
+    :param model: model object
+    :return: list of layout root objects
+    """
     list_of_layouts = model['layout:listOfLayouts']
     # dict or list is better?
     if isinstance(list_of_layouts, dict):
         list_of_layouts = [list_of_layouts]
+    return [layout_root
+            for layouts in list_of_layouts
+            for layout_root in as_list(layouts['layout:layout'])]
 
-    layout_root = list_of_layouts[0]['layout:layout']
+
+def layout_output_path(output_file_path, layout_id):
+    """
+    Get the output file path of one of several layouts
+    :param output_file_path: output file path given for the conversion
+    :param layout_id: id of the layout
+    :return: output file path with the layout id before the extension
+    """
+    for extension in ('.json.gz', '.json'):
+        if output_file_path.endswith(extension):
+            return f"{output_file_path[:-len(extension)]}_{layout_id}{extension}"
+    return f"{output_file_path}_{layout_id}"
+
+
+def layout2escher(model, specie2bigg, layout_root, output_file_path, compact=False,
+                  use_gzip=False, stream=False, layout_id=None, edges=edges, nodes=nodes):
+    """
+    Convert one layout of a model to Escher JSON
+    :param model: model object
+    :param specie2bigg: species id to bigg_id, for the convenience of getting bigg_id
+    :param layout_root: layout root object, contains all layout information
+    :param output_file_path: output file path
+    :param compact: write without indentation, with rounded coordinates and short ids
+    :param use_gzip: compress the output with gzip
+    :param stream: write the reactions while the segments are being created
+    :param layout_id: id of the layout, to tell apart the maps of several layouts
+    :param edges: reactions of the layout
+    :param nodes: nodes of the layout
+    :return: output file path
+    """
     layout_width = float(layout_root['layout:dimensions']['@layout:width'])
     layout_height = float(layout_root['layout:dimensions']['@layout:height'])
 
     # create reactions, expect the label position and segments
-    create_reaction_basic_info(model, specie2bigg, layout_width, layout_height)
+    with metrics_timer('sbml2escher.create_reaction_basic_info', layout=layout_id):
+        create_reaction_basic_info(model, specie2bigg, layout_width, layout_height, edges)
 
     # create nodes, expect the multimarker nodes
-    create_metabolite_nodes(specie2bigg, layout_root)
+    with metrics_timer('sbml2escher.create_metabolite_nodes', layout=layout_id):
+        create_metabolite_nodes(specie2bigg, layout_root, nodes)
 
-    # create the segments of edges
-    create_all_segments(layout_root)
+    header = create_map_header(model, layout_id)
+    canvas = create_canvas(layout_width, layout_height)
 
-    escher_maps = [{
-        "map_name": model['@id'],
-        "map_id": model['@id'],
-        "map_description": "",
-        "homepage": "https://escher.github.io",
-        "schema": "https://escher.github.io/escher/jsonschema/1-0-0#"
-    },
-        {
-            "reactions": edges,
-            "nodes": nodes,
-            "text_labels": {},
-            "canvas": {
-                "x": -layout_width / 20,
-                "y": -layout_height / 20,
-                "width": layout_width * 1.1,
-                "height": layout_height * 1.1
+    if stream:
+        # create the segments of edges while writing them
+        with metrics_timer('sbml2escher.stream_all_segments', layout=layout_id):
+            stream_json_data(header, stream_all_segments(layout_root, edges, nodes), nodes,
+                             canvas, output_file_path, compact, use_gzip)
+    else:
+        # create the segments of edges, in the order of the streaming writer
+        with metrics_timer('sbml2escher.create_all_segments', layout=layout_id):
+            reactions = dict(iter_layout_reactions(layout_root, edges, nodes))
+
+        escher_maps = [
+            header,
+            {
+                "reactions": reactions,
+                "nodes": nodes,
+                "text_labels": {},
+                "canvas": canvas
             }
-        }
-    ]
+        ]
+
+        # Save the new JSON data
+        with metrics_timer('sbml2escher.save_json_data', layout=layout_id):
+            save_json_data(escher_maps, output_file_path, compact, use_gzip)
+
+    print(f"convert success, and save to {output_file_path}")
+    return output_file_path
+
 
-    # Save the new JSON data
-    save_json_data(escher_maps, output_file_path)
+def layout2escher_task(task):
+    """
+    Convert one layout in a worker process, with its own reactions and nodes
+    :param task: tuple of whether metrics are recorded, and the layout2escher arguments
+    :return: output file path, and the metrics events recorded in the worker
+    """
+    record_metrics, arguments = task
+    if not record_metrics:
+        return layout2escher(*arguments, edges={}, nodes={}), []
+    with metrics.profile() as profile:
+        output_file_path = layout2escher(*arguments, edges={}, nodes={})
+    return output_file_path, profile.events
+
+
+def model2escher(model, output_file_path, compact=False, use_gzip=False, stream=False,
+                 layout_ids=None, workers=None):
+    """
+    Convert a model in the SBML layout structure to Escher JSON
+    :param model: model object
+    :param output_file_path: output file path
+    :param compact: write without indentation, with rounded coordinates and short ids
+    :param use_gzip: compress the output with gzip
+    :param stream: write the reactions while the segments are being created
+    :param layout_ids: None to convert the first layout, 'all' to convert every layout, or a
+                       list of layout ids. Several layouts are written to separate files, with
+                       the layout id appended to the output file name.
+    :param workers: number of processes converting layouts concurrently, defaults to the
+                    number of CPUs. The metrics recorded in the workers are added to the
+                    metrics of this process.
+    :return: list of output file paths
+    """
+    reset_records()
+
+    # the model and the species table are parsed once and shared by all layouts
+    specie2bigg = create_specie2bigg(model)
+    layouts = get_layouts(model)
+
+    if layout_ids is None:
+        return [layout2escher(model, specie2bigg, layouts[0], output_file_path, compact,
+                              use_gzip, stream)]
+
+    if layout_ids != 'all':
+        available = {layout_root.get('@layout:id') for layout_root in layouts}
+        missing = [layout_id for layout_id in layout_ids if layout_id not in available]
+        if missing:
+            raise ConversionError(f"Layouts not found in the model: {', '.join(missing)}")
+        layouts = [layout_root for layout_root in layouts
+                   if layout_root.get('@layout:id') in layout_ids]
+
+    # only the parts of the model used by the conversion are sent to the workers
+    shared_model = {'@id': model['@id'], 'listOfReactions': model['listOfReactions']}
+    tasks = []
+    for index, layout_root in enumerate(layouts):
+        layout_id = layout_root.get('@layout:id', str(index))
+        tasks.append((shared_model, specie2bigg, layout_root,
+                      layout_output_path(output_file_path, layout_id), compact, use_gzip,
+                      stream, layout_id))
+
+    if len(tasks) == 1 or workers == 1:
+        return [layout2escher(*task, edges={}, nodes={}) for task in tasks]
+    record_metrics = metrics is not None and metrics.is_enabled()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(layout2escher_task,
+                                     [(record_metrics, task) for task in tasks]))
+    output_file_paths = []
+    for output_file_path, events in results:
+        for event in events:
+            metrics.record(event['name'], event['seconds'], event['bytes'], **event['tags'])
+        output_file_paths.append(output_file_path)
+    return output_file_paths
+
+
+def sbml2escher(input_file_path, output_file_path, delete_temp_file=False, compact=False,
+                use_gzip=False, stream=False, xml_data=None, layout_ids=None, workers=None):
+    """
+    Main function to convert the SBML JSON to Escher JSON
+    :param input_file_path: input file path
+    :param output_file_path: output file path
+    :param delete_temp_file: delete the input file after the conversion
+    :param compact: write without indentation, with rounded coordinates and short ids
+    :param use_gzip: compress the output with gzip
+    :param stream: write the reactions while the segments are being created
+    :param xml_data: already parsed XML data of the input file, to avoid parsing it again
+    :param layout_ids: None to convert the first layout, 'all' to convert every layout, or a
+                       list of layout ids
+    :param workers: number of processes converting layouts concurrently
+    :return: None
+    """
+
+    # Load your original sbml data
+    if xml_data is None:
+        with metrics_timer('sbml2escher.load_xml_data'):
+            xml_data = load_xml_data(input_file_path)
+
+    # map basic information
+    model2escher(xml_data['sbml']['model'], output_file_path, compact, use_gzip, stream,
+                 layout_ids, workers)
 
     # if it is celldesigner2escher, the script will create the `sbml` temp file
     # and delete it after the conversion
@@ -666,7 +1663,147 @@ def sbml2escher(input_file_path, output_file_path, delete_temp_file=False):
         except OSError as e:
             print(f"Error: {input_file_path} - {e.strerror}")
 
-    print(f"convert success, and save to {output_file_path}")
+
+def celldesigner2escher(input_file_path, output_file_path, compact=False, use_gzip=False,
+                        stream=False, xml_data=None):
+    """
+    Convert CellDesigner XML to Escher JSON locally
+    :param input_file_path: input file path
+    :param output_file_path: output file path
+    :param compact: write without indentation, with rounded coordinates and short ids
+    :param use_gzip: compress the output with gzip
+    :param stream: write the reactions while the segments are being created
+    :param xml_data: already parsed XML data of the input file, to avoid parsing it again
+    :return: None
+    """
+    if xml_data is None:
+        xml_data = load_xml_data(input_file_path)
+    model2escher(celldesigner2model(xml_data), output_file_path, compact, use_gzip, stream)
+
+
+def conversion_cache_key(input_bytes, options):
+    """
+    Create the key of a conversion in the cache
+    :param input_bytes: content of the input file
+    :param options: conversion options that change the output
+    :return: hex digest of the input, the converter version and the options
+    """
+    digest = hashlib.sha256()
+    digest.update(input_bytes)
+    digest.update(CONVERTER_VERSION.encode('utf-8'))
+    digest.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_from_cache(cache_dir, key, output_file_path):
+    """
+    Copy a cached conversion to the output file
+    :param cache_dir: cache directory
+    :param key: cache key of the conversion
+    :param output_file_path: output file path
+    :return: bool of whether the conversion was found in the cache
+    """
+    cache_path = os.path.join(cache_dir, key)
+    if not os.path.isfile(cache_path):
+        return False
+    shutil.copyfile(cache_path, output_file_path)
+    # mark the entry as recently used, for the eviction
+    os.utime(cache_path)
+    return True
+
+
+def store_in_cache(cache_dir, key, output_file_path, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+    """
+    Store a converted file in the cache, then evict the least recently used entries
+    :param cache_dir: cache directory
+    :param key: cache key of the conversion
+    :param output_file_path: path of the converted file
+    :param max_bytes: maximum total size of the cache
+    :return: None
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, key)
+    # copy to a temporary name first, so readers never see a partial entry
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    shutil.copyfile(output_file_path, temp_path)
+    os.replace(temp_path, cache_path)
+    evict_cache(cache_dir, max_bytes)
+
+
+def evict_cache(cache_dir, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+    """
+    Remove the least recently used entries until the cache fits in max_bytes
+    :param cache_dir: cache directory
+    :param max_bytes: maximum total size of the cache
+    :return: None
+    """
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and not entry.name.endswith('.tmp'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total_bytes -= size
+        except OSError as e:
+            print(f"Error: Could not evict the cache entry {path}. {e.strerror}")
+
+
+def convert_file(input_file_path, output_file_path, compact=False, use_gzip=False, stream=False,
+                 remote=False, cache_dir=None, cache_max_bytes=DEFAULT_CACHE_MAX_BYTES,
+                 layout_ids=None, workers=None):
+    """
+    Convert a CellDesigner or SBML file to Escher JSON, reusing the cached result when the same
+    input was already converted with the same options
+    :param input_file_path: input file path
+    :param output_file_path: output file path
+    :param compact: write without indentation, with rounded coordinates and short ids
+    :param use_gzip: compress the output with gzip
+    :param stream: write the reactions while the segments are being created
+    :param remote: convert CellDesigner files with the remote MINERVA service
+    :param cache_dir: cache directory, or None to disable the cache
+    :param cache_max_bytes: maximum total size of the cache
+    :param layout_ids: None to convert the first layout, 'all' to convert every layout, or a
+                       list of layout ids. The cache is only used for the first layout.
+    :param workers: number of processes converting layouts concurrently
+    :return: input file type, 'celldesigner' or 'sbml', 'cached' for a cache hit,
+             or None if the type is unknown
+    """
+    key = None
+    if cache_dir is not None and layout_ids is None:
+        with open(input_file_path, 'rb') as file:
+            input_bytes = file.read()
+        # the stream option writes the same bytes, so it is not part of the key
+        key = conversion_cache_key(input_bytes, {
+            'compact': compact, 'gzip': use_gzip, 'remote': remote,
+        })
+        if load_from_cache(cache_dir, key, output_file_path):
+            print(f"cache hit, and save to {output_file_path}")
+            return 'cached'
+
+    input_format, data = identify_file_type(input_file_path)
+    if input_format == 'celldesigner' and not remote:
+        celldesigner2escher(input_file_path, output_file_path, compact, use_gzip, stream, data)
+    # Convert CellDesigner XML to SBML XML if needed
+    elif input_format in ('celldesigner', 'sbml'):
+        if input_format == 'celldesigner':
+            temp_output_file_path = 'SBML_converted.xml'
+            celldesigner2sbml(input_file_path, temp_output_file_path)
+            input_file_path = temp_output_file_path
+            data = None
+
+        sbml2escher(input_file_path, output_file_path, input_format == 'celldesigner', compact,
+                    use_gzip, stream, data, layout_ids, workers)
+    else:
+        return None
+
+    if key is not None:
+        store_in_cache(cache_dir, key, output_file_path, cache_max_bytes)
+    return input_format
 
 
 if __name__ == "__main__":
@@ -675,22 +1812,60 @@ if __name__ == "__main__":
     parser.add_argument('--input', default='sbml.xml', help='Path to the input XML file')
     parser.add_argument('--output', default='sbml2escher_output.json',
                         help='Path to the output JSON file')
+    parser.add_argument('--compact', action='store_true',
+                        help='Write without indentation, with rounded coordinates and short ids')
+    parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip')
+    parser.add_argument('--stream', action='store_true',
+                        help='Write the reactions while they are being converted')
+    parser.add_argument('--remote', action='store_true',
+                        help='Convert CellDesigner files with the remote MINERVA service')
+    parser.add_argument('--benchmark', nargs='+', metavar='CELLDESIGNER_FILE',
+                        help='Compare the local and remote CellDesigner conversion on the files')
+    parser.add_argument('--cache-dir', default=None,
+                        help='Directory for caching converted files, keyed on the input content')
+    parser.add_argument('--cache-max-size', type=int,
+                        default=DEFAULT_CACHE_MAX_BYTES // (1024 * 1024),
+                        help='Maximum size of the cache directory in MB')
+    parser.add_argument('--layouts', nargs='+', metavar='LAYOUT_ID',
+                        help='Convert these SBML layouts, or "all", into separate maps')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of processes converting layouts concurrently')
+    parser.add_argument('--batch', nargs='+', metavar='CELLDESIGNER_FILE',
+                        help='Convert the CellDesigner files concurrently with the remote '
+                             'MINERVA service, into the directory of the output file')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Maximum number of remote conversions in progress')
 
     args = parser.parse_args()
     INPUT_PATH = args.input
     OUPUT_PATH = args.output
 
-    input_format, data = identify_file_type(INPUT_PATH)
-    # Convert CellDesigner XML to SBML XML if needed
-    if input_format in ('celldesigner', 'sbml'):
-        if input_format == 'celldesigner':
-            TEMP_OUTPUT_FILE_PATH = 'SBML_converted.xml'
-            celldesigner2sbml(INPUT_PATH, TEMP_OUTPUT_FILE_PATH)
-            INPUT_PATH = TEMP_OUTPUT_FILE_PATH
-
-        sbml2escher(INPUT_PATH, OUPUT_PATH, input_format == 'celldesigner')
-        end_time = time.time()
-        print(f"Conversion completed in {end_time - start_time:.2f} seconds.")
-    else:
+    if args.benchmark:
+        try:
+            benchmark_celldesigner(args.benchmark, os.path.dirname(OUPUT_PATH) or '.')
+        except ConversionError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        sys.exit(0)
+
+    if args.batch:
+        BATCH_RESULTS = celldesigner2escher_batch(args.batch, os.path.dirname(OUPUT_PATH) or '.',
+                                                  concurrency=args.concurrency)
+        FAILED = [result for result in BATCH_RESULTS if result['error'] is not None]
+        print(f"Converted {len(BATCH_RESULTS) - len(FAILED)} of {len(BATCH_RESULTS)} files "
+              f"in {time.time() - start_time:.2f} seconds.")
+        sys.exit(1 if FAILED else 0)
+
+    LAYOUT_IDS = 'all' if args.layouts == ['all'] else args.layouts
+    try:
+        input_format = convert_file(INPUT_PATH, OUPUT_PATH, args.compact, args.gzip,
+                                    args.stream, args.remote, args.cache_dir,
+                                    args.cache_max_size * 1024 * 1024, LAYOUT_IDS, args.workers)
+    except ConversionError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if input_format is None:
         print(f"Error: The input file {INPUT_PATH} is not a valid CellDesigner or SBML XML file.")
         sys.exit(1)
+    end_time = time.time()
+    print(f"Conversion completed in {end_time - start_time:.2f} seconds.")
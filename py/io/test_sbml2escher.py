@@ -0,0 +1,229 @@
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os.path import abspath, dirname, join
+
+from pytest import fixture, mark, raises
+
+import sbml2escher
+
+io_directory = dirname(abspath(__file__))
+sbml_path = join(io_directory, 'sbml.xml')
+celldesigner_path = join(io_directory, 'celldesigner.xml')
+
+
+def read(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        return f.read()
+
+
+@mark.parametrize('compact', [False, True])
+def test_stream_writes_the_same_file(tmpdir, compact):
+    default = str(tmpdir.join('default.json'))
+    streamed = str(tmpdir.join('streamed.json'))
+    sbml2escher.sbml2escher(sbml_path, default, compact=compact)
+    sbml2escher.sbml2escher(sbml_path, streamed, compact=compact, stream=True)
+    assert read(streamed) == read(default)
+
+
+def test_compact_output(tmpdir):
+    default = str(tmpdir.join('default.json'))
+    compact = str(tmpdir.join('compact.json.gz'))
+    sbml2escher.sbml2escher(sbml_path, default)
+    sbml2escher.sbml2escher(sbml_path, compact, compact=True, use_gzip=True, stream=True)
+    assert b'\n' not in read(compact)
+    escher_map = json.loads(read(default))
+    assert json.loads(read(compact)) == sbml2escher.compact_escher_map(escher_map)
+    assert len(escher_map[1]['reactions']) == 15
+    assert len(escher_map[1]['nodes']) == 119
+
+
+def test_celldesigner_local(tmpdir):
+    output = str(tmpdir.join('celldesigner.json'))
+    input_format = sbml2escher.convert_file(celldesigner_path, output)
+    assert input_format == 'celldesigner'
+    escher_map = json.loads(read(output))
+    sbml_output = str(tmpdir.join('sbml.json'))
+    sbml2escher.convert_file(sbml_path, sbml_output)
+    sbml_map = json.loads(read(sbml_output))
+    # the same map as the SBML export of the same CellDesigner model
+    assert len(escher_map[1]['reactions']) == 15
+    assert len(escher_map[1]['nodes']) == 119
+    assert sorted(r['bigg_id'] for r in escher_map[1]['reactions'].values()) == \
+        sorted(r['bigg_id'] for r in sbml_map[1]['reactions'].values())
+    assert sorted(n.get('bigg_id', '') for n in escher_map[1]['nodes'].values()) == \
+        sorted(n.get('bigg_id', '') for n in sbml_map[1]['nodes'].values())
+
+
+def test_cache(tmpdir):
+    cache_dir = str(tmpdir.join('cache'))
+    first = str(tmpdir.join('first.json.gz'))
+    second = str(tmpdir.join('second.json.gz'))
+    assert sbml2escher.convert_file(sbml_path, first, use_gzip=True,
+                                    cache_dir=cache_dir) == 'sbml'
+    # the same input and options, in stream mode, which writes the same bytes
+    assert sbml2escher.convert_file(sbml_path, second, use_gzip=True, stream=True,
+                                    cache_dir=cache_dir) == 'cached'
+    with open(first, 'rb') as f, open(second, 'rb') as g:
+        assert f.read() == g.read()
+    # another option is another entry
+    compact = str(tmpdir.join('compact.json.gz'))
+    assert sbml2escher.convert_file(sbml_path, compact, compact=True, use_gzip=True,
+                                    cache_dir=cache_dir) == 'sbml'
+    assert len(tmpdir.join('cache').listdir()) == 2
+
+
+def test_cache_eviction(tmpdir):
+    cache_dir = tmpdir.mkdir('cache')
+    for index, name in enumerate(['old', 'used', 'new']):
+        entry = cache_dir.join(name)
+        entry.write('x' * 100)
+        entry.setmtime(1000 + index)
+    # reading an entry makes it the most recently used
+    output = str(tmpdir.join('output.json'))
+    assert sbml2escher.load_from_cache(str(cache_dir), 'used', output)
+    sbml2escher.evict_cache(str(cache_dir), max_bytes=200)
+    assert sorted(p.basename for p in cache_dir.listdir()) == ['new', 'used']
+    assert not sbml2escher.load_from_cache(str(cache_dir), 'old', output)
+
+
+def two_layout_model():
+    model = sbml2escher.load_xml_data(sbml_path)['sbml']['model']
+    layouts = model['layout:listOfLayouts']
+    layout_root = layouts['layout:layout']
+    layouts['layout:layout'] = [layout_root, dict(layout_root, **{'@layout:id': 'copy'})]
+    return model
+
+
+def test_layouts_in_workers(tmpdir):
+    from escher import metrics
+
+    output = str(tmpdir.join('map.json'))
+    with metrics.profile() as profile:
+        outputs = sbml2escher.model2escher(two_layout_model(), output, layout_ids='all',
+                                           workers=2)
+    assert outputs == [str(tmpdir.join('map_minerva_layout.json')),
+                       str(tmpdir.join('map_copy.json'))]
+    first, second = (json.loads(read(path)) for path in outputs)
+    assert len(first[1]['reactions']) == len(second[1]['reactions']) == 15
+    assert first[1] == second[1]
+    # the metrics recorded in the workers
+    layouts = {event['tags'].get('layout') for event in profile.events
+               if event['name'] == 'sbml2escher.create_all_segments'}
+    assert layouts == {'minerva_layout', 'copy'}
+
+
+def test_unknown_layout(tmpdir):
+    output = str(tmpdir.join('map.json'))
+    with raises(sbml2escher.ConversionError, match='nothing'):
+        sbml2escher.model2escher(two_layout_model(), output, layout_ids=['copy', 'nothing'])
+
+
+def sbml_with_bad_coordinate():
+    sbml = read(sbml_path).decode('utf-8')
+    start = sbml.index('layout:x="', sbml.index('<layout:speciesGlyph'))
+    end = sbml.index('"', start + len('layout:x="'))
+    return (sbml[:start] + 'layout:x="NaNx' + sbml[end:]).encode('utf-8')
+
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    """Stands in for the MINERVA conversion service, answering by the request body."""
+    protocol_version = 'HTTP/1.1'
+    requests = {}
+
+    def read_body(self):
+        if 'Content-Length' in self.headers:
+            return self.rfile.read(int(self.headers['Content-Length']))
+        # the upload is streamed in chunks
+        body = b''
+        while True:
+            line = self.rfile.readline().strip()
+            if not line:
+                # the client stopped the upload
+                return body
+            size = int(line, 16)
+            body += self.rfile.read(size)
+            self.rfile.readline()
+            if size == 0:
+                return body
+
+    def respond(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.read_body()
+        count = self.requests[body] = self.requests.get(body, 0) + 1
+        if body == b'flaky' and count == 1:
+            self.respond(503, b'busy')
+        elif body == b'bad':
+            self.respond(200, b'<html>not SBML')
+        elif body == b'bad coordinate':
+            self.respond(200, sbml_with_bad_coordinate())
+        else:
+            self.respond(200, read(sbml_path))
+
+    def log_message(self, *args):
+        pass
+
+
+@fixture
+def conversion_url():
+    ConversionHandler.requests = {}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ConversionHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/convert'
+    server.shutdown()
+    server.server_close()
+
+
+def test_celldesigner_batch(tmpdir, conversion_url):
+    inputs = []
+    # inputs with the same name, in different directories
+    for directory, body in [('first', 'ok'), ('second', 'flaky'), ('third', 'bad')]:
+        input_file = tmpdir.mkdir(directory).join('model.xml')
+        input_file.write(body)
+        inputs.append(str(input_file))
+    inputs.append(str(tmpdir.join('missing.xml')))
+    output_dir = tmpdir.join('output')
+
+    results = sbml2escher.celldesigner2escher_batch(inputs, str(output_dir), url=conversion_url,
+                                                    backoff=0.01)
+
+    ok, flaky, bad, missing = results
+    assert ok['output'] == str(output_dir.join('model_0.json'))
+    assert ok['error'] is None and ok['attempts'] == 1
+    # retried after the server error
+    assert flaky['output'] == str(output_dir.join('model_1.json'))
+    assert flaky['error'] is None and flaky['attempts'] == 2
+    for path in (ok['output'], flaky['output']):
+        assert len(json.loads(read(path))[1]['reactions']) == 15
+    # the failures are reported without stopping the batch
+    assert bad['output'] is None and 'conversion to Escher failed' in bad['error']
+    assert missing['output'] is None and missing['error'] is not None
+    assert sorted(p.basename for p in output_dir.listdir()
+                  if p.ext == '.json') == ['model_0.json', 'model_1.json']
+
+
+def test_celldesigner_batch_bad_coordinate(tmpdir, conversion_url):
+    inputs = []
+    for name, body in [('first', 'ok'), ('broken', 'bad coordinate'), ('last', 'ok')]:
+        input_file = tmpdir.join(f'{name}.xml')
+        input_file.write(body)
+        inputs.append(str(input_file))
+    output_dir = tmpdir.join('output')
+
+    first, broken, last = sbml2escher.celldesigner2escher_batch(
+        inputs, str(output_dir), url=conversion_url, backoff=0.01
+    )
+
+    assert broken['output'] is None and 'NaNx' in broken['error']
+    for result, name in [(first, 'first_0.json'), (last, 'last_2.json')]:
+        assert result['error'] is None
+        assert result['output'] == str(output_dir.join(name))
+        assert len(json.loads(read(result['output']))[1]['reactions']) == 15
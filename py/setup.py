@@ -66,5 +66,11 @@ setup(
             'jupyterlab-widgets==1.1.1',
             'jupyterlab==3.6.3',
         ],
+        'fast': [
+            'orjson>=3.6',
+        ],
+        'parquet': [
+            'pyarrow>=7.0',
+        ],
     },
 )
@@ -69,6 +69,8 @@ class Builder {
     this.searchBarRef = null
     this.semanticOptions = null
     this.mode = 'zoom'
+    this.detail_levels = null
+    this.detail_level = null
 
     // apply this object as data for the selection
     this.selection.datum(this)
@@ -239,6 +241,7 @@ class Builder {
     //   if (this.map) this.map.set_status('')
     // })
     this.zoom_container.callbackManager.set('zoom_change', () => {
+      this._updateDetailLevel()
       if (this.settings.get('semantic_zoom')) {
         const scale = this.zoom_container.windowScale
         const optionObject = this.settings.get('semantic_zoom')
@@ -366,7 +369,7 @@ class Builder {
   /**
    * For documentation of this function, see docs/javascript_api.rst
    */
-  load_map (mapData, shouldUpdateData = true) { // eslint-disable-line camelcase
+  load_map (mapData, shouldUpdateData = true, searchRecords = null) { // eslint-disable-line camelcase
     // Store map options that might be changed by semantic_zoom function
     const tempSemanticOptions = {}
     if (this.settings.get('semantic_zoom')) {
@@ -392,6 +395,10 @@ class Builder {
       this.map.key_manager.toggle(false)
     }
 
+    // detail levels belong to the old map
+    this.detail_levels = null
+    this.detail_level = null
+
     if (mapData !== null) {
       // import map
       this.map = Map.from_data(mapData,
@@ -401,7 +408,8 @@ class Builder {
                                this.zoom_container,
                                this.settings,
                                this.cobra_model,
-                               this.settings.get('enable_search'))
+                               this.settings.get('enable_search'),
+                               searchRecords)
     } else {
       // new map
       this.map = new Map(svg,
@@ -835,6 +843,9 @@ class Builder {
       this.map.deselect_text_labels()
     }
 
+    // simplified levels are only shown when the map cannot be edited
+    this._updateDetailLevel()
+
     this.map.draw_everything()
     // what's not allowing me to delete this? XX above
 
@@ -878,6 +889,29 @@ class Builder {
     this._setMode('text')
   }
 
+  /** For documentation of this function, see docs/javascript_api.rst. */
+  set_detail_levels (levels) { // eslint-disable-line camelcase
+    this.detail_levels = levels ? _.sortBy(levels, 'max_zoom') : null
+    this._updateDetailLevel()
+  }
+
+  /**
+   * Show the simplified level for the current zoom, or the full map when
+   * zoomed in or in an editing mode.
+   */
+  _updateDetailLevel () {
+    if (!this.map) return
+    let level = null
+    if (this.detail_levels && (this.mode === 'zoom' || this.mode === 'view')) {
+      const scale = this.zoom_container.windowScale
+      level = _.find(this.detail_levels, l => scale < l.max_zoom) || null
+    }
+    if (level !== this.detail_level) {
+      this.detail_level = level
+      this.map.show_detail_level(level ? level.map[1] : null)
+    }
+  }
+
   _reactionCheckAddAbs () {
     const currStyle = this.settings.get('reaction_styles')
     if (
@@ -18,6 +18,61 @@ function _on_array (fn) {
   return function (array) { return fn.apply(null, array) }
 }
 
+/**
+ * Propagate coefficients and reversibility to the segments of a reaction,
+ * connect the segments to their nodes, and add missing bezier points next to
+ * metabolites. Segments with missing nodes are deleted.
+ */
+function prepare_reaction_segments (nodes, r_id, reaction) {
+  // keep track of any bad segments
+  var segments_to_delete = []
+  for (var s_id in reaction.segments) {
+    var segment = reaction.segments[s_id]
+
+    // propagate reversibility
+    segment.reversibility = reaction.reversibility
+
+    // if there is an error with to_ or from_ nodes, remove this segment
+    if (!(segment.from_node_id in nodes) || !(segment.to_node_id in nodes)) {
+      console.warn('Bad node references in segment ' + s_id + '. Deleting segment.')
+      segments_to_delete.push(s_id)
+      continue
+    }
+
+    const from_node = nodes[segment.from_node_id]
+    const to_node = nodes[segment.to_node_id]
+
+    // propagate coefficients
+    reaction.metabolites.forEach(function(met) {
+      if (met.bigg_id === from_node.bigg_id) {
+        segment.from_node_coefficient = met.coefficient
+      } else if (met.bigg_id === to_node.bigg_id) {
+        segment.to_node_coefficient = met.coefficient
+      }
+    })
+
+    // build connected segments
+    ;[from_node, to_node].forEach(function(node) {
+      node.connected_segments.push({ segment_id: s_id,
+                                     reaction_id: r_id })
+    })
+
+    // If the metabolite has no bezier points, then add them.
+    var start = nodes[segment.from_node_id],
+        end = nodes[segment.to_node_id]
+    if (start['node_type']=='metabolite' || end['node_type']=='metabolite') {
+      var midpoint = utils.c_plus_c(start, utils.c_times_scalar(utils.c_minus_c(end, start), 0.5))
+      if (segment.b1 === null) segment.b1 = midpoint
+      if (segment.b2 === null) segment.b2 = midpoint
+    }
+
+  }
+  // delete the bad segments
+  segments_to_delete.forEach(function(s_id) {
+    delete reaction.segments[s_id]
+  })
+}
+
 /**
  * Map - Defines the metabolic map data, and manages drawing and building.
  * @param svg: The parent SVG container for the map.
@@ -153,6 +208,9 @@ export default class Map {
     this.imported_metabolite_data = null
     this.imported_gene_data = null
 
+    // the full map while a simplified detail level is shown
+    this.full_data = null
+
     this.nodes = {}
     this.reactions = {}
     this.beziers = {}
@@ -177,7 +235,7 @@ export default class Map {
    * Load a json map and add necessary fields for rendering.
    */
   static from_data (map_data, svg, css, selection, zoomContainer, settings,
-                    cobra_model, enable_search) {
+                    cobra_model, enable_search, search_records = null) {
     var canvas = map_data[1].canvas
     var map_name = map_data[0].map_name
     var map_id = map_data[0].map_id
@@ -190,6 +248,12 @@ export default class Map {
     map.nodes = map_data[1].nodes
     map.text_labels = map_data[1].text_labels
 
+    // use a prebuilt search index if there is one
+    if (enable_search && search_records) {
+      map.search_index.load(search_records)
+      enable_search = false
+    }
+
     for (var n_id in map.nodes) {
       var node = map.nodes[n_id]
 
@@ -236,53 +300,7 @@ export default class Map {
         }
       }
 
-      // keep track of any bad segments
-      var segments_to_delete = []
-      for (var s_id in reaction.segments) {
-        var segment = reaction.segments[s_id]
-
-        // propagate reversibility
-        segment.reversibility = reaction.reversibility
-
-        // if there is an error with to_ or from_ nodes, remove this segment
-        if (!(segment.from_node_id in map.nodes) || !(segment.to_node_id in map.nodes)) {
-          console.warn('Bad node references in segment ' + s_id + '. Deleting segment.')
-          segments_to_delete.push(s_id)
-          continue
-        }
-
-        const from_node = map.nodes[segment.from_node_id]
-        const to_node = map.nodes[segment.to_node_id]
-
-        // propagate coefficients
-        reaction.metabolites.forEach(function(met) {
-          if (met.bigg_id === from_node.bigg_id) {
-            segment.from_node_coefficient = met.coefficient
-          } else if (met.bigg_id === to_node.bigg_id) {
-            segment.to_node_coefficient = met.coefficient
-          }
-        })
-
-        // build connected segments
-        ;[from_node, to_node].forEach(function(node) {
-          node.connected_segments.push({ segment_id: s_id,
-                                         reaction_id: r_id })
-        })
-
-        // If the metabolite has no bezier points, then add them.
-        var start = map.nodes[segment.from_node_id],
-            end = map.nodes[segment.to_node_id]
-        if (start['node_type']=='metabolite' || end['node_type']=='metabolite') {
-          var midpoint = utils.c_plus_c(start, utils.c_times_scalar(utils.c_minus_c(end, start), 0.5))
-          if (segment.b1 === null) segment.b1 = midpoint
-          if (segment.b2 === null) segment.b2 = midpoint
-        }
-
-      }
-      // delete the bad segments
-      segments_to_delete.forEach(function(s_id) {
-        delete reaction.segments[s_id]
-      })
+      prepare_reaction_segments(map.nodes, r_id, reaction)
     }
 
     // add text_labels to the search index
@@ -1575,6 +1593,130 @@ export default class Map {
   }
 
 
+  /**
+   * Add and draw map tiles that are loaded after the map, with the nodes,
+   * reactions and text labels in each tile. Elements that are already on the
+   * map are skipped.
+   * @param {Array} tiles - Tiles of the form { nodes, reactions, text_labels }
+   */
+  add_tiles (tiles) {
+    // while a detail level is shown, add the tiles to the full map
+    const level_data = this.full_data === null ? null : this._swap_map_data(this.full_data)
+
+    const new_nodes = {}
+    const new_reactions = {}
+    const new_text_labels = {}
+    tiles.forEach(tile => {
+      _.each(tile.nodes, (node, node_id) => {
+        if (!(node_id in this.nodes)) new_nodes[node_id] = node
+      })
+      _.each(tile.reactions, (reaction, r_id) => {
+        if (!(r_id in this.reactions)) new_reactions[r_id] = reaction
+      })
+      _.each(tile.text_labels, (label, label_id) => {
+        if (!(label_id in this.text_labels)) new_text_labels[label_id] = label
+      })
+    })
+
+    _.each(new_nodes, node => { node.connected_segments = [] })
+    this.extend_nodes(new_nodes)
+    _.each(new_reactions, (reaction, r_id) => {
+      prepare_reaction_segments(this.nodes, r_id, reaction)
+    })
+    this.extend_reactions(new_reactions)
+    utils.extend(this.beziers, build.newBeziersForReactions(new_reactions))
+    _.each(new_text_labels, (label, label_id) => {
+      if (this.enable_search) this.add_label_to_search_index(label_id, label.text)
+    })
+    utils.extend(this.text_labels, new_text_labels)
+
+    // keep ids for new elements ahead of the loaded ones
+    const largest = (ids, current) => Math.max.apply(null, ids.map(x => parseInt(x)).concat([current]))
+    this.largest_ids.nodes = largest(Object.keys(new_nodes), this.largest_ids.nodes)
+    this.largest_ids.reactions = largest(Object.keys(new_reactions), this.largest_ids.reactions)
+    this.largest_ids.text_labels = largest(Object.keys(new_text_labels), this.largest_ids.text_labels)
+    _.each(new_reactions, reaction => {
+      this.largest_ids.segments = largest(Object.keys(reaction.segments), this.largest_ids.segments)
+    })
+
+    if (level_data !== null) {
+      this.full_data = this._swap_map_data(level_data)
+      return
+    }
+
+    // apply the current data to the new elements
+    const node_ids = Object.keys(new_nodes)
+    const reaction_ids = Object.keys(new_reactions)
+    const node_scale_changed = this.apply_metabolite_data_to_map(
+      this.imported_metabolite_data, node_ids
+    )
+    const reaction_scale_changed = this.imported_gene_data
+      ? this.apply_gene_data_to_map(this.imported_gene_data, reaction_ids)
+      : this.apply_reaction_data_to_map(this.imported_reaction_data, reaction_ids)
+
+    if (reaction_scale_changed) {
+      this.draw_all_reactions(true, false)
+    } else {
+      this.draw_these_reactions(reaction_ids)
+    }
+    if (node_scale_changed) {
+      this.draw_all_nodes(false)
+    } else {
+      this.draw_these_nodes(node_ids)
+    }
+    this.draw_these_text_labels(Object.keys(new_text_labels))
+  }
+
+  /**
+   * Replace the nodes, reactions, text labels and beziers of the map, and
+   * return the old ones.
+   */
+  _swap_map_data (data) {
+    const old = { nodes: this.nodes,
+                  reactions: this.reactions,
+                  text_labels: this.text_labels,
+                  beziers: this.beziers }
+    this.nodes = data.nodes
+    this.reactions = data.reactions
+    this.text_labels = data.text_labels
+    this.beziers = data.beziers
+    return old
+  }
+
+  /**
+   * Show a simplified version of the map for zoomed-out views, or the full map
+   * again. The full map is kept while a level is shown.
+   * @param {Object} level_data - The body of a simplified map, with nodes,
+   * reactions and text_labels, or null for the full map.
+   */
+  show_detail_level (level_data) {
+    if (level_data === null) {
+      if (this.full_data === null) return
+      this._swap_map_data(this.full_data)
+      this.full_data = null
+    } else {
+      _.each(level_data.nodes, node => { node.connected_segments = [] })
+      _.each(level_data.reactions, (reaction, r_id) => {
+        prepare_reaction_segments(level_data.nodes, r_id, reaction)
+      })
+      const old = this._swap_map_data({
+        nodes: level_data.nodes,
+        reactions: level_data.reactions,
+        text_labels: level_data.text_labels || {},
+        beziers: build.newBeziersForReactions(level_data.reactions)
+      })
+      if (this.full_data === null) this.full_data = old
+    }
+
+    this.apply_metabolite_data_to_map(this.imported_metabolite_data)
+    if (this.imported_gene_data) {
+      this.apply_gene_data_to_map(this.imported_gene_data)
+    } else {
+      this.apply_reaction_data_to_map(this.imported_reaction_data)
+    }
+    this.draw_everything()
+  }
+
   _extend_and_draw_reaction (new_nodes, new_reactions, new_beziers,
                              selected_node_id) {
     this.extend_reactions(new_reactions)
@@ -2149,6 +2291,19 @@ export default class Map {
   }
 
   map_for_export () {
+    // export the full map, not a simplified detail level
+    if (this.full_data !== null) {
+      const full_data = this.full_data
+      const level_data = this._swap_map_data(full_data)
+      this.full_data = null
+      try {
+        return this.map_for_export()
+      } finally {
+        this._swap_map_data(level_data)
+        this.full_data = full_data
+      }
+    }
+
     var out = [{ map_name: this.map_name,
                  map_id: this.map_id,
                  map_description: this.map_description,
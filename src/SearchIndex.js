@@ -29,6 +29,15 @@ export default class SearchIndex {
     this.index[id] = record
   }
 
+  /**
+   * Replace the index with prebuilt records, e.g. from the Python function
+   * escher.search.frontend_search_index.
+   * @param records - An object of id/record pairs.
+   */
+  load (records) {
+    this.index = Object.assign({}, records)
+  }
+
   /**
    * Remove the matching record. Returns true is a record is found, or false if
    * no match is found.
@@ -132,10 +132,21 @@ function importAndCheck (data, name, allReactions) {
   return data
 }
 
+/**
+ * Data that was compared in Python by escher.compare has an object with value,
+ * text and reverse_flux for each element.
+ */
+function isPrecomputed (d) {
+  return d !== null && d.length === 1 && d[0] !== null && typeof d[0] === 'object'
+}
+
 function floatForData (d, styles, compareStyle) {
   // all null
   if (d === null) return null
 
+  // infinite values are strings, because JSON has no number for them
+  if (isPrecomputed(d)) return parseFloatOrNull(d[0].value)
+
   // absolute value
   const takeAbs = styles.indexOf('abs') !== -1
 
@@ -166,6 +177,7 @@ function reverse_flux_for_data (d) {
   if (d === null || d[0] === null) {
     return false
   }
+  if (isPrecomputed(d)) return d[0].reverse_flux
   return (d[0] < 0)
 }
 
@@ -272,6 +284,9 @@ function text_for_data (d, f) {
   if (d === null) {
     return null_or_d(null)
   }
+  if (isPrecomputed(d)) {
+    return d[0].text
+  }
   if (d.length === 1) {
     var format = (f === null ? RETURN_ARG : d3Format('.3g'))
     return null_or_d(d[0], format)
@@ -623,6 +638,7 @@ function apply_gene_data_to_reactions (
 
 export default {
   importAndCheck,
+  isPrecomputed,
   floatForData,
   reverse_flux_for_data,
   gene_string_for_data,
@@ -55,7 +55,7 @@ export * as dataStyles from './dataStyles'
 export { default as ZoomContainer } from './ZoomContainer'
 
 // Jupyter extension
-export { EscherMapView, EscherMapModel } from './widget'
+export { EscherMapView, EscherMapModel, EscherBlobModel } from './widget'
 
 export const libs = {
   _: underscore,
@@ -128,6 +128,16 @@ describe('dataStyles.floatForData', () => {
   it('bad compare_style', () => {
     assert.throws(dataStyles.floatForData.bind(null, [10, 5], [], 'd'))
   })
+  it('precomputed', () => {
+    const d = [{ value: -1, text: '10.0, 5.00: -1.00', reverse_flux: false }]
+    assert.strictEqual(dataStyles.floatForData(d, ['abs'], 'diff'), -1)
+    assert.strictEqual(dataStyles.text_for_data(d, -1), '10.0, 5.00: -1.00')
+    assert.isFalse(dataStyles.reverse_flux_for_data(d))
+    const inf = [{ value: '-Infinity', text: 'Infinity, 5.00: -Infinity', reverse_flux: false }]
+    assert.strictEqual(dataStyles.floatForData(inf, [], 'diff'), -Infinity)
+    const nd = [{ value: null, text: '0, 5.00: (nd)', reverse_flux: false }]
+    assert.isNull(dataStyles.floatForData(nd, [], 'fold'))
+  })
 })
 
 describe('dataStyles.text_for_data', () => {
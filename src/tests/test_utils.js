@@ -1,4 +1,4 @@
-/* global global */
+/* global global, Buffer */
 
 import { describe, it, before, after } from 'vitest'
 import { assert } from 'chai'
@@ -363,3 +363,19 @@ describe('utils.d3_transform_catch', () => {
 //     assert.isFalse(utils.check_browser('safari'))
 //   })
 // })
+
+describe('utils.decompressPayload', () => {
+  it('returns uncompressed values', () => {
+    assert.strictEqual(utils.decompressPayload('[1]'), '[1]')
+    assert.strictEqual(utils.decompressPayload(null), null)
+  })
+
+  it('decompresses gzipped JSON', async () => {
+    const { gzipSync } = await import('zlib')
+    const buffer = gzipSync(Buffer.from('{"a":1}'))
+    const data = new DataView(buffer.buffer, buffer.byteOffset,
+                              buffer.byteLength)
+    const text = await utils.decompressPayload({ encoding: 'gzip', data })
+    assert.strictEqual(text, '{"a":1}')
+  })
+})
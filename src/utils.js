@@ -1,4 +1,4 @@
-/* global Blob, XMLSerializer, Image, btoa */
+/* global Blob, XMLSerializer, Image, btoa, Response, DecompressionStream */
 import {csvParseRows as d3_csvParseRows } from "d3-dsv";
 import vkbeautify from "vkbeautify";
 import _ from "underscore";
@@ -1202,6 +1202,26 @@ function get_window (node) {
   return get_document(node).defaultView
 }
 
+/**
+ * Decode a map or model sent by the Python widget. Compressed payloads are an
+ * object with the encoding and a DataView of the gzipped JSON, and are
+ * decompressed to the JSON string. Anything else is returned as is.
+ * @param {Object|String} value - The synced value.
+ * @return {Promise|String} A promise for the JSON string, or the value.
+ */
+function decompressPayload (value) {
+  if (!value || value.encoding !== 'gzip') return value
+  if (typeof DecompressionStream === 'undefined') {
+    throw new Error('This browser cannot decompress maps and models. ' +
+                    'Set compress_payloads=False in the Builder.')
+  }
+  const data = value.data
+  const bytes = new Uint8Array(data.buffer, data.byteOffset, data.byteLength)
+  const stream = new Blob([ bytes ]).stream()
+    .pipeThrough(new DecompressionStream('gzip'))
+  return new Response(stream).text()
+}
+
 // filter the data which is less than threshold
 function process_reaction_data (data, threshold = 0) {
   if (!(data instanceof Array)) {
@@ -1663,6 +1683,7 @@ export default {
   get_window,
   d3_transform_catch,
   process_reaction_data,
+  decompressPayload,
   // check_browser,
   handle_animation,
   update_color_legends,
@@ -1,12 +1,14 @@
-/* global ESCHER_VERSION */
+/* global ESCHER_VERSION, fetch */
 
 import { default as Builder } from './Builder'
+import utils from './utils'
 import { select as d3Select } from 'd3-selection'
 import _ from 'underscore'
 
 // These will be conditionally defined below
 export let EscherMapView = null
 export let EscherMapModel = null
+export let EscherBlobModel = null
 
 // @jupyter-widgets/base is optional, so only initialize if it's called
 let base
@@ -54,23 +56,24 @@ if (base) {
       // set height before loading map
       this.setHeight(sel)
 
-      _.defer(() => {
+      // saved state can reference the map and model instead of holding them
+      Promise.all([this.loadMapData(), this.loadModelData()]).then(([mapData, modelData]) => {
         this.builder = new Builder(
-          this.getMapData(),
-          this.getModelData(),
+          mapData,
+          modelData,
           this.model.get('embedded_css'),
           sel,
           {
             first_load_callback: builder => {
               // reset map json in widget
               builder.callback_manager.set('clear_map', () => {
-                this.model.set('_loaded_map_json', null)
+                this.model.set({ _loaded_map_json: null, _map_blob: null })
                 this.model.save_changes()
               })
 
               // reset model json in widget
               builder.callback_manager.set('clear_model', () => {
-                this.model.set('_loaded_model_json', null)
+                this.model.set({ _loaded_model_json: null, _model_blob: null })
                 this.model.save_changes()
               })
 
@@ -78,11 +81,34 @@ if (base) {
               this.model.on('change:height', () => {
                 this.setHeight(sel)
               })
-              this.model.on('change:_loaded_map_json', () => {
-                builder.load_map(this.getMapData())
+              this.model.on('change:_loaded_map_json change:_map_blob', () => {
+                const blob = this.model.get('_map_blob')
+                this.loadMapData().then(mapData => {
+                  // skip a map that was replaced while it loaded
+                  if (blob !== this.model.get('_map_blob')) return
+                  builder.load_map(mapData, true,
+                                   this.model.get('_search_index'))
+                  this.updateDetailLevels(builder)
+                })
+              })
+              this.model.on('change:_search_index', () => {
+                // a new map loads with its index
+                if (this.model.hasChanged('_loaded_map_json') ||
+                    this.model.hasChanged('_map_blob')) return
+                const records = this.model.get('_search_index')
+                if (records && builder.map && builder.settings.get('enable_search')) {
+                  builder.map.search_index.load(records)
+                }
+              })
+              this.model.on('change:_map_detail_levels change:_map_detail_levels_blob', () => {
+                this.updateDetailLevels(builder)
               })
-              this.model.on('change:_loaded_model_json', () => {
-                builder.load_model(this.getModelData())
+              this.model.on('change:_loaded_model_json change:_model_blob', () => {
+                const blob = this.model.get('_model_blob')
+                this.loadModelData().then(modelData => {
+                  if (blob !== this.model.get('_model_blob')) return
+                  builder.load_model(modelData)
+                })
               })
 
               // sync changes from options (only after they have been accepted)
@@ -133,24 +159,157 @@ if (base) {
 
               // draw again to get settings visualized
               builder.map.draw_everything()
+
+              this.setUpProgressiveLoading(builder)
+              this.updateDetailLevels(builder)
+
+              // the map and model can load in the background in Python
+              this.model.on('change:_loading', () => this.showLoading(builder))
+              this.showLoading(builder)
             }
           }
         )
       })
     }
 
+    /**
+     * With progressive_loading, Python sends the map with the tiles in the
+     * initial view, and the other tiles when they are requested.
+     */
+    setUpProgressiveLoading (builder) {
+      this.loadedTiles = new Set()
+      this.model.on('msg:custom', msg => {
+        if (msg.event === 'tiles' && builder.map) {
+          builder.map.add_tiles(msg.tiles)
+        }
+      })
+      this.model.on('change:_map_tiles_info', () => {
+        this.startTiles(builder)
+      })
+      builder.zoom_container.callbackManager.set('go_to.widget_tiles', _.debounce(() => {
+        const info = this.model.get('_map_tiles_info')
+        if (info && info.mode === 'on_demand') {
+          this.requestTiles(this.visibleTiles(builder, info))
+        }
+      }, 200))
+      this.startTiles(builder)
+    }
+
+    startTiles (builder) {
+      const info = this.model.get('_map_tiles_info')
+      this.loadedTiles = new Set(info ? info.initial : [])
+      if (!info || !builder.map) return
+
+      // new elements must not reuse the ids of tiles that are not loaded yet
+      _.each(builder.map.largest_ids, (id, key) => {
+        builder.map.largest_ids[key] = Math.max(id, info.largest_id)
+      })
+
+      const visible = this.visibleTiles(builder, info)
+      if (info.mode === 'stream') {
+        // everything, starting with the tiles in view and then the nearest
+        const center = this.viewCenter(builder)
+        const distance = key => {
+          const [column, row] = key.split(',').map(Number)
+          return Math.hypot(info.x + (column + 0.5) * info.tile_size - center.x,
+                            info.y + (row + 0.5) * info.tile_size - center.y)
+        }
+        this.requestTiles(visible.concat(_.sortBy(info.keys, distance)))
+      } else {
+        this.requestTiles(visible)
+      }
+    }
+
+    requestTiles (keys) {
+      const missing = _.uniq(keys.filter(key => !this.loadedTiles.has(key)))
+      missing.forEach(key => this.loadedTiles.add(key))
+      if (missing.length > 0) {
+        this.send({ event: 'request_tiles', keys: missing })
+      }
+    }
+
+    viewBounds (builder) {
+      const zoomContainer = builder.zoom_container
+      const size = zoomContainer.get_size()
+      const scale = zoomContainer.windowScale
+      const translate = zoomContainer.windowTranslate
+      return {
+        x: -translate.x / scale,
+        y: -translate.y / scale,
+        width: size.width / scale,
+        height: size.height / scale
+      }
+    }
+
+    viewCenter (builder) {
+      const bounds = this.viewBounds(builder)
+      return { x: bounds.x + bounds.width / 2, y: bounds.y + bounds.height / 2 }
+    }
+
+    visibleTiles (builder, info) {
+      const bounds = this.viewBounds(builder)
+      const columnMin = Math.floor((bounds.x - info.x) / info.tile_size)
+      const columnMax = Math.floor((bounds.x + bounds.width - info.x) / info.tile_size)
+      const rowMin = Math.floor((bounds.y - info.y) / info.tile_size)
+      const rowMax = Math.floor((bounds.y + bounds.height - info.y) / info.tile_size)
+      return info.keys.filter(key => {
+        const [column, row] = key.split(',').map(Number)
+        return (column >= columnMin && column <= columnMax &&
+                row >= rowMin && row <= rowMax)
+      })
+    }
+
+    showLoading (builder) {
+      const loading = this.model.get('_loading') || []
+      if (!builder.map) return
+      builder.map.set_status(loading.length > 0
+                             ? `Loading ${loading.join(' and ')} ...`
+                             : '')
+    }
+
     setHeight (sel) {
       sel.style('height', `${this.model.get('height')}px`)
     }
 
-    getMapData () {
-      const json = this.model.get('_loaded_map_json')
-      return json ? JSON.parse(json) : null
+    /**
+     * Return a promise for the parsed map.
+     */
+    loadMapData () {
+      const blob = this.model.get('_map_blob')
+      if (!blob) {
+        const json = this.model.get('_loaded_map_json')
+        return Promise.resolve(json ? JSON.parse(json) : null)
+      }
+      // the Builder modifies the map data, so each view parses its own copy
+      return blob.loadContent().then(json => json ? JSON.parse(json) : null)
+    }
+
+    /**
+     * Show the detail levels of the map, synced or from their blob.
+     */
+    updateDetailLevels (builder) {
+      const blob = this.model.get('_map_detail_levels_blob')
+      if (!blob) {
+        builder.set_detail_levels(this.model.get('_map_detail_levels'))
+        return
+      }
+      blob.loadContent().then(json => {
+        // skip levels that were replaced while they loaded
+        if (blob !== this.model.get('_map_detail_levels_blob')) return
+        builder.set_detail_levels(json ? JSON.parse(json) : null)
+      })
     }
 
-    getModelData () {
-      const json = this.model.get('_loaded_model_json')
-      return json ? JSON.parse(json) : null
+    /**
+     * Return a promise for the parsed model.
+     */
+    loadModelData () {
+      const blob = this.model.get('_model_blob')
+      if (!blob) {
+        const json = this.model.get('_loaded_model_json')
+        return Promise.resolve(json ? JSON.parse(json) : null)
+      }
+      return blob.loadContent().then(() => blob.getData())
     }
   }
 
@@ -168,7 +327,112 @@ if (base) {
     }
   }
 
+  EscherMapModelRef.serializers = _.extend({}, base.DOMWidgetModel.serializers, {
+    _map_blob: { deserialize: base.unpack_models },
+    _model_blob: { deserialize: base.unpack_models },
+    _map_detail_levels_blob: { deserialize: base.unpack_models },
+    _loaded_map_json: { deserialize: utils.decompressPayload },
+    _loaded_model_json: { deserialize: utils.decompressPayload }
+  })
+
+  /**
+   * A map or model that is shared by every Builder in the kernel that shows
+   * it. The content is sent once, and parsed once for every view.
+   *
+   * With external_state, the content is not synced, so it is not saved with
+   * the notebook. It is loaded when a view needs it: from the kernel, or from
+   * the source url when the notebook is opened without one.
+   */
+  // eslint-disable-next-line no-unused-vars
+  class EscherBlobModelRef extends base.WidgetModel {
+    defaults () {
+      return _.extend(super.defaults(), {
+        _model_name: 'EscherBlobModel',
+        _model_module: 'escher',
+        _model_module_version: version,
+        digest: '',
+        content: '',
+        source: ''
+      })
+    }
+
+    /**
+     * Return a promise for the content, loading it if it is not synced.
+     */
+    loadContent () {
+      if (this.get('content') || !this.get('source')) {
+        return Promise.resolve(this.get('content'))
+      }
+      const digest = this.get('digest')
+      if (!this.loading || this.loadingDigest !== digest) {
+        this.loadingDigest = digest
+        this.loading = (this.comm_live ? this.requestContent() : this.fetchSource())
+          .then(content => {
+            if (this.loadingDigest === digest) this.loadedContent = content
+            return content
+          })
+      }
+      return this.loading
+    }
+
+    /**
+     * Ask the kernel for the content.
+     */
+    requestContent () {
+      return new Promise(resolve => {
+        const listener = (msg, buffers) => {
+          if (msg.event !== 'content') return
+          this.off('msg:custom', listener)
+          const content = msg.content
+          if (buffers && buffers.length > 0) content.data = buffers[0]
+          resolve(utils.decompressPayload(content))
+        }
+        this.on('msg:custom', listener)
+        this.send({ event: 'get_content' })
+      })
+    }
+
+    /**
+     * Download the content from the source url, relative to the page.
+     */
+    fetchSource () {
+      const source = this.get('source')
+      return fetch(source).then(response => {
+        if (!response.ok) {
+          throw new Error(`Could not load ${source}: ${response.status}`)
+        }
+        return response.text()
+      })
+    }
+
+    /**
+     * The content, synced or loaded with loadContent.
+     */
+    getContent () {
+      if (this.get('content') || !this.get('source')) return this.get('content')
+      return this.loadingDigest === this.get('digest') ? this.loadedContent : ''
+    }
+
+    /**
+     * The parsed content. It is shared, so it must not be modified.
+     */
+    getData () {
+      if (this.parsedDigest !== this.get('digest')) {
+        const content = this.getContent()
+        if (!content) return null
+        this.parsed = JSON.parse(content)
+        this.parsedDigest = this.get('digest')
+      }
+      return this.parsed
+    }
+  }
+
+  EscherBlobModelRef.serializers = _.extend({}, base.WidgetModel.serializers, {
+    content: { deserialize: utils.decompressPayload }
+  })
+
   // Trick for conditional exports
   EscherMapView = EscherMapViewRef
   EscherMapModel = EscherMapModelRef
+  EscherBlobModel = EscherBlobModelRef
 }